@@ -0,0 +1,125 @@
+"""
+Wakes up requests waiting for an author's ingestion to progress.
+
+Every author being waited on gets one Firestore snapshot listener on their
+ingestion status document, shared by all the waiters in the process and
+removed when the last one leaves. Each change bumps a version number and
+wakes the waiters, who then report the new state to their client.
+"""
+import logging
+import threading
+import time
+
+from shared.config import Config
+from shared.repositories.ingestion_status_repository import DONE, FAILED
+
+FINAL_STATES = (DONE, FAILED)
+
+
+class _Watch:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.status = None
+        self.waiters = 0
+        self.unsubscribe = None
+
+
+class AuthorWatcher:
+    def __init__(self, firestore_service):
+        self.firestore_service = firestore_service
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, author_id):
+        with self._lock:
+            watch = self._watches.get(author_id)
+            if watch is None:
+                watch = self._watches[author_id] = _Watch()
+                doc_ref = self.firestore_service.db.collection(
+                    Config.FIRESTORE_COLLECTION_INGESTION_STATUS
+                ).document(author_id)
+                try:
+                    watch.unsubscribe = doc_ref.on_snapshot(
+                        lambda docs, changes, read_time: self._on_snapshot(
+                            author_id, watch, docs
+                        )
+                    ).unsubscribe
+                except Exception as e:
+                    logging.error(f"Could not watch ingestion of {author_id}: {e}")
+            watch.waiters += 1
+            return watch
+
+    def _release(self, author_id, watch):
+        with self._lock:
+            watch.waiters -= 1
+            if watch.waiters == 0:
+                del self._watches[author_id]
+                if watch.unsubscribe is not None:
+                    watch.unsubscribe()
+
+    def _on_snapshot(self, author_id, watch, docs):
+        status = None
+        for doc in docs:
+            if doc.exists:
+                status = doc.to_dict().get("data")
+        # What was cached in memory is now outdated
+        self.firestore_service.cache.invalidate(
+            Config.FIRESTORE_COLLECTION_INGESTION_STATUS, author_id
+        )
+        if status and status.get("state") in FINAL_STATES:
+            self.firestore_service.cache.invalidate(
+                Config.FIRESTORE_COLLECTION_AUTHOR, author_id
+            )
+        with watch.condition:
+            watch.status = status
+            watch.version += 1
+            watch.condition.notify_all()
+
+    def wait(self, author_id, last_state=None, timeout=None):
+        """
+        Waits for the author's ingestion status, until its state differs
+        from ``last_state`` ("" for no status) or ``timeout`` seconds pass.
+        Without ``last_state`` the current status is returned as soon as it
+        is known. Returns ``(version, status)``.
+        """
+        def changed():
+            if watch.version == 0:
+                return False
+            state = (watch.status or {}).get("state") or ""
+            return last_state is None or state != last_state
+
+        watch = self._acquire(author_id)
+        try:
+            with watch.condition:
+                watch.condition.wait_for(changed, timeout)
+                return watch.version, watch.status
+        finally:
+            self._release(author_id, watch)
+
+    def stream(self, author_id, timeout, heartbeat):
+        """
+        Yields ``(version, status)`` on every change of the author's
+        ingestion status, or ``None`` after ``heartbeat`` seconds without
+        one, until a final state is reached or ``timeout`` seconds passed.
+        """
+        watch = self._acquire(author_id)
+        try:
+            since = 0
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                wait = min(heartbeat, deadline - time.monotonic())
+                with watch.condition:
+                    changed = watch.condition.wait_for(
+                        lambda: watch.version > since, wait
+                    )
+                    version, status = watch.version, watch.status
+                if not changed:
+                    yield None
+                    continue
+                since = version
+                yield version, status
+                if status and status.get("state") in FINAL_STATES:
+                    return
+        finally:
+            self._release(author_id, watch)
@@ -0,0 +1,40 @@
+"""
+CSV responses generated row by row, optionally gzip-encoded on the fly.
+"""
+import csv
+import io
+import zlib
+
+
+def csv_columns(records):
+    """Column names in order of first appearance across all records."""
+    columns = {}
+    for record in records:
+        columns.update(dict.fromkeys(record))
+    return list(columns)
+
+
+def iter_csv(records, chunk_rows=500):
+    """Yields the records as CSV text, a chunk of rows at a time."""
+    columns = csv_columns(records)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator="\n")
+    writer.writeheader()
+    for count, record in enumerate(records, start=1):
+        writer.writerow(record)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_gzip(chunks):
+    """Gzip-compresses a stream of text chunks."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -1,7 +1,15 @@
 import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+import pandas as pd
+
+from shared.config import Config
 from shared.services.firestore_service import FirestoreService
 from shared.services.bigquery_service import BigQueryService
+from shared.services.export_service import ExportService
 from shared.repositories.author_repository import AuthorRepository
 from shared.repositories.publication_repository import PublicationRepository
 
@@ -11,11 +19,109 @@ logging.basicConfig(level=logging.INFO)
 # Initialize services and repositories
 firestore_service = FirestoreService()
 bigquery_service = BigQueryService()
+export_service = ExportService(bigquery_service)
 publication_repository = PublicationRepository(firestore_service)
 author_repository = AuthorRepository(firestore_service, publication_repository)
 
+# Called with the assembled author whenever their stats were refreshed
+stats_refresh_hooks = []
+
+
+def on_stats_refresh(hook):
+    stats_refresh_hooks.append(hook)
+    return hook
+
+
+def _notify_stats_refresh(author):
+    for hook in stats_refresh_hooks:
+        try:
+            hook(author)
+        except Exception as e:
+            logging.error(f"Stats refresh hook failed for {author.get('scholar_id')}: {e}")
+
+
+# Shared by all request threads, so concurrent requests cannot fan out without bound
+executor = ThreadPoolExecutor(
+    max_workers=Config.STATS_FETCH_WORKERS, thread_name_prefix="stats"
+)
+
+# The all-authors export runs for minutes: it gets a thread of its own rather
+# than holding one of the request pool's
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export")
+
+# Stats refreshes and cache write-backs, kept off the request pool: a burst
+# of stale authors queues here instead of delaying other requests' lookups
+refresh_executor = ThreadPoolExecutor(
+    max_workers=Config.STATS_REFRESH_WORKERS, thread_name_prefix="stats-refresh"
+)
+refresh_slots = threading.BoundedSemaphore(Config.STATS_REFRESH_MAX_PENDING)
+
+# Stats refreshes in flight, (collection, doc_id) -> future of the data, so
+# that each runs only once however many requests need it
+refreshes_in_flight = {}
+refreshes_lock = threading.Lock()
+
+
+def _can_serve_stale(cached_timestamp):
+    """Whether stale cached stats may be served while they are recomputed."""
+    if not Config.STATS_STALE_WHILE_REVALIDATE:
+        return False
+    age = datetime.now(timezone.utc) - cached_timestamp
+    return age.total_seconds() <= Config.STATS_MAX_STALENESS
+
+
+def _refresh(collection, doc_id, compute, on_refresh=None, background=False):
+    """
+    Recomputes a stats cache document and writes it back; returns a future of
+    the data, shared with the refresh of the same document already in flight
+    if any. Background refreshes run on the refresh pool and are dropped
+    (None is returned) when it has too many pending; the others run on the
+    request pool, since a request is waiting for them.
+    """
+    key = (collection, doc_id)
+
+    def refresh():
+        try:
+            data = compute()
+            if data:
+                if background:
+                    firestore_service.set_firestore_cache(collection, doc_id, data)
+                else:
+                    refresh_executor.submit(
+                        firestore_service.set_firestore_cache, collection, doc_id, data
+                    )
+                if on_refresh:
+                    on_refresh(data)
+            return data
+        except Exception as e:
+            logging.error(f"Refresh of '{doc_id}' in {collection} failed: {e}")
+            raise
+        finally:
+            with refreshes_lock:
+                refreshes_in_flight.pop(key, None)
+            if background:
+                refresh_slots.release()
+
+    with refreshes_lock:
+        future = refreshes_in_flight.get(key)
+        if future is not None:
+            return future
+        if background:
+            if not refresh_slots.acquire(blocking=False):
+                logging.warning(
+                    f"Refresh queue is full, not refreshing '{doc_id}' in {collection}."
+                )
+                return None
+            logging.info(f"Serving stale '{doc_id}' in {collection} while it is refreshed.")
+        future = (refresh_executor if background else executor).submit(refresh)
+        refreshes_in_flight[key] = future
+    return future
+
 
 def get_author_stats(author_id):
+    if Config.STATS_PARALLEL:
+        return get_author_stats_parallel(author_id)
+
     # Fetch author details
     author = author_repository.get_author(author_id)
     if not author:
@@ -31,26 +137,50 @@ def get_author_stats(author_id):
     author_pub_stats, pub_stats_timestamp = firestore_service.get_firestore_cache(
         "author_pub_stats", author_id
     )
+    refreshed = refreshing = False
     if not author_pub_stats or author_last_modified > pub_stats_timestamp:
-        author_pub_stats = bigquery_service.get_author_pub_stats(author_id)
-        if author_pub_stats:
-            firestore_service.set_firestore_cache(
-                "author_pub_stats", author_id, author_pub_stats
+        if author_pub_stats and _can_serve_stale(pub_stats_timestamp):
+            refreshing = True
+            _refresh(
+                "author_pub_stats",
+                author_id,
+                partial(bigquery_service.get_author_pub_stats, author_id),
+                on_refresh=partial(_notify_pub_stats_refresh, dict(author)),
+                background=True,
             )
+        else:
+            author_pub_stats = bigquery_service.get_author_pub_stats(author_id)
+            if author_pub_stats:
+                refreshed = True
+                firestore_service.set_firestore_cache(
+                    "author_pub_stats", author_id, author_pub_stats
+                )
 
     # Fetch and cache author stats
     author_stats, stats_timestamp = firestore_service.get_firestore_cache(
         "author_stats", author_id
     )
     if not author_stats or author_last_modified > stats_timestamp:
-        author_stats = bigquery_service.get_author_stats(author_id)
-        if author_stats:
-            firestore_service.set_firestore_cache(
-                "author_stats", author_id, author_stats
+        if author_stats and _can_serve_stale(stats_timestamp):
+            refreshing = True
+            _refresh(
+                "author_stats",
+                author_id,
+                partial(bigquery_service.get_author_stats, author_id),
+                background=True,
             )
+        else:
+            author_stats = bigquery_service.get_author_stats(author_id)
+            if author_stats:
+                firestore_service.set_firestore_cache(
+                    "author_stats", author_id, author_stats
+                )
 
     author["publications"] = author_pub_stats or []
     author["stats"] = author_stats or {}
+    author["refreshing"] = refreshing
+    if refreshed:
+        _notify_stats_refresh(author)
 
     '''
     temporal_stats = bigquery_service.get_author_temporal_stats(author_id)
@@ -60,6 +190,169 @@ def get_author_stats(author_id):
     return author
 
 
+def get_author_stats_parallel(author_id):
+    """
+    Same result as the sequential path of get_author_stats, but the
+    independent Firestore reads and the BigQuery refreshes are issued
+    concurrently, and the cache write-backs happen in the background.
+    """
+    author_future = executor.submit(author_repository.get_author, author_id)
+    last_modified_future = executor.submit(
+        author_repository.get_author_last_modification, author_id
+    )
+    pub_stats_future = executor.submit(
+        firestore_service.get_firestore_cache, "author_pub_stats", author_id
+    )
+    stats_future = executor.submit(
+        firestore_service.get_firestore_cache, "author_stats", author_id
+    )
+
+    author = author_future.result()
+    if not author:
+        logging.warning(f"No author found with ID: {author_id}")
+        return None
+
+    author_last_modified = last_modified_future.result()
+    author["last_modified"] = author_last_modified
+
+    author_pub_stats, pub_stats_timestamp = pub_stats_future.result()
+    author_stats, stats_timestamp = stats_future.result()
+
+    # Refresh whatever is missing or stale, both queries at once
+    pub_stats_refresh = stats_refresh = None
+    refreshing = False
+    if not author_pub_stats or author_last_modified > pub_stats_timestamp:
+        if author_pub_stats and _can_serve_stale(pub_stats_timestamp):
+            refreshing = True
+            _refresh(
+                "author_pub_stats",
+                author_id,
+                partial(bigquery_service.get_author_pub_stats, author_id),
+                on_refresh=partial(_notify_pub_stats_refresh, dict(author)),
+                background=True,
+            )
+        else:
+            pub_stats_refresh = _refresh(
+                "author_pub_stats",
+                author_id,
+                partial(bigquery_service.get_author_pub_stats, author_id),
+            )
+    if not author_stats or author_last_modified > stats_timestamp:
+        if author_stats and _can_serve_stale(stats_timestamp):
+            refreshing = True
+            _refresh(
+                "author_stats",
+                author_id,
+                partial(bigquery_service.get_author_stats, author_id),
+                background=True,
+            )
+        else:
+            stats_refresh = _refresh(
+                "author_stats",
+                author_id,
+                partial(bigquery_service.get_author_stats, author_id),
+            )
+
+    refreshed = False
+    if pub_stats_refresh:
+        author_pub_stats = pub_stats_refresh.result()
+        refreshed = bool(author_pub_stats)
+    if stats_refresh:
+        author_stats = stats_refresh.result()
+
+    author["publications"] = author_pub_stats or []
+    author["stats"] = author_stats or {}
+    author["refreshing"] = refreshing
+    if refreshed:
+        _notify_stats_refresh(author)
+
+    return author
+
+
+def _notify_pub_stats_refresh(author, author_pub_stats):
+    _notify_stats_refresh({**author, "publications": author_pub_stats})
+
+
+def get_author_last_modified(author_id):
+    """Last modification of the author's data, or None for unknown authors."""
+    if not author_repository.get_author(author_id):
+        return None
+    return author_repository.get_author_last_modification(author_id)
+
+
+def get_cached_author_pub_stats(author_id, author_last_modified):
+    """
+    Publication stats of an author from the stats cache, recomputed only if
+    the cache is older than the author's last modification.
+    """
+    author_pub_stats, pub_stats_timestamp = firestore_service.get_firestore_cache(
+        "author_pub_stats", author_id
+    )
+    if not author_pub_stats or author_last_modified > pub_stats_timestamp:
+        author_pub_stats = bigquery_service.get_author_pub_stats(author_id)
+        if author_pub_stats:
+            firestore_service.set_firestore_cache(
+                "author_pub_stats", author_id, author_pub_stats
+            )
+    return author_pub_stats or []
+
+
+def get_authors_stats(author_ids):
+    """
+    Stats of many authors at once, as ``{scholar_id: stats}`` in the order of
+    ``author_ids``; unknown authors are left out. Cached stats that are still
+    current are read with multi-document gets, and all the others are
+    recomputed with a single BigQuery query.
+    """
+    authors = firestore_service.get_many_firestore_cache(
+        Config.FIRESTORE_COLLECTION_AUTHOR, author_ids
+    )
+    known_ids = [author_id for author_id in author_ids if author_id in authors]
+    watermarks = firestore_service.get_many_firestore_cache(
+        Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, known_ids
+    )
+    cached = firestore_service.get_many_firestore_cache("author_stats", known_ids)
+
+    stats = {}
+    stale_ids = []
+    for author_id in known_ids:
+        last_modified = max(
+            timestamp
+            for _, timestamp in (authors[author_id], watermarks.get(author_id, (None, None)))
+            if timestamp is not None
+        )
+        author_stats, stats_timestamp = cached.get(author_id, (None, None))
+        if author_stats and stats_timestamp >= last_modified:
+            stats[author_id] = author_stats
+        else:
+            stale_ids.append(author_id)
+
+    if stale_ids:
+        fresh = bigquery_service.get_authors_stats(stale_ids)
+        stats.update(fresh)
+        if fresh:
+            refresh_executor.submit(
+                firestore_service.set_many_firestore_cache, "author_stats", fresh
+            )
+    logging.info(
+        f"Batch stats for {len(author_ids)} authors: {len(known_ids)} known, "
+        f"{len(stale_ids)} recomputed."
+    )
+    return {author_id: stats[author_id] for author_id in known_ids if author_id in stats}
+
+
+def to_columns(records):
+    """Turns a list of dicts into ``{column: [values]}``, with NULLs as None."""
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    return {
+        column: [
+            None if pd.api.types.is_scalar(value) and pd.isna(value) else value
+            for value in (record.get(column) for record in records)
+        ]
+        for column in columns
+    }
+
+
 def get_publication_stats(author_id, author_pub_id):
     pub = publication_repository.get_publication(author_pub_id)
     if not pub:
@@ -73,10 +366,20 @@ def get_publication_stats(author_id, author_pub_id):
     pub_stats, pub_stats_timestamp = firestore_service.get_firestore_cache(
         "pub_stats", author_pub_id
     )
+    pub["refreshing"] = False
     if not pub_stats or author_last_modified > pub_stats_timestamp:
-        pub_stats = bigquery_service.get_publication_stats(author_pub_id)
-        if pub_stats:
-            firestore_service.set_firestore_cache("pub_stats", author_pub_id, pub_stats)
+        if pub_stats and _can_serve_stale(pub_stats_timestamp):
+            pub["refreshing"] = True
+            _refresh(
+                "pub_stats",
+                author_pub_id,
+                partial(bigquery_service.get_publication_stats, author_pub_id),
+                background=True,
+            )
+        else:
+            pub_stats = bigquery_service.get_publication_stats(author_pub_id)
+            if pub_stats:
+                firestore_service.set_firestore_cache("pub_stats", author_pub_id, pub_stats)
 
     # Append stats to author object
     if pub_stats:
@@ -88,7 +391,44 @@ def get_publication_stats(author_id, author_pub_id):
     return pub
 
 
-def download_all_authors_stats():
-    # Assuming bigquery_service is an instance of your BigQueryService class
-    df = bigquery_service.get_all_authors_stats()
-    return df
+EXPORT_LEASE = "all_authors_stats_export"
+
+
+def export_all_authors_stats(lease_token=None):
+    """Streams the stats of all authors to GCS in every export format."""
+    storage_service = export_service.storage_service
+    try:
+        return export_service.export_all_authors_stats()
+    except Exception as e:
+        logging.error(f"Export of all authors' stats failed: {e}")
+        return None
+    finally:
+        if lease_token is not None:
+            storage_service.release_lease(EXPORT_LEASE, lease_token)
+
+
+def ensure_all_authors_export():
+    """
+    Makes sure that a recent export exists, rebuilding it if needed.
+
+    Only the instance holding the export lease rebuilds. If a previous export
+    exists, it is rebuilt in the background and keeps being served meanwhile;
+    otherwise the lease holder builds it in the request. Returns whether an
+    export is available.
+    """
+    storage_service = export_service.storage_service
+    manifest_name = export_service.manifest_name()
+    # The manifest is written last, so its age is the age of the export
+    max_age = timedelta(hours=Config.EXPORT_MAX_AGE_HOURS)
+    if storage_service.file_updated_within(manifest_name, max_age):
+        return True
+
+    has_previous = storage_service.get_blob_metadata(manifest_name) is not None
+    lease_token = storage_service.acquire_lease(EXPORT_LEASE, Config.EXPORT_LEASE_TTL)
+    if lease_token is None:
+        return has_previous
+
+    if has_previous:
+        export_executor.submit(export_all_authors_stats, lease_token)
+        return True
+    return export_all_authors_stats(lease_token) is not None
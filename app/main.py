@@ -5,35 +5,44 @@ from flask import (
     redirect,
     url_for,
     flash,
-    send_file,
+    stream_with_context,
     jsonify,
+    abort,
+    make_response,
 )
 
 
-import os
+import json
 import logging
-import datetime
-import pandas as pd
 
 from shared.config import Config
 from scholar import get_similar_authors
 from data_analysis import (
+    author_repository,
+    firestore_service,
     get_author_stats,
-    download_all_authors_stats,
+    get_author_last_modified,
+    get_cached_author_pub_stats,
+    get_authors_stats,
+    to_columns,
+    ensure_all_authors_export,
+    export_service,
     get_publication_stats,
+    on_stats_refresh,
 )
-from visualization import (
-    generate_percentile_rank_plot,
-    generate_pip_plot,
-    generate_pub_citation_plot,
-    generate_author_h_index_plot,
-    generate_author_total_citations_plot,
-    generate_author_i10_index_plot,
-    generate_author_h_index_5y_plot,
-    # Add imports for other temporal plots as created
+from visualization import AUTHOR_PLOTS, png_data_uri
+from queue_handler import (
+    request_author,
+    number_of_tasks_in_queue,
+    queue_position,
+    task_queue_service,
 )
-from queue_handler import put_author_in_queue, pending_tasks, number_of_tasks_in_queue
 from refresh import refresh_authors
+from plot_cache import PlotCache, plot_version
+from render_pool import RenderPool, RenderQueueFull
+from author_watch import AuthorWatcher
+from csv_stream import iter_csv, iter_gzip
+from plot_data import PLOT_DATA_KINDS, PUB_PLOT_DATA, plot_data
 
 
 from shared.services.storage_service import StorageService
@@ -45,6 +54,14 @@ app = Flask(__name__)
 app.config.from_object(Config)
 
 storage_service = StorageService()
+plot_cache = PlotCache()
+render_pool = RenderPool()
+author_watcher = AuthorWatcher(firestore_service)
+
+
+@on_stats_refresh
+def prerender_plots(author):
+    render_pool.prerender_author_plots(author, plot_cache)
 
 
 @app.route("/")
@@ -60,16 +77,25 @@ def data():
 
 @app.route("/download_all_authors_stats")
 def download_all_authors_stats_route():
+    fmt = request.args.get("format", "csv")
+    if fmt not in Config.EXPORT_FORMATS:
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+
+    if not ensure_all_authors_export():
+        # Another instance is building the first export
+        response = make_response(
+            jsonify({"error": "The export is being generated, please retry shortly."}),
+            503,
+        )
+        response.headers["Retry-After"] = "30"
+        return response
+
     # Construct the URL to the file in the GCS bucket
-    destination_blob_name = "all_authors_stats.csv"
+    destination_blob_name = export_service.blob_name(fmt)
     file_url = (
         f"https://storage.googleapis.com/{Config.BUCKET_NAME}/{destination_blob_name}"
     )
 
-    if not storage_service.file_updated_within_24_hours(destination_blob_name):
-        df = download_all_authors_stats()
-        storage_service.upload_csv_to_gcs(df, destination_blob_name)
-
     # Use this function to get a signed URL and redirect the user to it
     # file_url = storage_service.generate_signed_url(destination_blob_name)
     # Redirect the user to the file URL for download
@@ -109,6 +135,16 @@ def refresh_authors_route():
     return jsonify(result)
 
 
+@app.route("/api/cache_stats")
+def cache_stats_route():
+    return jsonify(firestore_service.cache_stats())
+
+
+@app.route("/api/queue_lanes")
+def queue_lanes_route():
+    return jsonify(task_queue_service.lane_stats())
+
+
 @app.route("/results", methods=["GET"])
 def results():
     author_id = request.args.get("author_id", "")
@@ -119,50 +155,41 @@ def results():
 
     author = get_author_stats(author_id)
 
-    # If there is no author, put the author in the queue and render redirect.html
-    if not author: # If author data truly missing, enqueue
-        put_author_in_queue(author_id)
-        # queue_tasks = number_of_tasks_in_queue() # Old line
-        # Render redirect template without the task count
-        return render_template("redirect.html", author_id=author_id)
+    # If there is no author, make sure it is queued and render redirect.html
+    if not author:
+        status = request_author(author_id)
+        return render_template(
+            "redirect.html",
+            author_id=author_id,
+            state=status.get("state"),
+            position=status.get("position"),
+            pending=number_of_tasks_in_queue() if status.get("position") else None,
+        )
 
-    # Generate existing plots (PiP-AUC related)
+    # Existing plots (PiP-AUC related) are served, and cached, by plot_image
     plot1 = ""
     plot2 = ""
     if author.get("publications"):
-        df = pd.DataFrame(author["publications"])
-        author_name = author.get("name", "N/A")
-        current_year = datetime.datetime.now().year
-        # Ensure pub_year is numeric before calculation
-        df["pub_year"] = pd.to_numeric(df["pub_year"], errors="coerce")
-        # Drop rows where pub_year couldn't be converted
-        df.dropna(subset=["pub_year"], inplace=True)  
-        df["pub_year"] = df["pub_year"].astype(int)
-
-        df["age"] = current_year - df["pub_year"] + 1
-        df["num_citations_percentile"] = 100 * df["num_citations_percentile"]
-        df["num_papers_percentile"] = 100 * df["num_papers_percentile"]
-        plot1 = generate_percentile_rank_plot(df, author_name)
-        plot2 = generate_pip_plot(df, author_name)
+        # Stale stats being refreshed must not end up in an immutable URL
+        version = None if author["refreshing"] else plot_version(author["last_modified"])
+        plot1 = url_for(
+            "plot_image", author_id=author_id, plot_type="percentile_rank", v=version
+        )
+        plot2 = url_for("plot_image", author_id=author_id, plot_type="pip", v=version)
 
     
     temporal_plots = {}
     '''
     if author.get("temporal_stats"):
-        temporal_df = pd.DataFrame(author["temporal_stats"])
-        # Ensure 'state_year' is numeric for plotting
-        temporal_df["state_year"] = pd.to_numeric(
-            temporal_df["state_year"], errors="coerce"
-        )
-        temporal_df.dropna(subset=["state_year"], inplace=True)
-
-        if not temporal_df.empty:
-            temporal_plots["h_index"] = generate_author_h_index_plot(temporal_df)
-            temporal_plots["total_citations"] = generate_author_total_citations_plot(
-                temporal_df
-            )
-            temporal_plots["i10_index"] = generate_author_i10_index_plot(temporal_df)
-            temporal_plots["h_index_5y"] = generate_author_h_index_5y_plot(temporal_df)
+        # Rendered off the request thread, one job per metric
+        futures = {
+            kind: render_pool.submit(kind, author["temporal_stats"])
+            for kind in TEMPORAL_PLOTS
+        }
+        for kind, future in futures.items():
+            png = future.result(timeout=render_pool.timeout)
+            if png:
+                temporal_plots[kind] = png_data_uri(png)
     '''
 
     return render_template(
@@ -174,33 +201,224 @@ def results():
     )
 
 
+@app.route("/plot/<author_id>/<plot_type>.png")
+def plot_image(author_id, plot_type):
+    if plot_type not in AUTHOR_PLOTS:
+        abort(404)
+
+    last_modified = get_author_last_modified(author_id)
+    if last_modified is None:
+        abort(404)
+
+    key = plot_cache.key(author_id, plot_type, last_modified)
+    png = plot_cache.get(key)
+    if png is None:
+        author = get_author_stats(author_id)
+        if not author or not author.get("publications"):
+            abort(404)
+        try:
+            png = render_pool.render(
+                plot_type, author["publications"], author_name=author.get("name", "N/A")
+            )
+        except (RenderQueueFull, TimeoutError) as e:
+            logging.warning(f"Could not render {plot_type} plot for {author_id}: {e}")
+            response = make_response("Plot is being rendered, retry shortly.", 503)
+            response.headers["Retry-After"] = "5"
+            return response
+        if author["refreshing"]:
+            # Rendered from stale stats: neither cached nor validated
+            response = make_response(png)
+            response.mimetype = "image/png"
+            response.cache_control.no_store = True
+            return response
+        plot_cache.put(key, png)
+
+    response = make_response(png)
+    response.mimetype = "image/png"
+    response.set_etag(key)
+    if request.args.get("v") == plot_version(last_modified):
+        # The URL changes whenever the data does, so this URL never goes stale
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def author_status_payload(version, status):
+    status = status or {}
+    return {
+        "version": version,
+        "state": status.get("state"),
+        "ready": status.get("state") == "done",
+        "position": queue_position(status) if status.get("state") == "queued" else None,
+    }
+
+
+@app.route("/api/author_status/<author_id>")
+def author_status(author_id):
+    """
+    Ingestion state of an author, pushed as server-sent events when the
+    client accepts them, or long-polled otherwise: the response is held
+    until the state differs from ``state`` or ``wait`` seconds pass.
+    """
+    streaming = request.accept_mimetypes.best == "text/event-stream"
+    if author_repository.get_author(author_id):
+        payload = {"version": 0, "state": "done", "ready": True, "position": None}
+        if streaming:
+            return app.response_class(
+                f"data: {json.dumps(payload)}\n\n", mimetype="text/event-stream"
+            )
+        return jsonify(payload)
+
+    if streaming:
+        def events():
+            for change in author_watcher.stream(
+                author_id,
+                Config.AUTHOR_STATUS_STREAM_TIMEOUT,
+                Config.AUTHOR_STATUS_HEARTBEAT,
+            ):
+                if change is None:
+                    yield ": keepalive\n\n"
+                    continue
+                payload = author_status_payload(*change)
+                yield f"id: {payload['version']}\ndata: {json.dumps(payload)}\n\n"
+
+        response = app.response_class(
+            stream_with_context(events()), mimetype="text/event-stream"
+        )
+        response.cache_control.no_cache = True
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    wait = min(
+        request.args.get("wait", Config.AUTHOR_STATUS_WAIT, type=float),
+        Config.AUTHOR_STATUS_WAIT,
+    )
+    change = author_watcher.wait(author_id, request.args.get("state"), wait)
+    return jsonify(author_status_payload(*change))
+
+
+@app.route("/api/authors/stats", methods=["GET", "POST"])
+def authors_stats_route():
+    if request.method == "POST":
+        author_ids = (request.get_json(silent=True) or {}).get("ids") or []
+    else:
+        author_ids = request.args.get("ids", "").split(",")
+    if not isinstance(author_ids, list):
+        return jsonify({"error": "'ids' must be a list of scholar IDs"}), 400
+    author_ids = list(dict.fromkeys(str(a).strip() for a in author_ids if str(a).strip()))
+    if not author_ids:
+        return jsonify({"error": "Missing scholar IDs"}), 400
+    if len(author_ids) > Config.BATCH_STATS_MAX_IDS:
+        return jsonify(
+            {"error": f"At most {Config.BATCH_STATS_MAX_IDS} scholar IDs per request"}
+        ), 400
+
+    stats = get_authors_stats(author_ids)
+    return jsonify(
+        {
+            "count": len(stats),
+            "missing": [a for a in author_ids if a not in stats],
+            "columns": to_columns(list(stats.values())),
+        }
+    )
+
+
+@app.route("/api/plot_data/<author_id>/<kind>")
+def plot_data_route(author_id, kind):
+    if kind not in PLOT_DATA_KINDS:
+        abort(404)
+    pub_id = request.args.get("pub_id", "")
+    if kind in PUB_PLOT_DATA and not pub_id:
+        return jsonify({"error": "Missing pub_id"}), 400
+    max_points = min(
+        request.args.get("max_points", Config.PLOT_DATA_MAX_POINTS, type=int),
+        Config.PLOT_DATA_MAX_POINTS,
+    )
+
+    last_modified = get_author_last_modified(author_id)
+    if last_modified is None:
+        abort(404)
+
+    # Answer revalidations before loading any stats
+    etag = f"{author_id}/{kind}/{pub_id}/{plot_version(last_modified)}/{max_points}"
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
+
+    if kind in PUB_PLOT_DATA:
+        stats = get_publication_stats(author_id, pub_id)
+        records = stats.get("stats") if stats else None
+    else:
+        stats = get_author_stats(author_id)
+        records = stats.get("publications") if stats else None
+    if not records:
+        abort(404)
+
+    response = jsonify(plot_data(kind, records, max(max_points, 2)))
+    if stats["refreshing"]:
+        # Stale data must not be revalidated as current later on
+        response.cache_control.no_store = True
+        return response
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
 @app.route("/download/<author_id>")
 def download_results(author_id):
-    author = get_author_stats(author_id)
-
-    # Check if there is data to download
-    if len(author["publications"]) == 0:
+    last_modified = get_author_last_modified(author_id)
+    if last_modified is None:
         flash("No publications found to download.")
         return redirect(url_for("index"))
 
-    downloads_dir = os.path.join(app.root_path, "downloads")
-    if not os.path.exists(downloads_dir):
-        os.makedirs(downloads_dir)  # Create the downloads directory if it doesn't exist
+    # The CSV only changes with the author's data, so repeat downloads are
+    # answered from the ETag without loading the stats
+    gzipped = request.accept_encodings["gzip"] > 0
+    etag = f"{author_id}/{plot_version(last_modified)}" + ("/gzip" if gzipped else "")
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+        response.set_etag(etag)
+        return response
 
-    file_path = os.path.join(downloads_dir, f"{author_id}_results.csv")
+    publications = get_cached_author_pub_stats(author_id, last_modified)
 
-    pd.DataFrame(author["publications"]).to_csv(file_path, index=False)
+    # Check if there is data to download
+    if len(publications) == 0:
+        flash("No publications found to download.")
+        return redirect(url_for("index"))
 
-    return send_file(
-        file_path, as_attachment=True, download_name=f"{author_id}_results.csv"
+    chunks = iter_csv(publications)
+    if gzipped:
+        chunks = iter_gzip(chunks)
+    response = app.response_class(
+        stream_with_context(chunks), mimetype="text/csv"
+    )
+    if gzipped:
+        response.content_encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={author_id}_results.csv"
     )
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/publication/<author_id>/<pub_id>")
 def get_publication_details(author_id, pub_id):
     pub_stats = get_publication_stats(author_id, pub_id)
-    citations_plot = generate_pub_citation_plot(pd.DataFrame(pub_stats["stats"]))
     if pub_stats:
+        try:
+            png = render_pool.render("pub_citations", pub_stats["stats"])
+            citations_plot = png_data_uri(png) if png else ""
+        except (RenderQueueFull, TimeoutError) as e:
+            logging.warning(f"Could not render citations plot for {pub_id}: {e}")
+            citations_plot = ""
         return render_template(
             "publication_details.html",
             pub=pub_stats,
@@ -0,0 +1,91 @@
+"""
+Cache of rendered plot images.
+
+Plots are keyed by (author_id, plot type, author last_modified), so a key
+never goes stale: when the author's data changes the key changes with it, and
+only the first view after the change pays the rendering cost. Images live in
+memory, optionally backed by a local directory or by GCS so that they survive
+restarts and are shared across instances.
+"""
+import logging
+import os
+
+from shared.config import Config
+from shared.services.memory_cache import MemoryCache
+from shared.services.storage_service import StorageService
+
+
+def plot_version(last_modified):
+    """Version tag of an author's plots, derived from their last modification."""
+    return str(int(last_modified.timestamp()))
+
+
+class DiskPlotStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, png):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)  # readers never see a partial file
+
+
+class GCSPlotStore:
+    def __init__(self, storage_service, prefix="plots/"):
+        self.storage_service = storage_service
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.storage_service.download_bytes(self.prefix + key)
+
+    def put(self, key, png):
+        self.storage_service.upload_bytes(self.prefix + key, png, "image/png")
+
+
+class PlotCache:
+    def __init__(self, backend=None):
+        self.memory = MemoryCache(
+            max_bytes=Config.PLOT_CACHE_MAX_BYTES, default_ttl=Config.PLOT_CACHE_TTL
+        )
+        backend = backend or Config.PLOT_CACHE_BACKEND
+        if backend == "disk":
+            self.store = DiskPlotStore(Config.PLOT_CACHE_DIR)
+        elif backend == "gcs":
+            self.store = GCSPlotStore(StorageService())
+        elif backend == "memory":
+            self.store = None
+        else:
+            raise ValueError(f"Unknown plot cache backend: {backend}")
+
+    @staticmethod
+    def key(author_id, plot_type, last_modified):
+        return f"{author_id}/{plot_type}/{plot_version(last_modified)}.png"
+
+    def get(self, key):
+        png = self.memory.get("plots", key)
+        if png is None and self.store is not None:
+            try:
+                png = self.store.get(key)
+            except Exception as e:
+                logging.error(f"Error reading plot '{key}' from the plot store: {e}")
+            if png is not None:
+                self.memory.set("plots", key, png)
+        return png
+
+    def put(self, key, png):
+        self.memory.set("plots", key, png)
+        if self.store is not None:
+            try:
+                self.store.put(key, png)
+            except Exception as e:
+                logging.error(f"Error writing plot '{key}' to the plot store: {e}")
@@ -0,0 +1,66 @@
+"""
+Compact, columnar series behind the charts in visualization.py, for clients
+that draw the charts themselves.
+"""
+import numpy as np
+import pandas as pd
+
+from visualization import prepare_publications_dataframe
+
+# kind -> (columns, sort column); the first two columns are the x and y axes
+AUTHOR_PLOT_DATA = {
+    "percentile_rank": (
+        ["publication_rank", "num_citations_percentile", "age"],
+        "publication_rank",
+    ),
+    "pip": (
+        ["num_papers_percentile", "num_citations_percentile", "age"],
+        "num_papers_percentile",
+    ),
+}
+PUB_PLOT_DATA = {
+    "pub_citations": (
+        [
+            "citation_year",
+            "yearly_citations",
+            "perc_yearly_citations",
+            "perc_cumulative_citations",
+        ],
+        "citation_year",
+    ),
+}
+PLOT_DATA_KINDS = {**AUTHOR_PLOT_DATA, **PUB_PLOT_DATA}
+
+
+def downsample_indices(n, max_points):
+    """Evenly spaced indices into a series of n points, keeping both ends."""
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(int))
+
+
+def _compact(value):
+    if pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def plot_data(kind, records, max_points):
+    """
+    Returns ``{"kind", "total", "columns": {name: [values]}}`` for a chart,
+    sorted along its x axis and downsampled to at most ``max_points`` rows.
+    """
+    columns, sort_column = PLOT_DATA_KINDS[kind]
+    if kind in AUTHOR_PLOT_DATA:
+        df = prepare_publications_dataframe(records)
+    else:
+        df = pd.DataFrame(records)
+    df = df.reindex(columns=columns).sort_values(sort_column, kind="stable")
+    df = df.iloc[downsample_indices(len(df), max_points)]
+
+    return {
+        "kind": kind,
+        "total": len(records),
+        "columns": {column: [_compact(value) for value in df[column]] for column in columns},
+    }
@@ -1,24 +1,76 @@
 import logging
-from shared.services.task_queue_service import TaskQueueService
+from datetime import datetime, timezone
+
+from shared.config import Config
+from shared.services.firestore_service import FirestoreService
+from shared.services.region_router import RegionRouter
+from shared.services.task_queue_service import INTERACTIVE, TaskQueueService
+from shared.repositories.ingestion_status_repository import (
+    FAILED,
+    QUEUED,
+    IngestionStatusRepository,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Initialize services
-task_queue_service = TaskQueueService()
+firestore_service = FirestoreService()
+ingestion_status_repository = IngestionStatusRepository(firestore_service)
+task_queue_service = TaskQueueService(
+    ingestion_status_repository, region_router=RegionRouter(firestore_service)
+)
 
 
 def put_author_in_queue(author_id):
     """
     Enqueue a task to fetch a new copy of the author from Google Scholar
-    and store it in the database.
+    and store it in the database, in the interactive lane since a user is
+    waiting for it. The task is named uniquely, since request_author has
+    already checked the ingestion ledger for a live one.
     """
-    response = task_queue_service.enqueue_author_task(author_id)
+    response = task_queue_service.enqueue_author_task(
+        author_id, lane=INTERACTIVE, unique=True
+    )
     if response is None:
         logging.error(f"Could not create task for author ID: {author_id}")
     return response
 
 
+def request_author(author_id):
+    """
+    Makes sure that a missing author is on its way, enqueueing it only if the
+    ingestion ledger has no live record of it: pending authors are not
+    enqueued again until their record goes stale, and failed ones not until
+    the retry delay has passed. An author queued in a background lane is
+    enqueued again in the interactive one. Returns the author's ingestion
+    status, with its queue position while queued.
+    """
+    status = ingestion_status_repository.get_status(author_id)
+    if status is not None:
+        age = (datetime.now(timezone.utc) - status["updated_at"]).total_seconds()
+        limit = (
+            Config.INGESTION_RETRY_AFTER
+            if status["state"] == FAILED
+            else Config.INGESTION_STALE_AFTER
+        )
+        if age > limit:
+            status = None
+        elif status["state"] == QUEUED and status.get("lane") != INTERACTIVE:
+            status = None  # promote it past the background backlog
+
+    if status is None:
+        put_author_in_queue(author_id)
+        status = ingestion_status_repository.get_status(author_id) or {}
+
+    status["position"] = ingestion_status_repository.queue_position(status)
+    return status
+
+
+def queue_position(status):
+    return ingestion_status_repository.queue_position(status or {})
+
+
 def pending_tasks(author_id):
     return task_queue_service.check_pending_tasks(author_id)
 
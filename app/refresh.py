@@ -1,7 +1,8 @@
 import logging
 from shared.config import Config
 from shared.services.firestore_service import FirestoreService
-from shared.services.task_queue_service import TaskQueueService
+from shared.services.region_router import RegionRouter
+from shared.services.task_queue_service import BACKFILL, REFRESH, TaskQueueService
 from shared.repositories.author_repository import AuthorRepository
 from shared.repositories.publication_repository import PublicationRepository
 
@@ -12,7 +13,7 @@ logging.basicConfig(level=logging.INFO)
 
 # Initialize services
 firestore_service = FirestoreService()
-task_queue_service = TaskQueueService()
+task_queue_service = TaskQueueService(region_router=RegionRouter(firestore_service))
 publication_repository = PublicationRepository(firestore_service)
 author_repository = AuthorRepository(
     firestore_service, publication_repository
@@ -33,20 +34,22 @@ def refresh_authors(
     """
     Queue authors—and optionally new co‑authors—for update.
     If 'refresh' is empty, fall back to automatic selection.
+    Known authors go to the refresh lane, new co-authors to the backfill one.
     """
-    ids: set[str] = set(refresh or [])
+    lanes: dict[str, str] = dict.fromkeys(refresh or [], REFRESH)
 
     if include_new_coauthors:
-        ids.update(new_coauthors(num_authors))  # <-- add sampled co‑authors
+        for coauthor_id in new_coauthors(num_authors):  # <-- add sampled co‑authors
+            lanes.setdefault(coauthor_id, BACKFILL)
 
-    if not ids:
-        ids.update(get_authors_to_refresh(num_authors))
+    if not lanes:
+        lanes.update(dict.fromkeys(get_authors_to_refresh(num_authors), REFRESH))
 
     total_authors = 0
     total_pubs = 0
     authors = []
 
-    for scholar_id in ids:
+    for scholar_id, lane in lanes.items():
         doc = (
             firestore_service.db.collection(Config.FIRESTORE_COLLECTION_AUTHOR)
             .document(scholar_id)
@@ -54,7 +57,7 @@ def refresh_authors(
         )
 
         if not doc.exists:
-            if task_queue_service.enqueue_author_task(scholar_id):
+            if task_queue_service.enqueue_author_task(scholar_id, lane=lane):
                 total_authors += 1
                 authors.append({"author_id": scholar_id})
             continue
@@ -62,14 +65,14 @@ def refresh_authors(
         author = doc.to_dict().get("data")
         if not author:
             # Handle the case where the document exists but has no relevant data
-            if task_queue_service.enqueue_author_task(scholar_id):
+            if task_queue_service.enqueue_author_task(scholar_id, lane=lane):
                 total_authors += 1
                 authors.append({"doc_id": doc.id, "author_id": scholar_id})
             continue
 
         author_id = author.get("scholar_id")
         # Enqueue the author for updating
-        if task_queue_service.enqueue_author_task(scholar_id):
+        if task_queue_service.enqueue_author_task(scholar_id, lane=lane):
             publications = author.get("publications", [])
             total_authors += 1
             total_pubs += len(publications)
@@ -0,0 +1,111 @@
+"""
+Process pool that renders plots off the request threads.
+
+Matplotlib rendering is CPU-bound, so it runs in worker processes where it
+neither holds the GIL of the web server nor shares matplotlib state between
+threads. The number of pending jobs is bounded; callers that cannot queue a
+job, or whose job does not finish in time, get an exception and can degrade
+gracefully (e.g. answer 503 and let the browser retry).
+
+Workers are forked from a fork server that has preloaded render_worker, so
+they start with matplotlib and pandas already imported and never inherit the
+web server's gRPC threads. Their entry points live in render_worker, which
+does not import main; the container starts the server from serve.py so that
+workers do not re-run main's setup either.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from shared.config import Config
+from render_worker import init_worker, render
+from visualization import AUTHOR_PLOTS
+
+
+class RenderQueueFull(Exception):
+    """Raised when the pool already has the maximum number of pending jobs."""
+
+
+class RenderPool:
+    def __init__(self, max_workers=None, max_pending=None, timeout=None):
+        self.max_workers = max_workers or Config.RENDER_POOL_WORKERS
+        self.timeout = timeout or Config.RENDER_TIMEOUT
+        self._slots = threading.BoundedSemaphore(
+            max_pending or Config.RENDER_POOL_MAX_PENDING
+        )
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Started lazily, never by forking the web server (it runs gRPC threads)
+        with self._lock:
+            if self._executor is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["render_worker"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=init_worker,
+                )
+            return self._executor
+
+    def submit(self, kind, records, **kwargs):
+        """Queues a plot job and returns a future of the PNG bytes."""
+        if not self._slots.acquire(blocking=False):
+            raise RenderQueueFull(f"Render queue is full, rejected '{kind}' plot.")
+        try:
+            future = self._get_executor().submit(render, kind, records, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def render(self, kind, records, timeout=None, **kwargs):
+        """
+        Renders a plot and waits for it.
+
+        Raises RenderQueueFull or concurrent.futures.TimeoutError.
+        """
+        future = self.submit(kind, records, **kwargs)
+        return future.result(timeout=timeout or self.timeout)
+
+    def prerender_author_plots(self, author, plot_cache):
+        """
+        Renders an author's plots into the plot cache in the background, so
+        that the next page view finds them ready. Meant to be called when the
+        author's stats are refreshed.
+        """
+        author_id = author.get("scholar_id")
+        publications = author.get("publications")
+        if not author_id or not publications or not author.get("last_modified"):
+            return
+
+        for plot_type in AUTHOR_PLOTS:
+            key = plot_cache.key(author_id, plot_type, author["last_modified"])
+            if plot_cache.get(key) is not None:
+                continue
+            try:
+                future = self.submit(
+                    plot_type, publications, author_name=author.get("name", "N/A")
+                )
+            except RenderQueueFull as e:
+                logging.warning(f"Skipping pre-rendering for {author_id}: {e}")
+                return
+            future.add_done_callback(
+                lambda f, key=key: self._store(plot_cache, key, f)
+            )
+
+    @staticmethod
+    def _store(plot_cache, key, future):
+        try:
+            png = future.result()
+        except Exception as e:
+            logging.error(f"Pre-rendering of plot '{key}' failed: {e}")
+            return
+        if png:
+            plot_cache.put(key, png)
@@ -0,0 +1,23 @@
+"""
+Entry points of the render pool's worker processes.
+
+Workers are forked from a fork server that preloads this module, so it has
+to stay cheap to import: it must not import main, or anything else that
+creates clients or starts threads at import time.
+"""
+import logging
+
+import matplotlib
+
+from visualization import render_plot
+
+
+def init_worker():
+    """Runs once in each worker, before its first job."""
+    matplotlib.use("Agg")
+    logging.basicConfig(level=logging.INFO)
+
+
+def render(kind, records, **kwargs):
+    """Renders a plot and returns the PNG bytes (see visualization.render_plot)."""
+    return render_plot(kind, records, **kwargs)
@@ -1,26 +1,45 @@
 import logging
 from scholarly import scholarly
+from shared.config import Config
 from shared.services.firestore_service import FirestoreService
+from shared.services.author_name_index import (
+    AuthorNameIndex,
+    is_strong_match,
+    merge_authors,
+    name_key,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
 # Initialize services and repositories
 firestore_service = FirestoreService()
+author_name_index = AuthorNameIndex(firestore_service)
 
 
 def get_similar_authors(author_name):
-    # Fetch similar authors with caching logic
-    cached_data, _ = firestore_service.get_firestore_cache("queries", author_name)
+    # Local profiles first; without a strong local match, they are merged
+    # with the query cache or Google Scholar results
+    author_name_index.refresh_if_due()
+    local_authors = author_name_index.search(author_name)
+    strong = [a for a in local_authors if is_strong_match(author_name, a)]
+    if len(strong) >= Config.AUTHOR_INDEX_MIN_RESULTS:
+        logging.info(f"Found {len(strong)} local matches for '{author_name}'.")
+        return local_authors
+
+    query_key = name_key(author_name)
+    if not query_key:
+        return []
+    cached_data, _ = firestore_service.get_firestore_cache("queries", query_key)
     if cached_data:
         logging.info(f"Cache hit for similar authors of '{author_name}'.")
-        return cached_data
+        return merge_authors(local_authors, cached_data)
 
     authors = fetch_authors_from_scholarly(author_name)
     if authors:
         # Cache the fetched authors data
-        firestore_service.set_firestore_cache("queries", author_name, authors)
-    return authors
+        firestore_service.set_firestore_cache("queries", query_key, authors)
+    return merge_authors(local_authors, authors)
 
 
 def fetch_authors_from_scholarly(author_name):
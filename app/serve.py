@@ -0,0 +1,12 @@
+"""
+Entry point of the container.
+
+Worker processes started by multiprocessing re-run the parent's main script
+as ``__mp_main__``; starting the server from this script, with everything
+under the ``__main__`` guard, keeps them from re-running main's setup.
+"""
+
+if __name__ == "__main__":
+    from main import app
+
+    app.run(host="0.0.0.0", port=8080)
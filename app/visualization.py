@@ -1,19 +1,65 @@
 import matplotlib
 from matplotlib.figure import Figure
+import datetime
 import logging
 import numpy as np
 import pandas as pd
 import base64
+import functools
 from io import BytesIO
 
+PLOT_RC = {"font.size": 16}
+
+
+def _plot_style(plot_function):
+    """
+    Renders under a temporary rc context instead of mutating the global
+    matplotlib.rcParams on every plot.
+    """
+
+    @functools.wraps(plot_function)
+    def wrapper(*args, **kwargs):
+        with matplotlib.rc_context(PLOT_RC):
+            return plot_function(*args, **kwargs)
+
+    return wrapper
+
+
+def prepare_publications_dataframe(publications):
+    """Publication stats as plotted: numeric years, age, 0-100 percentiles."""
+    df = pd.DataFrame(publications)
+    current_year = datetime.datetime.now().year
+    # Ensure pub_year is numeric before calculation
+    df["pub_year"] = pd.to_numeric(df["pub_year"], errors="coerce")
+    # Drop rows where pub_year couldn't be converted
+    df.dropna(subset=["pub_year"], inplace=True)
+    df["pub_year"] = df["pub_year"].astype(int)
+
+    df["age"] = current_year - df["pub_year"] + 1
+    df["num_citations_percentile"] = 100 * df["num_citations_percentile"]
+    df["num_papers_percentile"] = 100 * df["num_papers_percentile"]
+    return df
+
+
+def png_data_uri(png):
+    data = base64.b64encode(png).decode("ascii")
+    return f"data:image/png;base64,{data}"
+
 
 def generate_percentile_rank_plot(dataframe, author_name):
+    return png_data_uri(percentile_rank_plot_png(dataframe, author_name))
+
+
+def generate_pip_plot(dataframe, author_name):
+    return png_data_uri(pip_plot_png(dataframe, author_name))
+
+
+@_plot_style
+def percentile_rank_plot_png(dataframe, author_name):
     try:
         fig = Figure(figsize=(10, 10), dpi=100)
         ax = fig.subplots(1, 1)  # Adjusted for better resolution
 
-        matplotlib.rcParams.update({"font.size": 16})
-
         marker_size = 40
 
         # First subplot (Rank vs Percentile Score)
@@ -35,22 +81,20 @@ def generate_percentile_rank_plot(dataframe, author_name):
         buf = BytesIO()
         fig.tight_layout()
         fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
 
     except Exception as e:
         logging.error(f"Error in generate_plot for {author_name}: {e}")
         raise
 
-    return f"data:image/png;base64,{data}"
+    return buf.getvalue()
 
 
-def generate_pip_plot(dataframe, author_name):
+@_plot_style
+def pip_plot_png(dataframe, author_name):
     try:
         fig = Figure(figsize=(10, 10), dpi=100)
         ax = fig.subplots(1, 1)
 
-        matplotlib.rcParams.update({"font.size": 16})
-
         marker_size = 40
 
         # Second subplot (Productivity Percentiles)
@@ -73,16 +117,28 @@ def generate_pip_plot(dataframe, author_name):
         buf = BytesIO()
         fig.tight_layout()
         fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
 
     except Exception as e:
         logging.error(f"Error in generate_plot for {author_name}: {e}")
         raise
 
-    return f"data:image/png;base64,{data}"
+    return buf.getvalue()
+
+
+# Author-level plots served as images, by plot type
+AUTHOR_PLOTS = {
+    "percentile_rank": percentile_rank_plot_png,
+    "pip": pip_plot_png,
+}
 
 
 def generate_pub_citation_plot(df):
+    png = pub_citation_plot_png(df)
+    return png_data_uri(png) if png else ""
+
+
+@_plot_style
+def pub_citation_plot_png(df):
     try:
         df["citation_year"] = pd.to_datetime(df["citation_year"], format="%Y")
 
@@ -92,7 +148,7 @@ def generate_pub_citation_plot(df):
 
         fig = Figure(figsize=(10, 5), dpi=100)
         ax1 = fig.subplots(1, 1)  # Adjusted for better resolution
-        matplotlib.rcParams.update({"font.size": 16})
+
         # Plotting yearly_citations as a bar plot
         color = "tab:blue"
         ax1.set_xlabel("Citation Year")
@@ -137,12 +193,11 @@ def generate_pub_citation_plot(df):
         fig.tight_layout()
         buf = BytesIO()
         fig.savefig(buf, format="png")
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
 
     except Exception as e:
         logging.error(f"Error generating publication citations plot: {e}")
-        return ""
-    return f"data:image/png;base64,{data}"
+        return None
+    return buf.getvalue()
 
 
 def generate_citations_over_time_plot(dataframe, publication_title):
@@ -205,7 +260,14 @@ def generate_percentiles_over_time_plot(dataframe, publication_title):
     return f"data:image/png;base64,{data}"
 
 
-def _generate_temporal_plot(
+def _generate_temporal_plot(temporal_df, **plot_args):
+    """Helper function to generate a dual-axis temporal plot."""
+    png = _temporal_plot_png(temporal_df, **plot_args)
+    return png_data_uri(png) if png else ""  # Empty string on missing data or error
+
+
+@_plot_style
+def _temporal_plot_png(
     temporal_df,
     y_value_col,
     y_perc_col,
@@ -213,20 +275,17 @@ def _generate_temporal_plot(
     y_value_label,
     y_perc_label="Percentile",
 ):
-    """Helper function to generate a dual-axis temporal plot."""
     if (
         temporal_df.empty
         or y_value_col not in temporal_df.columns
         or y_perc_col not in temporal_df.columns
     ):
         logging.warning(f"Missing data for temporal plot: {title}")
-        return ""  # Return empty string or placeholder image data
+        return None
 
     try:
         fig = Figure(figsize=(10, 5), dpi=100)
         ax1 = fig.subplots(1, 1)
-        matplotlib.rcParams.update({"font.size": 16})
-
         # Primary y-axis (Metric Value)
         color1 = "tab:blue"
         ax1.set_xlabel("Year")
@@ -277,54 +336,78 @@ def _generate_temporal_plot(
 
         buf = BytesIO()
         fig.savefig(buf, format="png", bbox_inches="tight")  # Use bbox_inches='tight'
-        data = base64.b64encode(buf.getbuffer()).decode("ascii")
-        return f"data:image/png;base64,{data}"
+        return buf.getvalue()
 
     except Exception as e:
         logging.error(f"Error generating temporal plot '{title}': {e}")
-        return ""  # Return empty string on error
+        return None
 
 
-def generate_author_h_index_plot(temporal_df):
-    return _generate_temporal_plot(
-        temporal_df,
+TEMPORAL_PLOTS = {
+    "h_index": dict(
         y_value_col="h_index",
         y_perc_col="h_index_percentile",
         title="H-Index Evolution Over Time",
         y_value_label="H-Index Value",
-    )
-
-
-def generate_author_total_citations_plot(temporal_df):
-    return _generate_temporal_plot(
-        temporal_df,
+    ),
+    "total_citations": dict(
         y_value_col="total_citations",
         y_perc_col="total_citations_percentile",
         title="Total Citations Evolution Over Time",
         y_value_label="Total Citations",
-    )
-
-
-def generate_author_i10_index_plot(temporal_df):
-    return _generate_temporal_plot(
-        temporal_df,
+    ),
+    "i10_index": dict(
         y_value_col="i10_index",
         y_perc_col="i10_index_percentile",
         title="i10-Index Evolution Over Time",
         y_value_label="i10-Index Value",
-    )
-
-
-# Add similar functions for h_index_5y, i10_index_5y, total_recent_citations_5y, total_publications etc.
-# Example for 5y H-index:
-def generate_author_h_index_5y_plot(temporal_df):
-    return _generate_temporal_plot(
-        temporal_df,
+    ),
+    # Add similar entries for i10_index_5y, total_recent_citations_5y, total_publications etc.
+    "h_index_5y": dict(
         y_value_col="h_index_5y",
         y_perc_col="h_index_5y_percentile",
         title="H-Index (Last 5 Years) Evolution Over Time",
         y_value_label="H-Index (5y) Value",
-    )
+    ),
+}
+
+
+def generate_author_h_index_plot(temporal_df):
+    return _generate_temporal_plot(temporal_df, **TEMPORAL_PLOTS["h_index"])
+
+
+def generate_author_total_citations_plot(temporal_df):
+    return _generate_temporal_plot(temporal_df, **TEMPORAL_PLOTS["total_citations"])
+
 
+def generate_author_i10_index_plot(temporal_df):
+    return _generate_temporal_plot(temporal_df, **TEMPORAL_PLOTS["i10_index"])
+
+
+def generate_author_h_index_5y_plot(temporal_df):
+    return _generate_temporal_plot(temporal_df, **TEMPORAL_PLOTS["h_index_5y"])
 
-# --- END NEW ---
+
+def render_plot(kind, records, **kwargs):
+    """
+    Renders a plot from JSON-like records and returns the PNG bytes (or None).
+
+    This is the entry point of the render pool workers, so it only takes
+    picklable arguments: publication stats for the author plots, publication
+    citation stats for "pub_citations" and temporal stats for TEMPORAL_PLOTS.
+    """
+    if kind in AUTHOR_PLOTS:
+        df = prepare_publications_dataframe(records)
+        return AUTHOR_PLOTS[kind](df, kwargs.get("author_name", "N/A"))
+    if kind == "pub_citations":
+        return pub_citation_plot_png(pd.DataFrame(records))
+    if kind in TEMPORAL_PLOTS:
+        temporal_df = pd.DataFrame(records)
+        if not temporal_df.empty:
+            # Ensure 'state_year' is numeric for plotting
+            temporal_df["state_year"] = pd.to_numeric(
+                temporal_df["state_year"], errors="coerce"
+            )
+            temporal_df.dropna(subset=["state_year"], inplace=True)
+        return _temporal_plot_png(temporal_df, **TEMPORAL_PLOTS[kind])
+    raise ValueError(f"Unknown plot kind: {kind}")
@@ -1,6 +1,11 @@
 import functions_framework
+import hashlib
 import json
 import logging
+import os
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from flask import jsonify
 
 from scholarly import scholarly
@@ -8,19 +13,76 @@ from scholarly.data_types import PublicationSource
 
 from shared.config import Config
 from shared.utils import convert_integers_to_strings
+from shared.services.crawl_controller import CrawlThrottled
 from shared.services.firestore_service import FirestoreService
+from shared.services.region_router import RegionRouter
+from shared.services.scholar_response_cache import ScholarResponseCache
+from shared.services.task_queue_service import (
+    ALREADY_EXISTS,
+    CREATED,
+    REFRESH,
+    TaskQueueService,
+)
+from shared.repositories.publication_repository import PublicationRepository
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
 # Instantiate services
 firestore_service = FirestoreService()
+scholar_cache = ScholarResponseCache.from_config()
+if scholar_cache is not None:
+    scholar_cache.install()
+publication_repository = PublicationRepository(firestore_service)
+region_router = RegionRouter(firestore_service)
+task_queue_service = TaskQueueService(region_router=region_router)
+
+# Per-item statuses of a batch
+FILLED = "filled"
+ERROR = "error"
+TIMEOUT = "timeout"
+DEFERRED = "deferred"  # Google Scholar is throttling
+INVALID = "invalid"
 
 
 @functions_framework.http
 def fill_publication(request):
-    """HTTP Cloud Function to fill publication details from Google Scholar and cache them."""
-    request_json = request.get_json(silent=True)
+    """HTTP Cloud Function to fill publication details from Google Scholar and cache them.
+
+    Accepts either one publication, ``{"pub": {...}}``, or a batch,
+    ``{"pubs": [...]}``; see process_publication_batch.
+    """
+    request_json = request.get_json(silent=True) or {}
+    # Priority lane of the task, kept by the publications it requeues
+    lane = request_json.get("lane")
+    if lane not in Config.QUEUE_LANES:
+        lane = REFRESH
+    # Region this function runs in, as picked by the task's router
+    region = (
+        request_json.get("region") or os.getenv("FUNCTION_REGION") or Config.FUNCTION_LOCATION
+    )
+
+    if "pubs" in request_json:
+        pubs = request_json["pubs"]
+        if not isinstance(pubs, list) or not pubs:
+            return jsonify({"error": "Missing or invalid 'pubs' data"}), 400
+        if len(pubs) > Config.FILL_BATCH_MAX_PUBS:
+            return jsonify(
+                {"error": f"At most {Config.FILL_BATCH_MAX_PUBS} publications per batch"}
+            ), 400
+        results = process_publication_batch(
+            pubs, region, lane, request.headers.get("X-CloudTasks-TaskName")
+        )
+        if any(
+            result["status"] not in (FILLED, INVALID) and not result.get("requeued")
+            for result in results
+        ):
+            # Cloud Tasks retries the batch: publications already requeued
+            # are requeued under the same names, so not twice
+            return jsonify(
+                {"error": "Failed to requeue publications", "results": results}
+            ), 500
+        return jsonify({"results": results}), 200
 
     # Validate input
     pub = request_json.get("pub")
@@ -29,33 +91,160 @@ def fill_publication(request):
         return jsonify({"error": "Missing or invalid 'pub' data"}), 400
 
     try:
-        filled_pub = process_publication(pub)
+        filled_pub = process_publication(pub, region)
         return jsonify(filled_pub), 200
+    except CrawlThrottled as e:
+        logging.warning(f"Google Scholar is throttling ({e.outcome}), deferring.")
+        response = jsonify({"error": "Google Scholar is throttling requests"})
+        response.headers["Retry-After"] = str(e.retry_after())
+        return response, 503
     except Exception as e:
         logging.error(f"Failed to process publication: {e}")
         return jsonify({"error": "Failed to process publication"}), 500
 
 
-def process_publication(pub):
+def process_publication(pub, region=None):
     """Fetches, serializes, and caches publication details."""
     author_pub_id = pub["author_pub_id"]
-    logging.info(f"Fetching publication details for {author_pub_id}")
+    serialized_pub = fetch_publication(pub, region)
+
+    # Cache publication details (also bumps the author's last-modified watermark)
+    publication_repository.save_publication(author_pub_id, serialized_pub)
+
+    logging.info(
+        f"Publication details for {author_pub_id} have been updated and cached."
+    )
+    if scholar_cache is not None:
+        logging.info(f"Scholar page cache: {scholar_cache.stats()}")
+    return serialized_pub
+
+
+def fetch_publication(pub, region=None):
+    """Fetches publication details from Google Scholar, serialized for storage."""
+    logging.info(f"Fetching publication details for {pub['author_pub_id']}")
 
+    pub = dict(pub)
     pub["source"] = PublicationSource.AUTHOR_PUBLICATION_ENTRY
     pub["container_type"] = "Publication"
 
-    # Fetch publication details
-    detailed_pub = scholarly.fill(pub)
+    # Fetch publication details, paced by the crawl controller
+    detailed_pub = region_router.crawl_controller(region).call(scholarly.fill, pub)
 
     # Convert large integers to strings to avoid serialization issues
-    serialized_pub = convert_integers_to_strings(json.loads(json.dumps(detailed_pub)))
+    return convert_integers_to_strings(json.loads(json.dumps(detailed_pub)))
 
-    # Cache publication details
-    firestore_service.set_firestore_cache(
-        Config.FIRESTORE_COLLECTION_PUB, author_pub_id, serialized_pub
+
+def process_publication_batch(pubs, region=None, lane=REFRESH, task_name=None):
+    """Fills a batch of publications and caches them as they complete.
+
+    Fills run concurrently (Config.FILL_BATCH_CONCURRENCY at a time) through
+    the process-wide scholarly session; a fill taking longer than
+    Config.FILL_ITEM_TIME_BUDGET is given up on, and so are the fills still
+    running when the batch has taken Config.FILL_BATCH_TIME_BUDGET. Filled
+    publications are stored in groups of Config.FILL_WRITE_GROUP, so that the
+    work done survives the function being cut off. Publications that could
+    not be filled or stored are requeued as single-publication tasks in the
+    batch's lane, which Cloud Tasks then retries on its own (after the crawl
+    pause if Scholar is throttling). Their names derive from ``task_name``,
+    the batch task's, when given, so that the requeues of a retried batch
+    come back as ALREADY_EXISTS instead of duplicating the tasks.
+
+    Returns:
+        list: One ``{"author_pub_id", "status"[, "error", "requeued"]}``
+            per input item; ``requeued`` tells whether a failed item was.
+    """
+    results = [{"author_pub_id": None, "status": INVALID} for _ in pubs]
+    valid = {}
+    for index, pub in enumerate(pubs):
+        if isinstance(pub, dict) and pub.get("author_pub_id"):
+            results[index]["author_pub_id"] = pub["author_pub_id"]
+            valid[index] = pub
+        else:
+            logging.error(f"Invalid publication data at batch position {index}.")
+
+    filled = {}  # filled but not stored yet
+    stored = 0
+
+    def store():
+        nonlocal stored
+        saved = publication_repository.save_publications(
+            {valid[index]["author_pub_id"]: pub for index, pub in filled.items()}
+        )
+        if saved == len(filled):
+            stored += saved
+        else:
+            logging.error(f"Failed to store {len(filled)} filled publications.")
+            for index in filled:
+                results[index].update(status=ERROR, error="store failed")
+        filled.clear()
+
+    budget = Config.FILL_ITEM_TIME_BUDGET
+    workers = min(Config.FILL_BATCH_CONCURRENCY, len(valid)) or 1
+    # Fills cannot be interrupted: stuck ones keep their worker busy, so the
+    # batch as a whole is also bounded, by the time its items would take if
+    # every one of them used its full budget, and by the function's timeout.
+    batch_deadline = time.monotonic() + min(
+        budget * -(-len(valid) // workers), Config.FILL_BATCH_TIME_BUDGET
     )
+    started = {}
+
+    def fill(index, pub):
+        started[index] = time.monotonic()
+        return fetch_publication(pub, region)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(fill, index, pub): index for index, pub in valid.items()}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = futures[future]
+            try:
+                filled[index] = future.result()
+                results[index]["status"] = FILLED
+            except CrawlThrottled as e:
+                results[index].update(status=DEFERRED, error=e.outcome)
+            except Exception as e:
+                logging.error(f"Failed to fill publication {valid[index]['author_pub_id']}: {e}")
+                results[index].update(status=ERROR, error=str(e))
+        now = time.monotonic()
+        for future in list(pending):
+            index = futures[future]
+            if now > batch_deadline or (
+                index in started and now - started[index] > budget
+            ):
+                logging.error(f"Time budget exceeded filling {valid[index]['author_pub_id']}.")
+                results[index]["status"] = TIMEOUT
+                pending.discard(future)
+        if len(filled) >= Config.FILL_WRITE_GROUP or (filled and not pending):
+            store()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    failed = [index for index in valid if results[index]["status"] != FILLED]
+    requeued = 0
+    if failed:
+        # Named after the batch task, so that a retried batch's requeues
+        # come back as ALREADY_EXISTS
+        retry_id = (
+            hashlib.sha1(task_name.encode()).hexdigest()[:12]
+            if task_name
+            else uuid.uuid4().hex[:12]
+        )
+        outcomes = task_queue_service.enqueue_publication_tasks(
+            [valid[index] for index in failed], retry=retry_id, lane=lane
+        )
+        outcomes = {name.rsplit("/", 1)[-1]: outcome for name, outcome in outcomes.items()}
+        for index in failed:
+            task_id = task_queue_service.publication_task_id(valid[index], retry_id)
+            results[index]["requeued"] = outcomes.get(task_id) in (CREATED, ALREADY_EXISTS)
+            requeued += results[index]["requeued"]
+        if requeued < len(failed):
+            logging.error(f"Failed to requeue {len(failed) - requeued} publications.")
 
     logging.info(
-        f"Publication details for {author_pub_id} have been updated and cached."
+        f"Batch of {len(pubs)} publications: {stored} filled, "
+        f"{requeued} of {len(failed)} failed requeued, {len(pubs) - len(valid)} invalid."
     )
-    return serialized_pub
+    if scholar_cache is not None:
+        logging.info(f"Scholar page cache: {scholar_cache.stats()}")
+    return results
@@ -3,28 +3,51 @@ import functions_framework
 import logging
 from flask import jsonify
 from scholarly import scholarly
+from shared.config import Config
 from shared.services.firestore_service import FirestoreService
+from shared.services.author_name_index import (
+    AuthorNameIndex,
+    is_strong_match,
+    merge_authors,
+    name_key,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
 # Initialize Firestore service (caches across invocations)
 firestore_service = FirestoreService()
+author_name_index = AuthorNameIndex(firestore_service)
+# Start loading the index while the instance starts, not within a request
+author_name_index.refresh_if_due()
 
 
 def get_similar_authors(author_name: str):
     """
-    Fetches or retrieves cached similar authors for the given name.
+    Searches the local name index first; without a strong local match, the
+    local matches are merged with the query cache or Google Scholar results.
     """
-    cached_data, _ = firestore_service.get_firestore_cache("queries", author_name)
+    # Refreshed in the background: lookups use what is loaded so far, and
+    # fall back to the query cache and Google Scholar without a strong match
+    author_name_index.refresh_if_due()
+    local_authors = author_name_index.search(author_name)
+    strong = [a for a in local_authors if is_strong_match(author_name, a)]
+    if len(strong) >= Config.AUTHOR_INDEX_MIN_RESULTS:
+        logging.info(f"Found {len(strong)} local matches for '{author_name}'.")
+        return local_authors
+
+    query_key = name_key(author_name)
+    if not query_key:
+        return []
+    cached_data, _ = firestore_service.get_firestore_cache("queries", query_key)
     if cached_data:
         logging.info(f"Cache hit for similar authors of '{author_name}'.")
-        return cached_data
+        return merge_authors(local_authors, cached_data)
 
     authors = fetch_authors_from_scholarly(author_name)
     if authors:
-        firestore_service.set_firestore_cache("queries", author_name, authors)
-    return authors
+        firestore_service.set_firestore_cache("queries", query_key, authors)
+    return merge_authors(local_authors, authors)
 
 
 def fetch_authors_from_scholarly(author_name: str):
@@ -2,26 +2,37 @@ import functions_framework
 import json
 import logging
 import copy
-import time
+import os
+from datetime import datetime, timedelta, timezone
 from flask import jsonify
 from scholarly import scholarly
 
 
+from shared.config import Config
 from shared.utils import convert_integers_to_strings
+from shared.services.crawl_controller import CrawlThrottled
 from shared.services.firestore_service import FirestoreService
-from shared.services.task_queue_service import TaskQueueService
+from shared.services.region_router import RegionRouter
+from shared.services.scholar_response_cache import ScholarResponseCache
+from shared.services.task_queue_service import FAILED, REFRESH, THROTTLED, TaskQueueService
 from shared.repositories.author_repository import AuthorRepository
 from shared.repositories.publication_repository import PublicationRepository
+from shared.repositories.ingestion_status_repository import IngestionStatusRepository
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 
 # Instantiate services
 firestore_service = FirestoreService()
-task_queue_service = TaskQueueService()
+scholar_cache = ScholarResponseCache.from_config()
+if scholar_cache is not None:
+    scholar_cache.install()
+region_router = RegionRouter(firestore_service)
+task_queue_service = TaskQueueService(region_router=region_router)
 
 publication_repository = PublicationRepository(firestore_service)
 author_repository = AuthorRepository(firestore_service, publication_repository)
+ingestion_status_repository = IngestionStatusRepository(firestore_service)
 
 
 @functions_framework.http
@@ -38,59 +49,107 @@ def search_author_id(request):
     skip_pubs = request.args.get("skip_pubs") or (
         request.get_json(silent=True) or {}
     ).get("skip_pubs")
+    # Priority lane of the task, which its publications inherit
+    lane = (request.get_json(silent=True) or {}).get("lane")
+    if lane not in Config.QUEUE_LANES:
+        lane = REFRESH
+    # Region this function runs in, as picked by the task's router
+    region = (
+        (request.get_json(silent=True) or {}).get("region")
+        or os.getenv("FUNCTION_REGION")
+        or Config.FUNCTION_LOCATION
+    )
 
     if not scholar_id:
         return jsonify({"error": "Missing author id"}), 400
 
-    author_info = process_author(scholar_id, skip_pubs)
+    status = ingestion_status_repository.get_status(scholar_id) or {}
+    if status.get("pending_since"):
+        waited = datetime.now(timezone.utc) - status["pending_since"]
+        logging.info(
+            f"Author {scholar_id} waited {waited.total_seconds():.0f}s in the {lane} lane."
+        )
+    ingestion_status_repository.mark_fetching(scholar_id)
+    try:
+        author_info, refresh = process_author(scholar_id, skip_pubs, region, lane)
+    except CrawlThrottled as e:
+        # Back in the queue: Cloud Tasks retries after its backoff
+        ingestion_status_repository.mark_queued(scholar_id)
+        return throttled_response(e)
     if author_info is None:
+        ingestion_status_repository.mark_failed(
+            scholar_id, "Failed to fetch or process author data"
+        )
         return jsonify({"error": "Failed to fetch or process author data"}), 500
 
+    ingestion_status_repository.mark_done(scholar_id, publications=refresh)
+    if scholar_cache is not None:
+        logging.info(f"Scholar page cache: {scholar_cache.stats()}")
     return jsonify(author_info), 200
 
 
-def process_author(scholar_id, skip_pubs=None):
+def throttled_response(error):
+    """503 telling Cloud Tasks to come back after the crawl pause."""
+    logging.warning(f"Google Scholar is throttling ({error.outcome}), deferring.")
+    response = jsonify({"error": "Google Scholar is throttling requests"})
+    response.headers["Retry-After"] = str(error.retry_after())
+    return response, 503
+
+
+def process_author(scholar_id, skip_pubs=None, region=None, lane=REFRESH):
     """Fetches and processes an author's information and publications.
     Args:
         scholar_id (str): Google Scholar ID of the author.
+        region (str): Region of this function, whose crawl budget applies.
+        lane (str): Priority lane for the publication tasks.
     Returns:
-        dict: Serialized author information, or None upon failure.
+        tuple: Serialized author information (None upon failure), and the
+            counts of the publication delta refresh (None if skipped).
     """
-    author = fetch_author(scholar_id)
+    author = fetch_author(scholar_id, region)
     if author is None:
         logging.error(f"No information returned for author {scholar_id}.")
-        return None
+        return None, None
 
     serialized_author = serialize_author(author)
     if not serialized_author:
         logging.error(f"Failed to serialize author {scholar_id}.")
-        return None
+        return None, None
 
     success = author_repository.save_author(scholar_id, serialized_author)
     logging.info(f"Saved author {scholar_id}.")
 
     if not success:
         logging.error(f"Failed to store author {scholar_id} in Firestore.")
-        return None
+        return None, None
 
-    # TODO: When the number of publications are large, the app
-    # does not work well. We should consider refactoring this.
+    refresh = None
     if skip_pubs is None:
-        enqueue_publications(author.get("publications", []))
+        publications, refresh = select_publications_to_fill(
+            scholar_id, author.get("publications", [])
+        )
+        enqueue_publications(publications, lane)
 
-    return serialized_author
+    return serialized_author, refresh
 
 
-def fetch_author(scholar_id):
+def fetch_author(scholar_id, region=None):
     """Fetches detailed author data from Google Scholar.
     Args:
         scholar_id (str): The unique identifier for the author.
+        region (str): Region of this function, whose crawl budget applies.
     Returns:
         dict: Author data, or None if an error occurs.
+    Raises:
+        CrawlThrottled: while Google Scholar is throttling us.
     """
     try:
         logging.info(f"Fetching author entry from Google Scholar for {scholar_id}")
-        return scholarly.fill(scholarly.search_author_id(scholar_id))
+        return region_router.crawl_controller(region).call(
+            lambda: scholarly.fill(scholarly.search_author_id(scholar_id))
+        )
+    except CrawlThrottled:
+        raise
     except Exception as e:
         logging.error(
             f"Error fetching author data from Google Scholar for {scholar_id}: {e}"
@@ -98,17 +157,71 @@ def fetch_author(scholar_id):
         return None
 
 
-def enqueue_publications(publications):
-    """Enqueues tasks for processing each publication.
+def _citations(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def select_publications_to_fill(scholar_id, publications):
+    """Compares the author's listing with the stored publications.
+    Only new publications, those whose citation count changed and those
+    filled more than Config.PUB_REFILL_MAX_AGE_DAYS ago need filling.
     Args:
-        publications (list): A list of publication data dictionaries.
+        scholar_id (str): Google Scholar ID of the author.
+        publications (list): Publications of the fresh author listing.
+    Returns:
+        tuple: The publications to fill, and counts per reason.
     """
+    publications = [pub for pub in publications if pub.get("author_pub_id")]
+    stored = publication_repository.get_publication_citations(scholar_id)
+    if stored is None:
+        logging.warning(f"Stored publications of {scholar_id} unavailable, filling all.")
+        stored = {}
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=Config.PUB_REFILL_MAX_AGE_DAYS)
+    counts = {"new": 0, "changed": 0, "expired": 0, "unchanged": 0}
+    to_fill = []
     for pub in publications:
-        time.sleep(0.1)  # avoid overloading the queue service
-        if not task_queue_service.enqueue_publication_task(pub):
-            logging.error(
-                f"Failed to enqueue publication task for {pub.get('author_pub_id')}"
-            )
+        entry = stored.get(pub["author_pub_id"])
+        if entry is None:
+            reason = "new"
+        elif _citations(entry[0]) != _citations(pub.get("num_citations", 0)):
+            reason = "changed"
+        elif entry[1] is None or entry[1] < cutoff:
+            reason = "expired"
+        else:
+            reason = "unchanged"
+        counts[reason] += 1
+        if reason != "unchanged":
+            to_fill.append(pub)
+
+    total = len(publications)
+    counts["total"] = total
+    counts["fill_ratio"] = round(len(to_fill) / total, 4) if total else 0.0
+    counts["skip_ratio"] = round(counts["unchanged"] / total, 4) if total else 0.0
+    logging.info(
+        f"Publications of {scholar_id}: {counts['new']} new, "
+        f"{counts['changed']} changed, {counts['expired']} expired, "
+        f"{counts['unchanged']} unchanged; filling {len(to_fill)} of {total} "
+        f"(skip ratio {counts['skip_ratio']:.0%})."
+    )
+    return to_fill, counts
+
+
+def enqueue_publications(publications, lane=REFRESH):
+    """Enqueues fill_publication tasks for the publications, in batches.
+    Args:
+        publications (list): A list of publication data dictionaries.
+        lane (str): Priority lane of the tasks.
+    """
+    outcomes = task_queue_service.enqueue_publication_tasks(
+        publications, batch_size=Config.FILL_BATCH_SIZE, lane=lane
+    )
+    for task_name, outcome in outcomes.items():
+        if outcome in (FAILED, THROTTLED):
+            logging.error(f"Failed to enqueue publication task {task_name}: {outcome}")
 
 
 def serialize_author(author):
@@ -0,0 +1,115 @@
+"""
+backfill_author_watermarks.py
+
+Builds the per-author last-modified watermarks for data written before the
+watermarks existed. For every author the watermark is the latest timestamp of
+the author document and of all of their publication documents. Existing
+watermarks that are already newer are left untouched.
+
+Usage:
+    From your project root:
+        python3 scripts/backfill_author_watermarks.py --batch-size 500
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from google.cloud import firestore
+
+# Ensure project root is on sys.path (so `shared` package is importable)
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from shared.config import Config  # noqa: E402
+
+
+def latest_timestamps(db):
+    """Returns {scholar_id: latest timestamp} over authors and publications."""
+    latest = {}
+
+    def bump(author_id, timestamp):
+        if author_id and timestamp and (
+            author_id not in latest or timestamp > latest[author_id]
+        ):
+            latest[author_id] = timestamp
+
+    # Only the fields we need are streamed, not the full documents
+    authors = db.collection(Config.FIRESTORE_COLLECTION_AUTHOR).select(["timestamp"])
+    for count, doc in enumerate(authors.stream(), start=1):
+        bump(doc.id, doc.get("timestamp"))
+        if count % 10000 == 0:
+            logging.info(f"Scanned {count} authors")
+
+    pubs = db.collection(Config.FIRESTORE_COLLECTION_PUB).select(
+        ["timestamp", "data.author_pub_id"]
+    )
+    for count, doc in enumerate(pubs.stream(), start=1):
+        data = doc.to_dict()
+        author_pub_id = data.get("data", {}).get("author_pub_id") or doc.id
+        bump(author_pub_id.split(":")[0], data.get("timestamp"))
+        if count % 10000 == 0:
+            logging.info(f"Scanned {count} publications")
+
+    return latest
+
+
+def existing_watermarks(db):
+    collection = db.collection(Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK)
+    return {doc.id: doc.get("timestamp") for doc in collection.select(["timestamp"]).stream()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill per-author last-modified watermarks."
+    )
+    parser.add_argument("--batch-size", type=int, default=500, help="Batch commit size")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Compute but do not write watermarks"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = firestore.Client(project=Config.PROJECT_ID)
+
+    latest = latest_timestamps(db)
+    existing = existing_watermarks(db)
+    updates = {
+        author_id: timestamp
+        for author_id, timestamp in latest.items()
+        if author_id not in existing or existing[author_id] < timestamp
+    }
+    logging.info(
+        f"{len(latest)} authors, {len(existing)} existing watermarks, "
+        f"{len(updates)} to write"
+    )
+    if args.dry_run:
+        return
+
+    collection = db.collection(Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK)
+    batch = db.batch()
+    batch_count = written = 0
+    for author_id, timestamp in updates.items():
+        batch.set(
+            collection.document(author_id),
+            {"timestamp": timestamp, "data": {"scholar_id": author_id}},
+        )
+        batch_count += 1
+        if batch_count >= args.batch_size:
+            batch.commit()
+            written += batch_count
+            logging.info(f"Committed {written} watermarks")
+            batch = db.batch()
+            batch_count = 0
+
+    if batch_count > 0:
+        batch.commit()
+        written += batch_count
+    logging.info(f"Backfilled {written} watermarks")
+
+
+if __name__ == "__main__":
+    main()
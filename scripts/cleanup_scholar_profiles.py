@@ -4,16 +4,39 @@ cleanup_gs_with_serpapi.py
 
 Fetch Firestore docs older than N days, query SerpAPI’s Google Scholar Author API,
 and delete any docs whose profiles can’t be fetched (e.g., missing author data).
+
+Stale documents are paged through with cursors and checked concurrently by a
+bounded worker pool, throttled by a token bucket to match the SerpAPI quota.
+Results are kept in an on-disk cache, so re-runs skip profiles verified
+recently, and every decision is written to a CSV report. Deletes are batched;
+with --dry-run nothing is deleted and only the report is written.
+
+The profile check is pluggable: --checker module:function uses any function
+that takes an author id and returns True (active), False (missing) or None
+(could not tell), e.g. a local stub for testing.
 """
 
 import os
+import sys
 import argparse
+import csv
+import importlib
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import pytz
-from serpapi import GoogleSearch
 from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+# Ensure project root is on sys.path (so `shared` package is importable)
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from shared.services.rate_limiter import TokenBucket  # noqa: E402
 
 # Logging setup
 logging.basicConfig(
@@ -21,56 +44,179 @@ logging.basicConfig(
     level=logging.INFO,
 )
 
+FIRESTORE_BATCH_SIZE = 500
+
 
-def get_stale_docs(client, collection, days, limit, key_attr):
+def iter_stale_docs(client, collection, days, key_attr, page_size, limit=None):
+    """Yields pages of (doc_id, author_id) older than ``days``, via cursors."""
     cutoff = datetime.now(pytz.utc) - timedelta(days=days)
     query = (
         client.collection(collection)
-        .where("timestamp", "<", cutoff)
+        .where(filter=FieldFilter("timestamp", "<", cutoff))
+        .select(["timestamp", f"data.{key_attr}"])
         .order_by("timestamp")
-        .limit(limit)
     )
-    docs = []
-    for doc in query.stream():
-        data = doc.to_dict().get("data", {})
-        author_id = data.get(key_attr)
-        if author_id:
-            docs.append((doc.id, author_id))
-    logging.info("Found %d stale docs.", len(docs))
-    return docs
-
-
-def is_profile_active(author_id, api_key, no_cache=False):
-    """
-    Returns True if SerpAPI returns a valid 'author' dict.
-    """
-    params = {
-        "engine": "google_scholar_author",
-        "author_id": author_id,
-        "api_key": api_key,
-    }
-    if no_cache:
-        params["no_cache"] = "true"
-    search = GoogleSearch(params)
-    result = search.get_dict()
-    status = result.get("search_metadata", {}).get("status")
-    if status != "Success":
-        logging.warning("SerpAPI status %s for %s", status, author_id)
-        return True  # preserve on error
-    author = result.get("author") or {}
-    return bool(author.get("name"))  # no name → profile missing
-
-
-def clean_inactive_with_serpapi(collection, days, limit, key_attr, api_key, no_cache):
-    client = firestore.Client()
-    stale = get_stale_docs(client, collection, days, limit, key_attr)
-    for doc_id, author_id in stale:
-        active = is_profile_active(author_id, api_key, no_cache)
-        if not active:
-            client.collection(collection).document(doc_id).delete()
-            logging.info("Deleted %s (author %s).", doc_id, author_id)
-        else:
-            logging.info("Kept %s (author %s).", doc_id, author_id)
+    seen = 0
+    last = None
+    while limit is None or seen < limit:
+        page_query = query.limit(page_size if limit is None else min(page_size, limit - seen))
+        if last is not None:
+            page_query = page_query.start_after(last)
+        snapshots = list(page_query.stream())
+        if not snapshots:
+            return
+        last = snapshots[-1]
+        seen += len(snapshots)
+        page = []
+        for doc in snapshots:
+            author_id = (doc.to_dict().get("data") or {}).get(key_attr)
+            if author_id:
+                page.append((doc.id, author_id))
+        logging.info("Found %d stale docs (%d so far).", len(page), seen)
+        yield page
+
+
+def serpapi_checker(api_key, no_cache=False):
+    """Returns a checker backed by SerpAPI's Google Scholar Author API."""
+    from serpapi import GoogleSearch
+
+    def is_profile_active(author_id):
+        """
+        Returns True if SerpAPI returns a valid 'author' dict, None on errors.
+        """
+        params = {
+            "engine": "google_scholar_author",
+            "author_id": author_id,
+            "api_key": api_key,
+        }
+        if no_cache:
+            params["no_cache"] = "true"
+        search = GoogleSearch(params)
+        result = search.get_dict()
+        status = result.get("search_metadata", {}).get("status")
+        if status != "Success":
+            logging.warning("SerpAPI status %s for %s", status, author_id)
+            return None  # preserve on error
+        author = result.get("author") or {}
+        return bool(author.get("name"))  # no name → profile missing
+
+    return is_profile_active
+
+
+def load_checker(spec):
+    """Imports a checker given as 'module:function'."""
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class ResultCache:
+    """Definite check results on disk, reused while younger than max_age."""
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, author_id):
+        entry = self.entries.get(author_id)
+        if entry is None:
+            return None
+        checked_at = datetime.fromisoformat(entry["checked_at"])
+        if datetime.now(pytz.utc) - checked_at > self.max_age:
+            return None
+        return entry["active"]
+
+    def put(self, author_id, active):
+        self.entries[author_id] = {
+            "active": active,
+            "checked_at": datetime.now(pytz.utc).isoformat(),
+        }
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+def delete_docs(client, collection, doc_ids):
+    for start in range(0, len(doc_ids), FIRESTORE_BATCH_SIZE):
+        batch = client.batch()
+        for doc_id in doc_ids[start : start + FIRESTORE_BATCH_SIZE]:
+            batch.delete(client.collection(collection).document(doc_id))
+        batch.commit()
+
+
+def clean_inactive_with_serpapi(
+    collection,
+    days,
+    limit,
+    key_attr,
+    checker,
+    workers=4,
+    rate=1.0,
+    page_size=200,
+    cache=None,
+    report_path=None,
+    dry_run=False,
+    client=None,
+):
+    client = client or firestore.Client()
+    bucket = TokenBucket(rate)
+    counts = {"kept": 0, "deleted": 0, "would_delete": 0, "error": 0, "cached": 0}
+
+    def check(author_id):
+        cached = cache.get(author_id) if cache else None
+        if cached is not None:
+            return cached, True
+        bucket.acquire()
+        try:
+            return checker(author_id), False
+        except Exception as e:
+            logging.warning("Check failed for %s: %s", author_id, e)
+            return None, False
+
+    report = open(report_path, "w", newline="") if report_path else None
+    writer = csv.writer(report) if report else None
+    if writer:
+        writer.writerow(["doc_id", "author_id", "active", "action", "cached"])
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page in iter_stale_docs(client, collection, days, key_attr, page_size, limit):
+                results = executor.map(lambda item: check(item[1]), page)
+                to_delete = []
+                for (doc_id, author_id), (active, from_cache) in zip(page, results):
+                    counts["cached"] += from_cache
+                    if active is None:
+                        action = "error"  # preserve on error
+                    else:
+                        if cache and not from_cache:
+                            cache.put(author_id, active)
+                        if active:
+                            action = "kept"
+                        else:
+                            action = "would_delete" if dry_run else "deleted"
+                            to_delete.append(doc_id)
+                    counts[action] += 1
+                    if writer:
+                        writer.writerow([doc_id, author_id, active, action, from_cache])
+
+                if to_delete and not dry_run:
+                    delete_docs(client, collection, to_delete)
+                    logging.info("Deleted %d docs.", len(to_delete))
+                if cache:
+                    cache.save()
+    finally:
+        if report:
+            report.close()
+
+    logging.info("Done: %s", ", ".join(f"{k}={v}" for k, v in counts.items()))
+    return counts
 
 
 def main():
@@ -79,7 +225,9 @@ def main():
     )
     p.add_argument("--collection", required=True)
     p.add_argument("--days", type=int, default=30)
-    p.add_argument("--limit", type=int, default=100)
+    p.add_argument(
+        "--limit", type=int, default=None, help="Stop after this many docs (default: all)"
+    )
     p.add_argument("--key-attr", required=True)
     p.add_argument(
         "--api-key", default=os.getenv("SERPAPI_API_KEY"), help="SerpAPI API key"
@@ -87,20 +235,53 @@ def main():
     p.add_argument(
         "--no-cache",
         action="store_true",
-        help="Force fresh SerpAPI fetch (no cached results)",
+        help="Force fresh SerpAPI fetch (no cached results, on disk either)",
+    )
+    p.add_argument(
+        "--checker",
+        default="serpapi",
+        help="'serpapi' or a 'module:function' returning True/False/None per author id",
+    )
+    p.add_argument("--workers", type=int, default=4, help="Concurrent checks")
+    p.add_argument("--rate", type=float, default=1.0, help="Checks per second")
+    p.add_argument("--page-size", type=int, default=200, help="Docs per Firestore page")
+    p.add_argument(
+        "--cache-file",
+        default="cleanup_scholar_profiles_cache.json",
+        help="On-disk cache of check results ('' to disable)",
+    )
+    p.add_argument(
+        "--cache-days", type=float, default=7, help="Reuse cached results this long"
+    )
+    p.add_argument("--report", default="cleanup_report.csv", help="CSV report path")
+    p.add_argument(
+        "--dry-run", action="store_true", help="Only write the report, delete nothing"
     )
     args = p.parse_args()
 
-    if not args.api_key:
-        raise ValueError("SerpAPI API key is required (--api-key or SERPAPI_API_KEY)")
+    if args.checker == "serpapi":
+        if not args.api_key:
+            raise ValueError("SerpAPI API key is required (--api-key or SERPAPI_API_KEY)")
+        checker = serpapi_checker(args.api_key, args.no_cache)
+    else:
+        checker = load_checker(args.checker)
+
+    cache = None
+    if args.cache_file and not args.no_cache:
+        cache = ResultCache(args.cache_file, timedelta(days=args.cache_days))
 
     clean_inactive_with_serpapi(
         args.collection,
         args.days,
         args.limit,
         args.key_attr,
-        args.api_key,
-        args.no_cache,
+        checker,
+        workers=args.workers,
+        rate=args.rate,
+        page_size=args.page_size,
+        cache=cache,
+        report_path=args.report,
+        dry_run=args.dry_run,
     )
 
 
@@ -0,0 +1,46 @@
+"""
+export_stats_snapshot.py
+
+Exports the columnar snapshot (authors, author publications, publications)
+that the "local" statistics backend loads instead of querying the BigQuery
+statistics views.
+
+Usage:
+    From your project root:
+        python3 scripts/export_stats_snapshot.py --output stats_snapshot
+
+Point STATS_SNAPSHOT_PATH at the output directory and set STATS_BACKEND=local
+to serve author statistics from it.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# Ensure project root is on sys.path (so `shared` package is importable)
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from shared.config import Config  # noqa: E402
+from shared.services.bigquery_service import BigQueryService  # noqa: E402
+from shared.services.local_stats_service import export_snapshot  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the statistics snapshot used by the local stats backend."
+    )
+    parser.add_argument(
+        "--output", default=Config.STATS_SNAPSHOT_PATH, help="Snapshot directory"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_snapshot(BigQueryService(stats_backend="bigquery"), args.output)
+
+
+if __name__ == "__main__":
+    main()
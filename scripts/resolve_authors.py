@@ -4,7 +4,7 @@ resolve_authors.py
 Prerequisites:
 - Python 3.7+
 
-- Ensure your project root contains both `scripts/resolve_authors.py` and the `app/` directory with `scholar.py` exposing `fetch_authors_from_scholarly`
+- Ensure your project root contains both `scripts/resolve_authors.py` and the `shared/` package
 - Ensure Google Cloud credentials are configured (e.g., via GOOGLE_APPLICATION_CREDENTIALS)
 
 
@@ -12,122 +12,410 @@ Usage:
     From your project root (one level above scripts and app directories):
         python3 scripts/resolve_authors.py --batch-size 500
 
+    Sharded and parallel, e.g. on two machines with 8 threads each:
+        python3 scripts/resolve_authors.py --shards 2 --shard-index 0 --workers 8
+        python3 scripts/resolve_authors.py --shards 2 --shard-index 1 --workers 8
+
+    The publications are split into partitions with a Firestore partition
+    query. The partition boundaries are saved in the checkpoint directory on
+    the first run, and every shard must use the same boundaries file (copy it
+    to the other machines). Each shard processes every N-th partition, spread
+    over its worker threads, and checkpoints its progress per partition;
+    restart it with --resume to continue where it stopped. Run several shards
+    per machine to use more cores.
+
+    Writes that still fail after --max-attempts are logged to the shard's
+    ``.failed.jsonl`` file in the checkpoint directory, and their partition
+    stops there without checkpointing past them: --resume retries it from its
+    last checkpoint.
+
 This script auto-adjusts its import path, so you can run it without manually setting PYTHONPATH.
 """
 
 import argparse
+import json
 import logging
 import os
 import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import firestore
 
-from google.cloud.firestore import Query
-
-# Ensure project root is on sys.path (so `app` package is importable)
+# Ensure project root is on sys.path (so `shared` package is importable)
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
 PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+from shared.services.author_name_index import normalize_name  # noqa: E402
+
 # Firestore collection names
 PUB_COLLECTION = "scholar_raw_pub"
 AUTHOR_COLLECTION = "scholar_raw_author"
 
+# Checkpoint value of a finished partition
+DONE = "done"
+
 # Initialize Firestore client
 db = firestore.Client()
 
 
-def resolve_author(name, resolved_ids):
+def name_variants(name):
+    """
+    Looser keys for a name, for when the exact key does not match: first
+    initial plus last name ("j smith"), and first plus last name without
+    middle names ("john smith").
+    """
+    tokens = normalize_name(name)
+    if len(tokens) < 2:
+        return set()
+    variants = {f"{tokens[0][0]} {tokens[-1]}"}
+    if len(tokens[0]) > 1:
+        variants.add(f"{tokens[0]} {tokens[-1]}")
+    return variants
+
+
+class AuthorIndex:
+    """Name keys and coauthors of all stored authors, built in one pass."""
+
+    def __init__(self):
+        self.exact = defaultdict(set)  # normalized name -> scholar_ids
+        self.variants = defaultdict(set)  # name variant -> scholar_ids
+        self.coauthors = {}  # scholar_id -> coauthor scholar_ids
+
+    def add(self, scholar_id, name, coauthors):
+        tokens = normalize_name(name)
+        if not scholar_id or not tokens:
+            return
+        self.exact[" ".join(tokens)].add(scholar_id)
+        for variant in name_variants(name):
+            self.variants[variant].add(scholar_id)
+        self.coauthors[scholar_id] = {
+            co.get("scholar_id") for co in coauthors or [] if co.get("scholar_id")
+        }
+
+    @classmethod
+    def build(cls, db):
+        index = cls()
+        start = time.monotonic()
+        query = db.collection(AUTHOR_COLLECTION).select(
+            ["data.name", "data.scholar_id", "data.coauthors"]
+        )
+        for count, doc in enumerate(query.stream(), start=1):
+            data = doc.to_dict().get("data") or {}
+            index.add(data.get("scholar_id") or doc.id, data.get("name"), data.get("coauthors"))
+            if count % 10000 == 0:
+                logging.info(f"Indexed {count} authors")
+        logging.info(
+            f"Indexed {len(index.coauthors)} authors, {len(index.exact)} names and "
+            f"{len(index.variants)} name variants in {time.monotonic() - start:.1f}s"
+        )
+        return index
+
+    def tie_break(self, candidates, resolved_ids):
+        """The only candidate with the most coauthors among resolved_ids, if any."""
+        overlaps = sorted(
+            ((len(self.coauthors.get(sid, set()) & resolved_ids), sid) for sid in candidates),
+            reverse=True,
+        )
+        if overlaps[0][0] > 0 and (len(overlaps) == 1 or overlaps[0][0] > overlaps[1][0]):
+            return overlaps[0][1]
+        return None
+
+
+def candidates_for(name, index):
+    """Returns (candidate scholar_ids, method) for a name."""
+    exact = index.exact.get(" ".join(normalize_name(name)))
+    if exact:
+        return exact, "local_exact"
+    variants = set()
+    for variant in name_variants(name):
+        variants |= index.variants.get(variant, set())
+    return variants, "local_variant"
+
+
+def resolve_author(name, resolved_ids, index):
     """
     Resolve a single author name to a Google Scholar ID using:
-      1. Exact name match
-      2. Alias match
-      3. Co-author graph disambiguation
+      1. Exact (normalized) name match
+      2. Name variant match (initials, no middle names)
+      3. Co-author graph disambiguation among several matches
     :param name: str
-    :param resolved_ids: set of scholar_ids already resolved
+    :param resolved_ids: set of scholar_ids already resolved on the publication
+    :param index: AuthorIndex
     :return: dict{name, scholar_id, method}
     """
-    # Step 1: Exact name match
-    author_ref = db.collection(AUTHOR_COLLECTION)
-    matches = author_ref.where("data.name", "==", name).get()
-    if matches:
-        # Single exact
-        if len(matches) == 1:
-            sid = matches[0].to_dict().get("data").get("scholar_id")
-            return {"name": name, "scholar_id": sid, "method": "local_exact"}
-
-        # Step 2: Co-author graph
-        coauthor_matches = []
-        for doc in matches:
-            data = doc.to_dict()
-            for co in data.get("coauthors", []):
-                if co.get("scholar_id") in resolved_ids:
-                    coauthor_matches.append(doc)
-                    break
-        if len(coauthor_matches) == 1:
-            sid = coauthor_matches[0].to_dict().get("scholar_id")
+    candidates, method = candidates_for(name, index)
+    if len(candidates) == 1:
+        return {"name": name, "scholar_id": next(iter(candidates)), "method": method}
+
+    if candidates:
+        sid = index.tie_break(candidates, resolved_ids)
+        if sid:
+            return {"name": name, "scholar_id": sid, "method": "coauthor_graph"}
+        logging.debug(f"Ambiguous author: {name} ({len(candidates)} candidates)")
+        return {"name": name, "scholar_id": None, "method": "ambiguous"}
 
     # Fallback: unresolved
-    logging.warning(f"Unresolved author: {name}")
+    logging.debug(f"Unresolved author: {name}")
     return {"name": name, "scholar_id": None, "method": "unresolved"}
 
 
-def update_publication(doc_ref, resolutions, batch):
-    batch.update(doc_ref, {"author_resolutions": resolutions})
+def resolve_publication(names, owner_id, index):
+    """
+    Resolves all author names of a publication. Unambiguous names go first,
+    so that ambiguous ones are tie-broken against every other author of the
+    publication, including its owner.
+    """
+    resolved_ids = {owner_id} if owner_id else set()
+    resolutions = [None] * len(names)
+    deferred = []
+    for i, name in enumerate(names):
+        candidates, method = candidates_for(name, index)
+        if len(candidates) == 1:
+            resolutions[i] = {"name": name, "scholar_id": next(iter(candidates)), "method": method}
+            resolved_ids.add(resolutions[i]["scholar_id"])
+        else:
+            deferred.append(i)
+    for i in deferred:
+        resolutions[i] = resolve_author(names[i], resolved_ids, index)
+        if resolutions[i]["scholar_id"]:
+            resolved_ids.add(resolutions[i]["scholar_id"])
+    return resolutions
+
+
+def update_publication(doc_ref, resolutions, writer):
+    writer.update(doc_ref, {"author_resolutions": resolutions})
+
+
+def save_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)  # never leaves a half-written checkpoint
+
+
+def load_partitions(db, path, partition_count):
+    """
+    Returns the partition boundaries (document paths) from ``path``, or
+    computes them with a partition query and saves them there.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    boundaries = [
+        partition.end_at.path
+        for partition in db.collection_group(PUB_COLLECTION).get_partitions(
+            partition_count
+        )
+        if partition.end_at is not None
+    ]
+    save_json(path, boundaries)
+    logging.info(f"Saved {len(boundaries) + 1} partitions to {path}")
+    return boundaries
+
+
+def partition_query(db, boundaries, index, cursor=None):
+    """Query over partition ``index``, after the document ``cursor`` if given."""
+    query = (
+        db.collection(PUB_COLLECTION)
+        .select(["data.author_pub_id", "data.bib.author"])
+        .order_by("__name__")
+    )
+    if cursor:
+        query = query.start_after({"__name__": db.document(cursor)})
+    elif index > 0:
+        query = query.start_at({"__name__": db.document(boundaries[index - 1])})
+    if index < len(boundaries):
+        query = query.end_before({"__name__": db.document(boundaries[index])})
+    return query
+
+
+class Progress:
+    """Counters and per-partition checkpoint shared by the worker threads."""
+
+    def __init__(self, checkpoint_path, checkpoint):
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = checkpoint  # partition index -> last doc path or DONE
+        self.failures_path = f"{os.path.splitext(checkpoint_path)[0]}.failed.jsonl"
+        self.failed_partitions = set()
+        self.methods = Counter()
+        self.total_pubs = 0
+        self.total_authors = 0
+        self.start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, pubs, authors, methods):
+        with self._lock:
+            self.total_pubs += pubs
+            self.total_authors += authors
+            self.methods.update(methods)
+
+    def save_failures(self, partition, failures):
+        """Appends the (doc path, error) of writes given up on to the failures file."""
+        with self._lock:
+            self.failed_partitions.add(partition)
+            with open(self.failures_path, "a") as f:
+                for path, message in failures:
+                    f.write(
+                        json.dumps({"partition": partition, "path": path, "error": message})
+                        + "\n"
+                    )
+
+    def save(self, partition, cursor):
+        with self._lock:
+            self.checkpoint[str(partition)] = cursor
+            save_json(self.checkpoint_path, self.checkpoint)
+            elapsed = time.monotonic() - self.start
+            logging.info(
+                f"Checkpoint: {self.total_pubs} pubs ({self.total_pubs / elapsed:.0f}/s), "
+                f"{self.total_authors} names ({self.total_authors / elapsed:.0f}/s)"
+            )
+
+
+def process_partition(db, boundaries, partition, index, progress, batch_size, max_attempts):
+    cursor = progress.checkpoint.get(str(partition))
+    if cursor == DONE:
+        return
+
+    writer = db.bulk_writer()
+    failures = []  # (doc path, error) of the writes given up on
+
+    def on_write_error(error, _):
+        # Retried with backoff by the bulk writer, e.g. on contention
+        if error.attempts < max_attempts:
+            return True
+        failures.append((error.operation.reference.path, error.message))
+        return False
+
+    writer.on_write_error(on_write_error)
+    pubs = authors = 0
+    methods = Counter()
+    for doc in partition_query(db, boundaries, partition, cursor).stream():
+        pub = doc.to_dict()
+        pub_id = pub.get("data", {}).get("author_pub_id") or doc.id
+        names = [
+            a.strip()
+            for a in pub.get("data", {}).get("bib", {}).get("author", "").split(" and ")
+            if a.strip()
+        ]
+        resolutions = resolve_publication(names, pub_id.split(":")[0], index)
+        update_publication(doc.reference, resolutions, writer)
+        pubs += 1
+        authors += len(names)
+        methods.update(res["method"] for res in resolutions)
+
+        if pubs % batch_size == 0:
+            # Only what has been written is checkpointed
+            writer.flush()
+            progress.record(pubs, authors, methods)
+            pubs = authors = 0
+            methods = Counter()
+            if failures:
+                break
+            progress.save(partition, doc.reference.path)
+
+    writer.close()
+    progress.record(pubs, authors, methods)
+    if failures:
+        progress.save_failures(partition, failures)
+        logging.error(
+            f"Partition {partition} stopped: {len(failures)} writes failed "
+            f"(see {progress.failures_path})"
+        )
+        return
+    progress.save(partition, DONE)
+    logging.info(f"Partition {partition} done")
 
 
 def main():
     parser = argparse.ArgumentParser(
         description="Resolve Scholar IDs for Firestore publications."
     )
-    parser.add_argument("--batch-size", type=int, default=500, help="Batch commit size")
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Publications between checkpoints"
+    )
+    parser.add_argument("--shards", type=int, default=1, help="Number of shards")
+    parser.add_argument("--shard-index", type=int, default=0, help="Shard to process")
+    parser.add_argument("--workers", type=int, default=4, help="Threads per shard")
+    parser.add_argument(
+        "--partitions-per-shard", type=int, default=16, help="Partitions per shard"
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=os.path.join(SCRIPT_DIR, "resolve_authors_checkpoints"),
+        help="Directory of the partition boundaries and shard checkpoints",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Continue from the shard's checkpoint"
+    )
+    parser.add_argument(
+        "--max-attempts", type=int, default=10, help="Write attempts per document"
+    )
     args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shards:
+        parser.error("--shard-index must be between 0 and --shards - 1")
 
     logging.basicConfig(level=logging.INFO)
-    batch = db.batch()
-    total_pubs = total_authors = resolved = unresolved = 0
-    batch_count = 0
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    boundaries = load_partitions(
+        db,
+        os.path.join(args.checkpoint_dir, "partitions.json"),
+        args.shards * args.partitions_per_shard,
+    )
+    checkpoint_path = os.path.join(
+        args.checkpoint_dir, f"shard-{args.shard_index}-of-{args.shards}.json"
+    )
+    checkpoint = {}
+    if args.resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        logging.info(f"Resuming from {checkpoint_path}")
+    progress = Progress(checkpoint_path, checkpoint)
 
-    for doc in (
-        db.collection(PUB_COLLECTION)
-        .order_by("data.url_related_articles", direction=Query.ASCENDING)
-        .stream()
-    ):
-        total_pubs += 1
-        pub = doc.to_dict()
-        pub_id = pub.get("data", {}).get("author_pub_id", {})
-        authors = pub.get("data", {}).get("bib", {}).get("author", "")
-        names = [a.strip() for a in authors.split(" and ") if a.strip()]
-        print(f"{pub_id} ==> [{authors}]")
-
-        resolutions = []
-        resolved_ids = set()
-        for name in names:
-            total_authors += 1
-            res = resolve_author(name, resolved_ids)
-            resolutions.append(res)
-            if res["scholar_id"]:
-                resolved += 1
-                resolved_ids.add(res["scholar_id"])
-            else:
-                unresolved += 1
-
-        update_publication(doc.reference, resolutions, batch)
-        batch_count += 1
-
-        if batch_count >= args.batch_size:
-            batch.commit()
-            logging.info(f"Committed {batch_count} updates")
-            batch = db.batch()
-            batch_count = 0
-
-    if batch_count > 0:
-        batch.commit()
-        logging.info(f"Committed final {batch_count} updates")
+    index = AuthorIndex.build(db)
 
+    partitions = range(args.shard_index, len(boundaries) + 1, args.shards)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                process_partition,
+                db,
+                boundaries,
+                partition,
+                index,
+                progress,
+                args.batch_size,
+                args.max_attempts,
+            )
+            for partition in partitions
+        ]
+        for future in futures:
+            future.result()
+
+    elapsed = time.monotonic() - progress.start
+    total_pubs, total_authors, methods = (
+        progress.total_pubs,
+        progress.total_authors,
+        progress.methods,
+    )
+    resolved = total_authors - methods["unresolved"] - methods["ambiguous"]
     pct = (resolved / total_authors * 100) if total_authors else 0
-    print(f"Processed {total_pubs} pubs, {total_authors} authors")
-    print(f"Resolved: {resolved} ({pct:.1f}%), Unresolved: {unresolved}")
+    print(f"Processed {total_pubs} pubs, {total_authors} authors in {elapsed:.1f}s")
+    print(
+        f"Throughput: {total_pubs / max(elapsed, 1e-9):.0f} pubs/s, "
+        f"{total_authors / max(elapsed, 1e-9):.0f} names/s"
+    )
+    print(f"Resolved: {resolved} ({pct:.1f}%), Unresolved: {total_authors - resolved}")
+    for method, count in methods.most_common():
+        print(f"  {method}: {count}")
+    if progress.failed_partitions:
+        print(
+            f"{len(progress.failed_partitions)} partitions stopped on failed writes, "
+            f"listed in {progress.failures_path}; rerun with --resume"
+        )
 
 
 if __name__ == "__main__":
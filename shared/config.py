@@ -30,9 +30,130 @@ class Config:
     QUEUE_PATH_PUBS = (
         f"projects/{PROJECT_ID}/locations/{QUEUE_LOCATION}/queues/{QUEUE_NAME_PUBS}"
     )
+    # Priority lanes, each with its own (authors, publications) queues, set up
+    # with different dispatch rates: "interactive" for users waiting on
+    # /results, "refresh" for scheduled refreshes, "backfill" for bulk crawls
+    QUEUE_LANES = {
+        "interactive": ("process-authors-interactive", "process-pubs-interactive"),
+        "refresh": (QUEUE_NAME_AUTHORS, QUEUE_NAME_PUBS),
+        "backfill": ("process-authors-backfill", "process-pubs-backfill"),
+    }
 
     FIRESTORE_COLLECTION_AUTHOR = "scholar_raw_author"
     FIRESTORE_COLLECTION_PUB = "scholar_raw_pub"
+    # Per-author last-modified watermark, bumped whenever the author or one of
+    # their publications is written.
+    FIRESTORE_COLLECTION_AUTHOR_WATERMARK = "author_last_modified"
+    # Ingestion state of authors (queued, fetching, done, failed)
+    FIRESTORE_COLLECTION_INGESTION_STATUS = "author_ingestion_status"
+    FIRESTORE_COLLECTION_CRAWL_CONTROL = "crawl_control"
+    FIRESTORE_COLLECTION_REGION_HEALTH = "region_health"
+
+    # In-process cache in front of FirestoreService.get_firestore_cache.
+    # Set FIRESTORE_CACHE_MAX_BYTES=0 to disable it.
+    FIRESTORE_CACHE_MAX_BYTES = int(os.getenv("FIRESTORE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    FIRESTORE_CACHE_DEFAULT_TTL = 60  # seconds
+    FIRESTORE_CACHE_TTLS = {
+        FIRESTORE_COLLECTION_AUTHOR: 300,
+        FIRESTORE_COLLECTION_PUB: 300,
+        FIRESTORE_COLLECTION_AUTHOR_WATERMARK: 30,
+        FIRESTORE_COLLECTION_INGESTION_STATUS: 5,
+        FIRESTORE_COLLECTION_CRAWL_CONTROL: 10,
+        FIRESTORE_COLLECTION_REGION_HEALTH: 10,
+        "author_pub_stats": 300,
+        "author_stats": 300,
+        "pub_stats": 600,
+        "queries": 3600,
+    }
+    FIRESTORE_GET_ALL_CHUNK = 300  # documents per multi-document get
+    FIRESTORE_BATCH_SIZE = 500  # writes per batch commit (Firestore's limit)
+
+    # A queued or fetching author whose state has not changed for this long
+    # is assumed lost and enqueued again; a failed one is retried after
+    # INGESTION_RETRY_AFTER.
+    INGESTION_STALE_AFTER = int(os.getenv("INGESTION_STALE_AFTER", 3600))
+    INGESTION_RETRY_AFTER = int(os.getenv("INGESTION_RETRY_AFTER", 6 * 3600))
+
+    # /api/author_status: longest long-poll wait, and lifetime and heartbeat
+    # interval of an event stream, in seconds
+    AUTHOR_STATUS_WAIT = float(os.getenv("AUTHOR_STATUS_WAIT", 25))
+    AUTHOR_STATUS_STREAM_TIMEOUT = float(os.getenv("AUTHOR_STATUS_STREAM_TIMEOUT", 300))
+    AUTHOR_STATUS_HEARTBEAT = 15
+
+    # Author name lookups are answered from an in-memory index of the stored
+    # profiles, refreshed incrementally at most every interval (seconds).
+    # scholarly is only skipped when the index has at least the minimum of
+    # strong matches (the same name up to case, accents and token order);
+    # otherwise the local matches are merged with the remote ones.
+    AUTHOR_INDEX_REFRESH_INTERVAL = int(os.getenv("AUTHOR_INDEX_REFRESH_INTERVAL", 300))
+    AUTHOR_INDEX_MIN_RESULTS = int(os.getenv("AUTHOR_INDEX_MIN_RESULTS", 1))
+
+    # Bulk enqueueing in TaskQueueService.enqueue_many: concurrent
+    # create_task calls, and the adaptive rate (tasks per second) that backs
+    # off on quota errors
+    ENQUEUE_CONCURRENCY = int(os.getenv("ENQUEUE_CONCURRENCY", 16))
+    ENQUEUE_INITIAL_RATE = float(os.getenv("ENQUEUE_INITIAL_RATE", 100))
+    ENQUEUE_MIN_RATE = 5.0
+    ENQUEUE_MAX_RATE = float(os.getenv("ENQUEUE_MAX_RATE", 500))
+    ENQUEUE_RATE_INCREASE = 10.0  # tasks/s gained per second without errors
+    ENQUEUE_MAX_ATTEMPTS = 5
+
+    # An author refresh only re-fills the publications that are new, whose
+    # citation count changed, or that were filled longer ago than this
+    PUB_REFILL_MAX_AGE_DAYS = int(os.getenv("PUB_REFILL_MAX_AGE_DAYS", 90))
+
+    # fill_publication batches: publications per task sent by search_author_id
+    # (1 sends one task per publication), largest batch accepted, concurrent
+    # fills per batch, and the time a single fill may take (seconds)
+    FILL_BATCH_SIZE = int(os.getenv("FILL_BATCH_SIZE", 20))
+    FILL_BATCH_MAX_PUBS = 50
+    FILL_BATCH_CONCURRENCY = int(os.getenv("FILL_BATCH_CONCURRENCY", 4))
+    FILL_ITEM_TIME_BUDGET = float(os.getenv("FILL_ITEM_TIME_BUDGET", 60))
+    # Time a whole batch may take (seconds); keep it under the function's
+    # deploy timeout (540s in .github/workflows/function.yml), leaving time
+    # to store the last fills and requeue the failures
+    FILL_BATCH_TIME_BUDGET = float(os.getenv("FILL_BATCH_TIME_BUDGET", 420))
+    # Filled publications are stored in groups of this many as they complete
+    FILL_WRITE_GROUP = int(os.getenv("FILL_WRITE_GROUP", 5))
+
+    # Google Scholar pages fetched by scholarly in the Cloud Functions are
+    # cached for SCHOLAR_CACHE_TTL seconds on "disk" (SCHOLAR_CACHE_DIR) or in
+    # "gcs" (under scholar_pages/ in BUCKET_NAME); "" disables the cache.
+    # Offline, only cached pages are served (recorded fixtures).
+    SCHOLAR_CACHE_BACKEND = os.getenv("SCHOLAR_CACHE_BACKEND", "")
+    SCHOLAR_CACHE_DIR = os.getenv("SCHOLAR_CACHE_DIR", "/tmp/scholar_cache")
+    SCHOLAR_CACHE_TTL = int(os.getenv("SCHOLAR_CACHE_TTL", 24 * 3600))
+    SCHOLAR_CACHE_OFFLINE = os.getenv("SCHOLAR_CACHE_OFFLINE", "0") == "1"
+
+    # Pacing of Scholar fetches (see CrawlController): AIMD bounds of the
+    # fetch rate per instance (fetches per second), rolling window of outcomes
+    # and the success rate under which crawling pauses, pause lengths
+    # (seconds), and the spread of the tasks scheduled after a pause
+    CRAWL_INITIAL_RATE = float(os.getenv("CRAWL_INITIAL_RATE", 1.0))
+    CRAWL_MIN_RATE = 0.05
+    CRAWL_MAX_RATE = float(os.getenv("CRAWL_MAX_RATE", 5.0))
+    CRAWL_RATE_INCREASE = 0.05
+    CRAWL_DECREASE_COOLDOWN = 10.0
+    CRAWL_WINDOW = 50
+    CRAWL_MIN_SAMPLES = 10
+    CRAWL_PAUSE_BELOW = float(os.getenv("CRAWL_PAUSE_BELOW", 0.5))
+    CRAWL_PAUSE_SECONDS = int(os.getenv("CRAWL_PAUSE_SECONDS", 600))
+    CRAWL_MAX_PAUSE_SECONDS = 4 * 3600
+    CRAWL_RESUME_SPREAD = 300
+
+    # Region health: EWMA weight of each fetch outcome, latency assumed for
+    # regions without data (seconds), success rate under which a region is
+    # cooled down and for how long (seconds), how often instances write
+    # their outcomes, and how long routers reuse what they read (seconds)
+    REGION_EWMA_ALPHA = 0.1
+    REGION_DEFAULT_LATENCY = 5.0
+    REGION_MIN_SUCCESS = float(os.getenv("REGION_MIN_SUCCESS", 0.5))
+    REGION_COOLDOWN_SECONDS = int(os.getenv("REGION_COOLDOWN_SECONDS", 1800))
+    REGION_HEALTH_FLUSH = 30
+    REGION_SNAPSHOT_TTL = 10
+
+    # Upper bound on the scholar IDs accepted by /api/authors/stats
+    BATCH_STATS_MAX_IDS = int(os.getenv("BATCH_STATS_MAX_IDS", 5000))
 
     @staticmethod
     def get_rotating_region():
@@ -72,7 +193,68 @@ class Config:
     )
     API_FIND_SCHOLAR_ID = f"https://{FUNCTION_LOCATION}-{PROJECT_ID}.cloudfunctions.net/find_scholar_id_from_name"
 
+    @staticmethod
+    def function_url(region, name):
+        """URL of the Cloud Function ``name`` deployed in ``region``."""
+        return f"https://{region}-{Config.PROJECT_ID}.cloudfunctions.net/{name}"
+
+    # Tasks are spread over all the regions (RegionRouter), weighted by their
+    # recent success rate and latency, unless REGION_ROUTING is "0", in which
+    # case they all go to FUNCTION_LOCATION
+    REGION_ROUTING = os.getenv("REGION_ROUTING", "1") == "1"
+    FUNCTION_REGIONS = (
+        AVAILABLE_FUNCTION_REGIONS if REGION_ROUTING else [FUNCTION_LOCATION]
+    )
+
     BUCKET_NAME = "scholar_data_share"
 
+    # "bigquery" queries the statistics views on every call; "local" serves
+    # author statistics from a snapshot loaded by LocalStatsService.
+    STATS_BACKEND = os.getenv("STATS_BACKEND", "bigquery")
+    STATS_SNAPSHOT_PATH = os.getenv("STATS_SNAPSHOT_PATH", "stats_snapshot")
+
+    # Issue the independent lookups of get_author_stats concurrently on a
+    # shared, bounded thread pool.
+    STATS_PARALLEL = os.getenv("STATS_PARALLEL", "1") == "1"
+    STATS_FETCH_WORKERS = int(os.getenv("STATS_FETCH_WORKERS", 16))
+
+    # Serve stale stats while they are recomputed in the background, as long
+    # as the cached copy is at most STATS_MAX_STALENESS seconds old
+    STATS_STALE_WHILE_REVALIDATE = os.getenv("STATS_STALE_WHILE_REVALIDATE", "1") == "1"
+    STATS_MAX_STALENESS = int(os.getenv("STATS_MAX_STALENESS", 7 * 24 * 3600))
+    # Background refreshes and cache write-backs run on a pool of their own;
+    # background refreshes are dropped while this many are already pending
+    STATS_REFRESH_WORKERS = int(os.getenv("STATS_REFRESH_WORKERS", 4))
+    STATS_REFRESH_MAX_PENDING = int(os.getenv("STATS_REFRESH_MAX_PENDING", 64))
+
+    # Rendered plots are cached in memory, optionally backed by "disk"
+    # (PLOT_CACHE_DIR) or "gcs" (under plots/ in BUCKET_NAME).
+    PLOT_CACHE_BACKEND = os.getenv("PLOT_CACHE_BACKEND", "memory")
+    PLOT_CACHE_DIR = os.getenv("PLOT_CACHE_DIR", "plot_cache")
+    PLOT_CACHE_MAX_BYTES = int(os.getenv("PLOT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    PLOT_CACHE_TTL = 24 * 3600  # seconds, for the memory tier
+
+    # Plot rendering process pool
+    RENDER_POOL_WORKERS = int(os.getenv("RENDER_POOL_WORKERS", 2))
+    RENDER_POOL_MAX_PENDING = int(os.getenv("RENDER_POOL_MAX_PENDING", 32))
+    RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", 20))  # seconds
+
+    # Upper bound on the points returned by /api/plot_data
+    PLOT_DATA_MAX_POINTS = int(os.getenv("PLOT_DATA_MAX_POINTS", 500))
+
+    # Bulk export of all authors' stats
+    EXPORT_BASENAME = os.getenv("EXPORT_BASENAME", "all_authors_stats")
+    EXPORT_FORMATS = ("csv", "csv.gz", "parquet")
+    EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", 10000))
+    EXPORT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # multiple of 256 KiB
+
+    # Only one instance at a time rebuilds the export, under this lease
+    EXPORT_LEASE_TTL = int(os.getenv("EXPORT_LEASE_TTL", 30 * 60))
+    EXPORT_MAX_AGE_HOURS = int(os.getenv("EXPORT_MAX_AGE_HOURS", 24))
+
+    # GCS blob metadata memoization and leases
+    STORAGE_METADATA_TTL = int(os.getenv("STORAGE_METADATA_TTL", 30))
+    STORAGE_LEASE_PREFIX = "leases/"
+
     DOWNLOADS_DIR = os.getenv("DOWNLOADS_DIR", "downloads")
     STATIC_DIR = os.getenv("STATIC_DIR", "static")
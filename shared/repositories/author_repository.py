@@ -13,23 +13,37 @@ class AuthorRepository:
         )[0]
 
     def save_author(self, author_id, author_data):
-        return self.firestore_service.set_firestore_cache(
+        saved = self.firestore_service.set_firestore_cache(
             Config.FIRESTORE_COLLECTION_AUTHOR, author_id, author_data
         )
+        if saved:
+            self.publication_repository.touch_author_last_modification(author_id)
+        return saved
 
     def get_author_last_modification(self, author_id):
-        # Fetch the last modification time of the author itself
+        # The watermark is bumped on every author and publication write
+        watermark = self.publication_repository.get_author_last_modification_watermark(
+            author_id
+        )
+        if watermark is not None:
+            return watermark
+
+        # Not backfilled yet: scan the author and publications once and record it
         _, latest_author_change = self.firestore_service.get_firestore_cache(
             Config.FIRESTORE_COLLECTION_AUTHOR, author_id
         )
-
-        # Use PublicationRepository to find the latest publication timestamp
-        latest_pub_change = (
-            self.publication_repository.get_latest_publication_timestamp(author_id)
+        latest_pub_change = self.publication_repository.get_latest_publication_timestamp(
+            author_id
+        )
+        latest_change = max(
+            filter(None, [latest_author_change, latest_pub_change]), default=None
+        )
+        if latest_change is None:
+            return None
+        # A write may have bumped the watermark since: never move it back
+        return self.publication_repository.advance_author_last_modification(
+            author_id, latest_change
         )
-
-        # Compare and return the latest of the two timestamps
-        return max(filter(None, [latest_author_change, latest_pub_change]))
 
     def get_authors_needing_refresh(self, num_authors=1):
         """
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+
+from ..config import Config
+
+QUEUED = "queued"
+FETCHING = "fetching"
+DONE = "done"
+FAILED = "failed"
+PENDING_STATES = (QUEUED, FETCHING)
+
+
+class IngestionStatusRepository:
+    """
+    Ledger of where each author is in the ingestion pipeline.
+
+    Pending authors (queued or fetching) carry ``pending_since``, the time
+    they were first queued; finished ones do not. Range queries skip
+    documents without the field, so the queue position of an author is one
+    count aggregation over a single-field index.
+    """
+
+    def __init__(self, firestore_service):
+        self.firestore_service = firestore_service
+
+    def get_status(self, author_id):
+        status, timestamp = self.firestore_service.get_firestore_cache(
+            Config.FIRESTORE_COLLECTION_INGESTION_STATUS, author_id
+        )
+        if status is not None:
+            status["updated_at"] = timestamp
+        return status
+
+    def mark_queued(self, author_id, lane=None):
+        """``lane`` is the priority lane of the queue the author was put in."""
+        status = self.get_status(author_id) or {}
+        pending_since = status.get("pending_since")
+        if status.get("state") not in PENDING_STATES or not pending_since:
+            pending_since = datetime.now(timezone.utc)
+        return self._save(
+            author_id,
+            QUEUED,
+            pending_since=pending_since,
+            attempts=status.get("attempts", 0) + 1,
+            lane=lane or status.get("lane"),
+        )
+
+    def mark_fetching(self, author_id):
+        status = self.get_status(author_id) or {}
+        return self._save(
+            author_id,
+            FETCHING,
+            pending_since=status.get("pending_since") or datetime.now(timezone.utc),
+            attempts=status.get("attempts", 1),
+            lane=status.get("lane"),
+        )
+
+    def mark_done(self, author_id, publications=None):
+        """``publications`` optionally records the outcome of the delta refresh."""
+        status = self.get_status(author_id) or {}
+        return self._save(
+            author_id, DONE, attempts=status.get("attempts", 1), publications=publications
+        )
+
+    def mark_failed(self, author_id, error=None):
+        status = self.get_status(author_id) or {}
+        return self._save(
+            author_id, FAILED, attempts=status.get("attempts", 1), error=error
+        )
+
+    def queue_position(self, status):
+        """1-based position of a pending author among all pending authors."""
+        pending_since = status.get("pending_since")
+        if status.get("state") not in PENDING_STATES or not pending_since:
+            return None
+        ahead = self.firestore_service.count(
+            Config.FIRESTORE_COLLECTION_INGESTION_STATUS,
+            "data.pending_since",
+            "<",
+            pending_since,
+        )
+        return None if ahead is None else ahead + 1
+
+    def pending_count(self):
+        return self.firestore_service.count(
+            Config.FIRESTORE_COLLECTION_INGESTION_STATUS,
+            "data.pending_since",
+            ">",
+            datetime.fromtimestamp(0, timezone.utc),
+        )
+
+    def _save(self, author_id, state, **fields):
+        data = {"scholar_id": author_id, "state": state}
+        data.update({key: value for key, value in fields.items() if value is not None})
+        return self.firestore_service.set_firestore_cache(
+            Config.FIRESTORE_COLLECTION_INGESTION_STATUS, author_id, data
+        )
@@ -12,15 +12,79 @@ class PublicationRepository:
         )
 
     def save_publication(self, author_pub_id, publication_data):
-        self.firestore_service.set_firestore_cache(
+        saved = self.firestore_service.set_firestore_cache(
             Config.FIRESTORE_COLLECTION_PUB, author_pub_id, publication_data
         )
+        if saved:
+            self.touch_author_last_modification(author_pub_id.split(":")[0])
+        return saved
+
+    def save_publications(self, publications):
+        """
+        Saves ``{author_pub_id: data}`` with batched writes and bumps the
+        watermark of every author concerned; returns the number saved.
+        """
+        saved = self.firestore_service.set_many_firestore_cache(
+            Config.FIRESTORE_COLLECTION_PUB, publications
+        )
+        if saved:
+            for author_id in {pub_id.split(":")[0] for pub_id in publications}:
+                self.touch_author_last_modification(author_id)
+        return saved
+
+    def get_publication_citations(self, author_id):
+        """
+        ``{author_pub_id: (num_citations, timestamp)}`` for the author's
+        stored publications, from one projected query; None on errors.
+        """
+        found = self.firestore_service.select_by_prefix(
+            Config.FIRESTORE_COLLECTION_PUB,
+            "data.author_pub_id",
+            f"{author_id}:",
+            ["data.num_citations"],
+        )
+        if found is None:
+            return None
+        return {
+            author_pub_id: (data.get("num_citations"), timestamp)
+            for author_pub_id, (data, timestamp) in found.items()
+        }
 
     def get_publication(self, author_pub_id):
         return self.firestore_service.get_firestore_cache(
             Config.FIRESTORE_COLLECTION_PUB, author_pub_id
         )[0]
 
+    def touch_author_last_modification(self, author_id, timestamp=None):
+        """Bumps the author's last-modified watermark (to now by default)."""
+        return self.firestore_service.set_firestore_cache(
+            Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK,
+            author_id,
+            {"scholar_id": author_id},
+            timestamp=timestamp,
+        )
+
+    def advance_author_last_modification(self, author_id, timestamp):
+        """
+        Moves the author's watermark forward to ``timestamp``, unless a
+        concurrent write already moved it later; returns the watermark.
+        """
+
+        def advance(data, current):
+            if current is not None and current >= timestamp:
+                return None
+            return {"scholar_id": author_id}, timestamp
+
+        _, watermark = self.firestore_service.update_firestore_cache(
+            Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id, advance
+        )
+        return watermark or timestamp
+
+    def get_author_last_modification_watermark(self, author_id):
+        return self.firestore_service.get_firestore_cache(
+            Config.FIRESTORE_COLLECTION_AUTHOR_WATERMARK, author_id
+        )[1]
+
     def get_latest_publication_timestamp(self, author_id):
         publications = self.firestore_service.query_by_prefix(
             Config.FIRESTORE_COLLECTION_PUB, "data.author_pub_id", author_id
@@ -0,0 +1,180 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from ..config import Config
+
+PROFILE_FIELDS = ["name", "affiliation", "email_domain", "citedby", "scholar_id"]
+
+
+def normalize_name(name):
+    """
+    Lowercase ASCII tokens of a name: accents are dropped and punctuation
+    separates tokens, so "Jean-Pierre  Lévy" gives ["jean", "pierre", "levy"].
+    """
+    name = unicodedata.normalize("NFKD", name or "")
+    name = name.encode("ascii", "ignore").decode("ascii").lower()
+    return re.findall(r"[a-z0-9]+", name)
+
+
+def name_key(name):
+    """Canonical form of a name, used as a cache key."""
+    return " ".join(normalize_name(name))
+
+
+def is_strong_match(name, profile):
+    """
+    Whether the profile's name is the queried name, up to case, accents,
+    punctuation and token order.
+    """
+    tokens = sorted(normalize_name(name))
+    return bool(tokens) and tokens == sorted(normalize_name(profile.get("name")))
+
+
+def merge_authors(*author_lists):
+    """Concatenates lists of profiles, keeping the first of each scholar_id."""
+    merged, seen = [], set()
+    for authors in author_lists:
+        for author in authors or []:
+            scholar_id = author.get("scholar_id")
+            if scholar_id and scholar_id in seen:
+                continue
+            seen.add(scholar_id)
+            merged.append(author)
+    return merged
+
+
+def _citedby(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class AuthorNameIndex:
+    """
+    In-memory name search over the author profiles stored in Firestore.
+
+    Every full name token of a query must match a token of the author's name,
+    either exactly or through an initial in the name ("J Smith" matches
+    "john"); initials in the query must match the first letter of one of the
+    author's tokens. At least one full token must match exactly. Results are
+    ranked by exact matches, then by citations.
+
+    The index is built from a projection of the author collection and then
+    refreshed incrementally with the profiles written since the last refresh.
+    """
+
+    def __init__(self, firestore_service):
+        self.firestore_service = firestore_service
+        self.profiles = {}  # scholar_id -> profile
+        self.tokens = {}  # scholar_id -> tokens of the name
+        self.postings = defaultdict(set)  # full token -> scholar_ids
+        self.initial_postings = defaultdict(set)  # letter -> ids with that initial
+        self.last_timestamp = None
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def refresh(self):
+        """Loads the profiles written since the last refresh; returns how many."""
+        with self._refresh_lock:
+            query = self.firestore_service.db.collection(
+                Config.FIRESTORE_COLLECTION_AUTHOR
+            ).select(["timestamp"] + [f"data.{field}" for field in PROFILE_FIELDS])
+            if self.last_timestamp is not None:
+                query = query.where(
+                    filter=FieldFilter("timestamp", ">", self.last_timestamp)
+                )
+            count = 0
+            try:
+                for doc in query.order_by("timestamp").stream():
+                    entry = doc.to_dict()
+                    self._add(doc.id, entry.get("data") or {})
+                    self.last_timestamp = entry.get("timestamp") or self.last_timestamp
+                    count += 1
+            except Exception as e:
+                logging.error(f"Error refreshing the author name index: {e}")
+            self.last_refresh = time.monotonic()
+        logging.info(f"Author name index: {count} profiles loaded, {len(self)} in total.")
+        return count
+
+    def refresh_if_due(self, background=True):
+        """
+        Refreshes the index if the last refresh is older than the interval,
+        by default in a background thread so that lookups never wait for it.
+        """
+        if time.monotonic() - self.last_refresh < Config.AUTHOR_INDEX_REFRESH_INTERVAL:
+            return
+        if self._refresh_lock.locked():
+            return  # already refreshing
+        if background:
+            threading.Thread(target=self.refresh, daemon=True).start()
+        else:
+            self.refresh()
+
+    def _add(self, scholar_id, data):
+        scholar_id = data.get("scholar_id") or scholar_id
+        profile = {
+            "name": data.get("name", ""),
+            "affiliation": data.get("affiliation", ""),
+            "email": data.get("email_domain", ""),
+            "citedby": _citedby(data.get("citedby")),
+            "scholar_id": scholar_id,
+        }
+        tokens = normalize_name(profile["name"])
+        with self._lock:
+            self._remove(scholar_id)
+            self.profiles[scholar_id] = profile
+            self.tokens[scholar_id] = tokens
+            for token in tokens:
+                if len(token) == 1:
+                    self.initial_postings[token].add(scholar_id)
+                else:
+                    self.postings[token].add(scholar_id)
+
+    def _remove(self, scholar_id):
+        for token in self.tokens.pop(scholar_id, []):
+            postings = self.initial_postings if len(token) == 1 else self.postings
+            postings[token].discard(scholar_id)
+        self.profiles.pop(scholar_id, None)
+
+    def search(self, name, limit=10):
+        """Profiles matching the name, best first."""
+        query_tokens = normalize_name(name)
+        full_tokens = [token for token in query_tokens if len(token) > 1]
+        initials = [token for token in query_tokens if len(token) == 1]
+        if not full_tokens:
+            return []
+
+        with self._lock:
+            candidates = None
+            for token in full_tokens:
+                matching = self.postings.get(token, set()) | self.initial_postings.get(
+                    token[0], set()
+                )
+                candidates = matching if candidates is None else candidates & matching
+                if not candidates:
+                    return []
+
+            ranked = []
+            for scholar_id in candidates:
+                tokens = self.tokens[scholar_id]
+                exact = sum(token in tokens for token in full_tokens)
+                if exact == 0:
+                    continue
+                if not all(any(t[0] == initial for t in tokens) for initial in initials):
+                    continue
+                profile = self.profiles[scholar_id]
+                ranked.append((-exact, -profile["citedby"], scholar_id, profile))
+
+        ranked.sort(key=lambda item: item[:3])
+        return [dict(profile) for *_, profile in ranked[:limit]]
@@ -1,14 +1,22 @@
 import logging 
 from google.cloud import bigquery
-from google.cloud.bigquery import ScalarQueryParameter 
+from google.cloud.bigquery import ArrayQueryParameter, ScalarQueryParameter
 from datetime import datetime
 import pandas as pd
+import pyarrow as pa
 from ..config import Config  
+from .local_stats_service import LocalStatsService
 
 
 class BigQueryService:
-    def __init__(self):
+    def __init__(self, stats_backend=None):
         self.client = bigquery.Client(project=Config.PROJECT_ID)
+        self.stats_backend = stats_backend or Config.STATS_BACKEND
+        self.local_stats = None
+        if self.stats_backend == "local":
+            self.local_stats = LocalStatsService.from_snapshot(Config.STATS_SNAPSHOT_PATH)
+        elif self.stats_backend != "bigquery":
+            raise ValueError(f"Unknown stats backend: {self.stats_backend}")
 
     def query(self, sql, query_params=None):
         """ Executes a BigQuery SQL query with optional parameters. """
@@ -28,6 +36,9 @@ class BigQueryService:
 
 
     def get_author_pub_stats(self, author_id):
+        if self.local_stats is not None:
+            return self.local_stats.get_author_pub_stats(author_id)
+
         sql = """
             WITH pub_details AS ((
                 SELECT
@@ -51,6 +62,9 @@ class BigQueryService:
         return df.to_dict("records")
 
     def get_author_stats(self, author_id):
+        if self.local_stats is not None:
+            return self.local_stats.get_author_stats(author_id)
+
         sql = """
             SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
             FROM `scholar-version2.statistics.stats_author_current` S
@@ -73,16 +87,58 @@ class BigQueryService:
             logging.warning(f"No author stats found for author_id: {author_id}.")
             return None
 
-    def get_all_authors_stats(self):
-        # This query doesn't have external parameters, so no injection risk here.
+    def get_authors_stats(self, author_ids):
+        """Stats of many authors with one query; returns {scholar_id: stats}."""
+        if not author_ids:
+            return {}
+        if self.local_stats is not None:
+            return self.local_stats.get_authors_stats(author_ids)
+
         sql = """
             SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
             FROM `scholar-version2.statistics.stats_author_current` S
             LEFT JOIN `scholar-version2.statistics.stats_author_pip_scores_current` P ON P.scholar_id = S.scholar_id
+            WHERE S.scholar_id IN UNNEST(@author_ids)
         """
-        df = self.query(sql) # No query_params needed
+        query_params = [
+            ArrayQueryParameter("author_ids", "STRING", list(author_ids))
+        ]
+        df = self.query(sql, query_params=query_params)
+        return {record["scholar_id"]: record for record in df.to_dict("records")}
+
+    # This query doesn't have external parameters, so no injection risk here.
+    ALL_AUTHORS_STATS_SQL = """
+        SELECT S.*, P.pip_auc_score, P.pip_auc_score_percentile
+        FROM `scholar-version2.statistics.stats_author_current` S
+        LEFT JOIN `scholar-version2.statistics.stats_author_pip_scores_current` P ON P.scholar_id = S.scholar_id
+    """
+
+    def get_all_authors_stats(self):
+        if self.local_stats is not None:
+            return self.local_stats.get_all_authors_stats()
+
+        df = self.query(self.ALL_AUTHORS_STATS_SQL) # No query_params needed
         return df
 
+    def iter_all_authors_stats(self, batch_size=None):
+        """
+        Yields the stats of all authors as pyarrow RecordBatches, one result
+        page at a time, so that the full table is never held in memory.
+        """
+        batch_size = batch_size or Config.EXPORT_BATCH_ROWS
+        if self.local_stats is not None:
+            df = self.local_stats.get_all_authors_stats()
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            for start in range(0, len(df), batch_size):
+                yield pa.RecordBatch.from_pandas(
+                    df.iloc[start : start + batch_size], schema=schema, preserve_index=False
+                )
+            return
+
+        query_job = self.client.query(self.ALL_AUTHORS_STATS_SQL)
+        rows = query_job.result(page_size=batch_size)
+        yield from rows.to_arrow_iterable()
+
     def get_publication_stats(self, author_pub_id):
         current_year = datetime.now().year
         sql = """
@@ -0,0 +1,239 @@
+"""
+Pacing of the Google Scholar fetches made by the Cloud Functions.
+
+Every fetch goes through ``CrawlController.call``, which waits for the
+instance's request budget, classifies failures and adapts the budget with
+AIMD: successes grow it slowly, captchas and rate limiting halve it. When
+Scholar is blocking (a captcha, or the rolling success rate falling under
+CRAWL_PAUSE_BELOW) a pause is published in Firestore, in
+``crawl_control/{scope}``: fetches are refused until it ends, and
+TaskQueueService sends new tasks elsewhere or schedules them after it,
+instead of letting Cloud Tasks retry into the block. Consecutive pauses
+double in length. Scopes are function regions (see RegionRouter), since each
+region fetches from its own egress pool.
+
+When a page cache answers scholarly's page requests (ScholarResponseCache),
+a call is only paced, and its outcome recorded, once one of its pages is
+actually downloaded: calls answered from the cache alone cost nothing.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from ..config import Config
+from .rate_limiter import AdaptiveRateLimiter
+
+# Outcomes of a fetch
+OK = "ok"
+CAPTCHA = "captcha"
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+NOT_FOUND = "not_found"
+ERROR = "error"
+
+# Outcomes meaning that Scholar is pushing back
+BLOCKED = (CAPTCHA, RATE_LIMITED)
+
+
+class CrawlThrottled(Exception):
+    """A fetch refused or failed because Scholar is throttling us."""
+
+    def __init__(self, outcome, paused_until=None):
+        super().__init__(outcome)
+        self.outcome = outcome
+        self.paused_until = paused_until
+
+    def retry_after(self, default=60):
+        """Seconds until the pause ends, for a Retry-After header."""
+        if self.paused_until is None:
+            return default
+        remaining = (self.paused_until - datetime.now(timezone.utc)).total_seconds()
+        return max(1, int(remaining))
+
+
+# Whether page downloads are announced with page_download_starting
+_lazy_pacing = False
+# State of the CrawlController.call running in each thread
+_calls = threading.local()
+
+
+def set_lazy_pacing(enabled):
+    """Called by a page cache when it starts (or stops) wrapping downloads."""
+    global _lazy_pacing
+    _lazy_pacing = enabled
+
+
+def page_download_starting():
+    """
+    Called before a page is downloaded: the call running in this thread, if
+    any, waits for its pacing token (once per call).
+    """
+    call = getattr(_calls, "current", None)
+    if call is not None and not call["paced"]:
+        call["controller"].limiter.acquire()
+        call["paced"] = True
+
+
+def page_download_failed(error):
+    """Called when a download failed but the call went on (e.g. with a stale page)."""
+    call = getattr(_calls, "current", None)
+    if call is not None:
+        call["error"] = error
+
+
+def classify_failure(error):
+    """Maps an exception raised by a scholarly fetch to an outcome."""
+    name = type(error).__name__
+    message = str(error).lower()
+    if "captcha" in message:
+        return CAPTCHA
+    # scholarly gives up with these after exhausting its retries, which in
+    # practice means that every session it tried was refused
+    if name in ("MaxTriesExceededException", "DOSException"):
+        return RATE_LIMITED
+    if "429" in message or "too many requests" in message or "403" in message:
+        return RATE_LIMITED
+    if "timeout" in name.lower() or "timed out" in message:
+        return TIMEOUT
+    if "404" in message or "not found" in message:
+        return NOT_FOUND
+    return ERROR
+
+
+class CrawlController:
+    def __init__(self, firestore_service, scope="scholar", on_outcome=None):
+        self.firestore_service = firestore_service
+        self.scope = scope
+        # Called with (outcome, seconds) after every fetch
+        self.on_outcome = on_outcome
+        self.outcomes = deque(maxlen=Config.CRAWL_WINDOW)
+        self.counts = {}
+        self._lock = threading.Lock()
+        rate = (self._control() or {}).get("rate") or Config.CRAWL_INITIAL_RATE
+        self.limiter = AdaptiveRateLimiter(
+            min(max(rate, Config.CRAWL_MIN_RATE), Config.CRAWL_MAX_RATE),
+            Config.CRAWL_MIN_RATE,
+            Config.CRAWL_MAX_RATE,
+            increase=Config.CRAWL_RATE_INCREASE,
+            cooldown=Config.CRAWL_DECREASE_COOLDOWN,
+        )
+
+    def _control(self):
+        return self.firestore_service.get_firestore_cache(
+            Config.FIRESTORE_COLLECTION_CRAWL_CONTROL, self.scope
+        )[0]
+
+    def paused_until(self):
+        """End of the current pause, or None when fetching is allowed."""
+        paused_until = (self._control() or {}).get("paused_until")
+        if paused_until and paused_until > datetime.now(timezone.utc):
+            return paused_until
+        return None
+
+    def success_rate(self):
+        with self._lock:
+            if len(self.outcomes) < Config.CRAWL_MIN_SAMPLES:
+                return None
+            # Not found is an answer: Scholar is serving us
+            return sum(o in (OK, NOT_FOUND) for o in self.outcomes) / len(self.outcomes)
+
+    def call(self, fetch, *args, **kwargs):
+        """
+        Runs ``fetch`` within the budget and records its outcome. Raises
+        CrawlThrottled while paused or when Scholar pushes back; other
+        errors are re-raised as they are.
+        """
+        paused_until = self.paused_until()
+        if paused_until is not None:
+            raise CrawlThrottled("paused", paused_until)
+        call = {"controller": self, "paced": not _lazy_pacing, "error": None}
+        if call["paced"]:
+            self.limiter.acquire()
+        started = time.monotonic()
+        _calls.current = call
+        try:
+            result = fetch(*args, **kwargs)
+        except Exception as e:
+            if not call["paced"]:
+                raise  # Scholar was not reached
+            outcome = classify_failure(e)
+            self.record(outcome, time.monotonic() - started)
+            if outcome in BLOCKED:
+                raise CrawlThrottled(outcome, self.paused_until()) from e
+            raise
+        finally:
+            _calls.current = None
+        if call["paced"]:
+            outcome = OK if call["error"] is None else classify_failure(call["error"])
+            self.record(outcome, time.monotonic() - started)
+        return result
+
+    def record(self, outcome, seconds=None):
+        if self.on_outcome is not None:
+            self.on_outcome(outcome, seconds)
+        with self._lock:
+            self.outcomes.append(outcome)
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        if outcome in BLOCKED:
+            self.limiter.on_throttle()
+        elif outcome in (OK, NOT_FOUND):
+            self.limiter.on_success()
+
+        success_rate = self.success_rate()
+        if outcome == CAPTCHA or (
+            success_rate is not None and success_rate < Config.CRAWL_PAUSE_BELOW
+        ):
+            self.pause(outcome, success_rate)
+
+    def pause(self, reason, success_rate=None):
+        """
+        Publishes a pause, twice as long as the previous one if it just ended.
+        Instances share the pause, so it is set in a transaction that keeps
+        the current pause, if any, instead of shortening it.
+        """
+        rate = self.limiter.rate
+        started = []
+
+        def start_pause(control, timestamp):
+            control = control or {}
+            now = datetime.now(timezone.utc)
+            started.clear()
+            if control.get("paused_until") and control["paused_until"] > now:
+                return None  # already paused
+            seconds = Config.CRAWL_PAUSE_SECONDS
+            last_pause = control.get("pause_seconds")
+            if last_pause and control.get("paused_until") and (
+                now - control["paused_until"]
+            ).total_seconds() < last_pause:
+                seconds = min(2 * last_pause, Config.CRAWL_MAX_PAUSE_SECONDS)
+            started.append(seconds)
+            return {
+                "paused_until": now + timedelta(seconds=seconds),
+                "pause_seconds": seconds,
+                "reason": reason,
+                "success_rate": success_rate,
+                "rate": rate,
+            }, None
+
+        _, timestamp = self.firestore_service.update_firestore_cache(
+            Config.FIRESTORE_COLLECTION_CRAWL_CONTROL, self.scope, start_pause
+        )
+        if timestamp is not None and started:
+            logging.warning(
+                f"Pausing {self.scope} crawling for {started[0]}s ({reason}, "
+                f"success rate {success_rate}, rate {rate:.2f}/s)."
+            )
+        with self._lock:
+            self.outcomes.clear()  # start over after the pause
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "rate": self.limiter.rate,
+            "success_rate": self.success_rate(),
+            "paused_until": self.paused_until(),
+            "outcomes": counts,
+        }
@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import io
+import json
+import logging
+from datetime import datetime, timezone
+
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from ..config import Config
+from .bigquery_service import BigQueryService
+from .storage_service import StorageService
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class _ChecksumWriter(io.RawIOBase):
+    """
+    Forwards writes to a blob writer, counting bytes and hashing them. Once
+    ``raw`` is None (the upload was cancelled) writes are discarded.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.raw is None:
+            return len(data)
+        self.raw.write(data)
+        self.sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        # Chunks are uploaded by the blob writer as they fill up
+        pass
+
+
+class _FormatWriter:
+    """Streams record batches of one format into one GCS object."""
+
+    def __init__(self, storage_service, fmt, blob_name):
+        self.fmt = fmt
+        self.blob_name = blob_name
+        self.blob_writer = storage_service.bucket.blob(blob_name).open(
+            "wb",
+            content_type=CONTENT_TYPES[fmt],
+            chunk_size=Config.EXPORT_UPLOAD_CHUNK_SIZE,
+            ignore_flush=True,
+        )
+        self.sink = _ChecksumWriter(self.blob_writer)
+        self.stream = self.sink
+        if fmt == "csv.gz":
+            self.stream = gzip.GzipFile(fileobj=self.sink, mode="wb")
+        self.writer = None
+
+    def write(self, batch):
+        if self.writer is None:
+            if self.fmt == "parquet":
+                self.writer = pq.ParquetWriter(self.stream, batch.schema)
+            else:
+                self.writer = pa_csv.CSVWriter(self.stream, batch.schema)
+        self.writer.write_batch(batch)
+
+    def close(self):
+        """Finalizes the object; only then does it replace the previous one."""
+        if self.writer is not None:
+            self.writer.close()
+        if self.stream is not self.sink:
+            self.stream.close()
+        self.blob_writer.close()
+        return {
+            "name": self.blob_name,
+            "content_type": CONTENT_TYPES[self.fmt],
+            "bytes": self.sink.size,
+            "sha256": self.sink.sha256.hexdigest(),
+        }
+
+    def abort(self):
+        """
+        Cancels the upload, so that the previous object stays. A blob writer
+        left to the garbage collector would be closed, which finalizes it.
+        """
+        try:
+            self.blob_writer.terminate()
+        except Exception as e:
+            logging.error(f"Could not cancel the upload of {self.blob_name}: {e}")
+        # What the format writers flush on closing now goes nowhere
+        self.sink.raw = None
+        try:
+            if self.writer is not None:
+                self.writer.close()
+            if self.stream is not self.sink:
+                self.stream.close()
+        except Exception:
+            pass
+
+
+class ExportService:
+    """
+    Exports the stats of all authors to GCS in several formats at once.
+
+    Rows are streamed from BigQuery one page of Arrow record batches at a
+    time and written straight into resumable chunked uploads, so memory use
+    does not grow with the number of authors. A manifest with the row count
+    and the size and SHA-256 of every file is written last.
+    """
+
+    def __init__(self, bigquery_service=None, storage_service=None):
+        self.bigquery_service = bigquery_service or BigQueryService()
+        self.storage_service = storage_service or StorageService()
+
+    @staticmethod
+    def blob_name(fmt, basename=None):
+        return f"{basename or Config.EXPORT_BASENAME}.{fmt}"
+
+    @staticmethod
+    def manifest_name(basename=None):
+        return f"{basename or Config.EXPORT_BASENAME}.manifest.json"
+
+    def export_all_authors_stats(self, formats=None, basename=None):
+        """Returns the manifest of the export, or None if there were no rows."""
+        formats = formats or Config.EXPORT_FORMATS
+        for fmt in formats:
+            if fmt not in CONTENT_TYPES:
+                raise ValueError(f"Unknown export format: {fmt}")
+
+        writers = []
+        rows = 0
+        schema = None
+        # On failure, or without rows, every upload is cancelled, so no
+        # partial or empty object is finalized and the previous export stays
+        try:
+            for fmt in formats:
+                writers.append(
+                    _FormatWriter(
+                        self.storage_service, fmt, self.blob_name(fmt, basename)
+                    )
+                )
+            for batch in self.bigquery_service.iter_all_authors_stats():
+                if batch.num_rows == 0:
+                    continue
+                schema = schema or batch.schema
+                for writer in writers:
+                    writer.write(batch)
+                rows += batch.num_rows
+        except BaseException:
+            for writer in writers:
+                writer.abort()
+            raise
+
+        if rows == 0:
+            for writer in writers:
+                writer.abort()
+            logging.warning("Export of all authors' stats returned no rows, skipping.")
+            return None
+
+        files = {}
+        try:
+            for writer in writers:
+                files[writer.fmt] = writer.close()
+        except BaseException:
+            # The manifest is not written, so it still describes the
+            # previous export, although the files in ``files`` replaced it
+            for writer in writers:
+                if writer.fmt not in files:
+                    writer.abort()
+            logging.error(
+                f"Export of all authors' stats failed after finalizing {list(files)}."
+            )
+            raise
+
+        manifest = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "rows": rows,
+            "columns": [
+                {"name": field.name, "type": str(field.type)} for field in schema
+            ],
+            "files": files,
+        }
+        self.storage_service.upload_bytes(
+            self.manifest_name(basename),
+            json.dumps(manifest, indent=2).encode("utf-8"),
+            "application/json",
+        )
+        self.storage_service.forget_blob_metadata(self.manifest_name(basename))
+        logging.info(f"Exported stats of {rows} authors as {', '.join(formats)}")
+        return manifest
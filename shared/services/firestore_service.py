@@ -4,13 +4,28 @@ from google.cloud.firestore_v1.base_query import FieldFilter
 from datetime import datetime, timedelta
 import pytz
 from ..config import Config
+from .memory_cache import MemoryCache
+
+# Shared by every FirestoreService in the process, so that a write through
+# one instance is seen by reads through the others.
+process_cache = MemoryCache(
+    max_bytes=Config.FIRESTORE_CACHE_MAX_BYTES,
+    ttls=Config.FIRESTORE_CACHE_TTLS,
+    default_ttl=Config.FIRESTORE_CACHE_DEFAULT_TTL,
+)
 
 
 class FirestoreService:
-    def __init__(self):
+    def __init__(self, cache=None):
         self.db = firestore.Client(project=Config.PROJECT_ID)
+        self.cache = cache or process_cache
 
     def get_firestore_cache(self, collection, doc_id):
+        cached = self.cache.get(collection, doc_id)
+        if cached is not None:
+            logging.info(f"Fetched data from memory for '{doc_id}' in {collection}.")
+            return cached
+
         logging.info(
             f"Fetching from Firestore for '{doc_id}' in collection {collection}."
         )
@@ -21,28 +36,144 @@ class FirestoreService:
                 cached_data = doc.to_dict()
                 cached_time = cached_data["timestamp"]
                 logging.info(f"Fetched data from Firestore for '{doc_id}'.")
+                self.cache.set(collection, doc_id, (cached_data["data"], cached_time))
                 return cached_data["data"], cached_time
         except Exception as e:
             logging.error(f"Error accessing Firestore: {e}")
         return None, None
 
-    def set_firestore_cache(self, collection, doc_id, data):
+    def set_firestore_cache(self, collection, doc_id, data, timestamp=None):
         if not doc_id.strip():
             logging.error("Firestore document ID is empty or invalid.")
             return False
 
         doc_ref = self.db.collection(collection).document(doc_id)
-        current_time = datetime.utcnow().replace(tzinfo=pytz.utc)
+        current_time = timestamp or datetime.utcnow().replace(tzinfo=pytz.utc)
         cache_data = {"timestamp": current_time, "data": data}
 
         try:
             doc_ref.set(cache_data)
             logging.info(f"Data set in Firestore for '{doc_id}'.")
+            self.cache.set(collection, doc_id, (data, current_time))
             return True  # success
         except Exception as e:
             logging.error(f"Error updating Firestore: {e}")
+            self.cache.invalidate(collection, doc_id)
             return False  # failure
 
+    def update_firestore_cache(self, collection, doc_id, update):
+        """
+        Read-modify-write of a document in a Firestore transaction, so that
+        concurrent writers cannot overwrite each other's changes.
+
+        ``update(data, timestamp)`` gets the stored document ((None, None) if
+        missing) and returns the ``(data, timestamp)`` to store, a None
+        timestamp meaning now, or None to leave the document as it is. It may
+        be called several times when the transaction is retried. Returns the
+        ``(data, timestamp)`` stored afterwards, or (None, None) on errors.
+        """
+        doc_ref = self.db.collection(collection).document(doc_id)
+
+        @firestore.transactional
+        def run(transaction):
+            doc = doc_ref.get(transaction=transaction)
+            stored = doc.to_dict() if doc.exists else {}
+            current = (stored.get("data"), stored.get("timestamp"))
+            updated = update(*current)
+            if updated is None:
+                return current
+            data, timestamp = updated
+            timestamp = timestamp or datetime.utcnow().replace(tzinfo=pytz.utc)
+            transaction.set(doc_ref, {"timestamp": timestamp, "data": data})
+            return data, timestamp
+
+        try:
+            data, timestamp = run(self.db.transaction())
+        except Exception as e:
+            logging.error(f"Error updating Firestore: {e}")
+            self.cache.invalidate(collection, doc_id)
+            return None, None
+        if timestamp is not None:
+            self.cache.set(collection, doc_id, (data, timestamp))
+        return data, timestamp
+
+    def get_many_firestore_cache(self, collection, doc_ids):
+        """
+        Batched get_firestore_cache: returns ``{doc_id: (data, timestamp)}``
+        for the documents that exist, reading the ones not held in memory
+        with multi-document gets.
+        """
+        found = {}
+        misses = []
+        for doc_id in doc_ids:
+            cached = self.cache.get(collection, doc_id)
+            if cached is not None:
+                found[doc_id] = cached
+            else:
+                misses.append(doc_id)
+
+        chunk_size = Config.FIRESTORE_GET_ALL_CHUNK
+        for start in range(0, len(misses), chunk_size):
+            refs = [
+                self.db.collection(collection).document(doc_id)
+                for doc_id in misses[start : start + chunk_size]
+            ]
+            try:
+                for doc in self.db.get_all(refs):
+                    if not doc.exists:
+                        continue
+                    cached_data = doc.to_dict()
+                    entry = (cached_data["data"], cached_data["timestamp"])
+                    self.cache.set(collection, doc.id, entry)
+                    found[doc.id] = entry
+            except Exception as e:
+                logging.error(f"Error accessing Firestore: {e}")
+
+        logging.info(
+            f"Fetched {len(found)} of {len(doc_ids)} documents in {collection}, "
+            f"{len(misses)} from Firestore."
+        )
+        return found
+
+    def set_many_firestore_cache(self, collection, items, timestamp=None):
+        """Batched set_firestore_cache for ``{doc_id: data}``; returns the count written."""
+        current_time = timestamp or datetime.utcnow().replace(tzinfo=pytz.utc)
+        items = [(doc_id, data) for doc_id, data in items.items() if doc_id.strip()]
+        written = 0
+        for start in range(0, len(items), Config.FIRESTORE_BATCH_SIZE):
+            chunk = items[start : start + Config.FIRESTORE_BATCH_SIZE]
+            batch = self.db.batch()
+            for doc_id, data in chunk:
+                batch.set(
+                    self.db.collection(collection).document(doc_id),
+                    {"timestamp": current_time, "data": data},
+                )
+            try:
+                batch.commit()
+            except Exception as e:
+                logging.error(f"Error updating Firestore: {e}")
+                for doc_id, _ in chunk:
+                    self.cache.invalidate(collection, doc_id)
+                continue
+            for doc_id, data in chunk:
+                self.cache.set(collection, doc_id, (data, current_time))
+            written += len(chunk)
+        logging.info(f"Data set in Firestore for {written} documents in {collection}.")
+        return written
+
+    def cache_stats(self):
+        """Hit/miss/eviction counters of the in-process cache tier."""
+        return self.cache.stats()
+
+    def count(self, collection, field, op, value):
+        """Number of documents matching one filter, as an aggregation query."""
+        query = self.db.collection(collection).where(filter=FieldFilter(field, op, value))
+        try:
+            return query.count().get()[0][0].value
+        except Exception as e:
+            logging.error(f"Error counting documents in {collection}: {e}")
+            return None
+
     def query_by_prefix(self, collection, field, prefix):
         """
         Perform a query in a Firestore collection using a prefix on a specified field.
@@ -61,6 +192,28 @@ class FirestoreService:
         results = query.stream()
         return [doc.to_dict() for doc in results]
 
+    def select_by_prefix(self, collection, field, prefix, fields):
+        """
+        Prefix query like query_by_prefix that only reads the given fields
+        (dotted paths, e.g. "data.num_citations"); returns
+        ``{doc_id: (data, timestamp)}``.
+        """
+        query = (
+            self.db.collection(collection)
+            .where(filter=FieldFilter(field, ">=", prefix))
+            .where(filter=FieldFilter(field, "<=", prefix + "\uf8ff"))
+            .select(["timestamp"] + list(fields))
+        )
+        found = {}
+        try:
+            for doc in query.stream():
+                entry = doc.to_dict()
+                found[doc.id] = (entry.get("data") or {}, entry.get("timestamp"))
+        except Exception as e:
+            logging.error(f"Error querying Firestore: {e}")
+            return None
+        return found
+
     def objects_needing_refresh(
         self, collection, days_since_last_update, limit, key_attr
     ):
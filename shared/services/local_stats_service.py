@@ -0,0 +1,398 @@
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ..config import Config
+
+
+# Columns of the snapshot tables. They mirror the JSON fields that the
+# BigQuery views extract from the raw Firestore exports.
+AUTHOR_COLUMNS = [
+    "scholar_id",
+    "name",
+    "affiliation",
+    "email_domain",
+    "hindex",
+    "hindex5y",
+    "citedby",
+    "citedby5y",
+    "i10index",
+    "i10index5y",
+    "timestamp",
+]
+AUTHOR_PUBLICATION_COLUMNS = ["scholar_id", "author_pub_id", "pub_year"]
+PUBLICATION_COLUMNS = [
+    "author_pub_id",
+    "title",
+    "citation",
+    "pub_year",
+    "num_citations",
+    "timestamp",
+]
+
+AUTHOR_METRICS = [
+    "hindex",
+    "hindex5y",
+    "citedby",
+    "citedby5y",
+    "i10index",
+    "i10index5y",
+    "total_publications",
+    "total_publications_with_citations",
+]
+AUTHOR_STATS_COLUMNS = (
+    AUTHOR_COLUMNS[:-1]
+    + [
+        "total_publications",
+        "total_publications_with_citations",
+        "year_of_first_pub",
+        "last_updated",
+    ]
+    + [f"{metric}_percentile" for metric in AUTHOR_METRICS]
+    + ["pip_auc_score", "pip_auc_score_percentile"]
+)
+AUTHOR_PUB_STATS_COLUMNS = [
+    "author_pub_id",
+    "title",
+    "citation",
+    "pub_year",
+    "num_citations",
+    "num_citations_percentile",
+    "publication_rank",
+    "num_papers_percentile",
+]
+INTEGER_COLUMNS = [
+    "hindex",
+    "hindex5y",
+    "citedby",
+    "citedby5y",
+    "i10index",
+    "i10index5y",
+    "total_publications",
+    "total_publications_with_citations",
+    "year_of_first_pub",
+    "pub_year",
+    "num_citations",
+    "publication_rank",
+]
+
+SNAPSHOT_QUERIES = {
+    "authors": """
+        SELECT
+            JSON_EXTRACT_SCALAR(DATA, '$.data.scholar_id') AS scholar_id,
+            JSON_EXTRACT_SCALAR(DATA, '$.data.name') AS name,
+            JSON_EXTRACT_SCALAR(DATA, '$.data.affiliation') AS affiliation,
+            JSON_EXTRACT_SCALAR(DATA, '$.data.email_domain') AS email_domain,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.hindex') AS INT64) AS hindex,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.hindex5y') AS INT64) AS hindex5y,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.citedby') AS INT64) AS citedby,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.citedby5y') AS INT64) AS citedby5y,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.i10index') AS INT64) AS i10index,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.i10index5y') AS INT64) AS i10index5y,
+            timestamp
+        FROM `scholar-version2.firestore_export.scholar_raw_author_raw_latest`
+        WHERE JSON_EXTRACT_SCALAR(DATA, '$.data.scholar_id') IS NOT NULL
+    """,
+    "author_publications": """
+        SELECT scholar_id, author_pub_id, pub_year
+        FROM `scholar-version2.statistics.base_author_publications`
+    """,
+    "publications": """
+        SELECT
+            JSON_EXTRACT_SCALAR(DATA, '$.data.author_pub_id') AS author_pub_id,
+            JSON_EXTRACT_SCALAR(DATA, '$.data.bib.title') AS title,
+            JSON_EXTRACT_SCALAR(DATA, '$.data.bib.citation') AS citation,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.bib.pub_year') AS INT64) AS pub_year,
+            CAST(JSON_EXTRACT_SCALAR(DATA, '$.data.num_citations') AS INT64) AS num_citations,
+            timestamp
+        FROM `scholar-version2.firestore_export.scholar_raw_pub_raw_latest`
+    """,
+}
+
+
+def export_snapshot(bigquery_service, snapshot_path):
+    """
+    Writes the columnar snapshot read by LocalStatsService.
+
+    Each table is extracted from the raw Firestore exports in BigQuery and
+    stored as ``<snapshot_path>/<table>.parquet``.
+    """
+    os.makedirs(snapshot_path, exist_ok=True)
+    for table, sql in SNAPSHOT_QUERIES.items():
+        df = bigquery_service.query(sql)
+        df.to_parquet(os.path.join(snapshot_path, f"{table}.parquet"), index=False)
+        logging.info(f"Exported {len(df)} rows to snapshot table '{table}'.")
+
+
+def _null_codes(values):
+    """Integer partition codes; NULL values form a partition of their own."""
+    codes, _ = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    return codes
+
+
+def _percent_rank(values, partition):
+    """
+    NumPy equivalent of
+    ``PERCENT_RANK() OVER (PARTITION BY partition ORDER BY values ASC)``.
+
+    As in BigQuery, NULL values sort first and are tied with each other.
+    """
+    values = pd.Series(values).astype(float).to_numpy()
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+
+    keys = np.where(np.isnan(values), -np.inf, values)
+    groups = _null_codes(partition)
+    order = np.lexsort((keys, groups))
+    sorted_groups = groups[order]
+    sorted_keys = keys[order]
+    positions = np.arange(n)
+
+    group_start = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    tie_start = group_start | np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    first_in_group = np.maximum.accumulate(np.where(group_start, positions, 0))
+    first_in_tie = np.maximum.accumulate(np.where(tie_start, positions, 0))
+
+    group_ids = np.cumsum(group_start) - 1
+    group_sizes = np.bincount(group_ids)[group_ids]
+    ranks = (first_in_tie - first_in_group) / np.maximum(group_sizes - 1, 1)
+
+    result = np.empty(n)
+    result[order] = np.where(group_sizes > 1, ranks, 0.0)
+    return result
+
+
+def _to_records(df):
+    """Converts a frame to JSON/Firestore friendly records (NULL -> None)."""
+    df = df.copy()
+    for column in INTEGER_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("Int64")
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+class LocalStatsService:
+    """
+    In-process replacement for the BigQuery statistics views.
+
+    Loads a columnar snapshot of authors and publications and computes the
+    outputs of ``stats_publication_current``, ``stats_author_current``,
+    ``stats_author_publication_pip_inputs_current`` and
+    ``stats_author_pip_scores_current`` once, so that per-author lookups are
+    answered from memory.
+    """
+
+    def __init__(self, authors, author_publications, publications, current_year=None):
+        self.current_year = current_year or datetime.now().year
+        self._compute(
+            authors[AUTHOR_COLUMNS],
+            author_publications[AUTHOR_PUBLICATION_COLUMNS],
+            publications[PUBLICATION_COLUMNS],
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path=None):
+        snapshot_path = snapshot_path or Config.STATS_SNAPSHOT_PATH
+        logging.info(f"Loading statistics snapshot from {snapshot_path}.")
+        tables = {
+            table: pd.read_parquet(os.path.join(snapshot_path, f"{table}.parquet"))
+            for table in SNAPSHOT_QUERIES
+        }
+        return cls(**tables)
+
+    def _compute(self, authors, author_publications, publications):
+        # stats_publication_current
+        pubs = publications.copy()
+        pubs["scholar_id"] = pubs["author_pub_id"].str.split(":").str[0]
+        current = pubs[
+            (pubs["pub_year"] > 1950)
+            & (pubs["pub_year"] <= self.current_year)
+            & (pubs["num_citations"] > 0)
+        ].copy()
+        current["num_citations_percentile"] = _percent_rank(
+            current["num_citations"], current["pub_year"]
+        )
+
+        # stats_author_current
+        author_pubs = author_publications[
+            (author_publications["pub_year"] > 1950)
+            & (author_publications["pub_year"] <= self.current_year)
+        ]
+        cited = author_pubs["author_pub_id"].isin(current["author_pub_id"])
+        counts = author_pubs.groupby("scholar_id").agg(
+            total_publications=("author_pub_id", "size")
+        )
+        counts["total_publications_with_citations"] = (
+            cited.groupby(author_pubs["scholar_id"]).sum()
+        )
+        first_year = (
+            author_pubs[cited].groupby("scholar_id")["pub_year"].min()
+        ).rename("year_of_first_pub")
+
+        stats = authors[authors["scholar_id"].notna()].rename(
+            columns={"timestamp": "last_updated"}
+        )
+        stats = stats.join(first_year, on="scholar_id").join(counts, on="scholar_id")
+        for column in ["total_publications", "total_publications_with_citations"]:
+            stats[column] = stats[column].fillna(0)
+        for metric in AUTHOR_METRICS:
+            stats[f"{metric}_percentile"] = _percent_rank(
+                stats[metric], stats["year_of_first_pub"]
+            )
+
+        # stats_author_publication_pip_inputs_current
+        ranked = current.merge(
+            stats[["scholar_id", "year_of_first_pub"]], on="scholar_id"
+        )
+        ranked = ranked[ranked["year_of_first_pub"].notna()]
+        ranked = ranked.sort_values(
+            ["scholar_id", "num_citations_percentile", "author_pub_id"],
+            ascending=[True, False, True],
+            kind="stable",
+        ).reset_index(drop=True)
+        scholar_codes = _null_codes(ranked["scholar_id"])
+        group_start = np.r_[True, scholar_codes[1:] != scholar_codes[:-1]]
+        positions = np.arange(len(ranked))
+        ranked["publication_rank"] = (
+            positions - np.maximum.accumulate(np.where(group_start, positions, 0)) + 1
+        )
+        ranked["num_papers_percentile"] = self._interpolate_num_papers_percentile(
+            stats, ranked["year_of_first_pub"], ranked["publication_rank"]
+        )
+
+        # stats_author_pip_scores_current
+        pip = ranked.sort_values(
+            ["scholar_id", "num_papers_percentile", "publication_rank"], kind="stable"
+        )
+        codes = _null_codes(pip["scholar_id"])
+        x = pip["num_papers_percentile"].to_numpy(dtype=float)
+        y = pip["num_citations_percentile"].to_numpy(dtype=float)
+        same_author = codes[1:] == codes[:-1]
+        areas = np.where(same_author, np.diff(x) * (y[1:] + y[:-1]) / 2, 0.0)
+        num_codes = codes.max() + 1 if len(codes) else 0
+        auc = np.bincount(codes[1:], weights=areas, minlength=num_codes)
+        num_areas = np.bincount(codes[1:][same_author], minlength=num_codes)
+        scholar_ids = pip["scholar_id"].to_numpy()[
+            np.unique(codes, return_index=True)[1]
+        ]
+        scores = pd.DataFrame(
+            {
+                "scholar_id": scholar_ids,
+                # ROUND() in BigQuery rounds half away from zero.
+                "pip_auc_score": np.floor(auc * 10000 + 0.5) / 10000,
+            }
+        )[num_areas > 0]
+        scores = scores.merge(stats[["scholar_id", "year_of_first_pub"]], on="scholar_id")
+        scores["pip_auc_score_percentile"] = _percent_rank(
+            scores["pip_auc_score"], scores["year_of_first_pub"]
+        )
+
+        stats = stats.merge(
+            scores[["scholar_id", "pip_auc_score", "pip_auc_score_percentile"]],
+            on="scholar_id",
+            how="left",
+        )
+        self._author_stats = stats[AUTHOR_STATS_COLUMNS].set_index(
+            "scholar_id", drop=False
+        )
+
+        # get_author_pub_stats joins the inputs back to the raw publication fields.
+        pub_stats = ranked[
+            [
+                "scholar_id",
+                "author_pub_id",
+                "num_citations_percentile",
+                "publication_rank",
+                "num_papers_percentile",
+            ]
+        ].merge(
+            publications[["author_pub_id", "title", "citation", "pub_year", "num_citations"]],
+            on="author_pub_id",
+        )
+        pub_stats = pub_stats.sort_values(
+            ["scholar_id", "publication_rank"], kind="stable"
+        ).reset_index(drop=True)
+        pub_scholar_ids = pub_stats["scholar_id"].to_numpy()
+        starts = np.flatnonzero(
+            np.r_[True, pub_scholar_ids[1:] != pub_scholar_ids[:-1]]
+        )[: len(pub_scholar_ids)]
+        ends = np.r_[starts[1:], len(pub_scholar_ids)]
+        self._pub_stats = pub_stats[AUTHOR_PUB_STATS_COLUMNS]
+        self._pub_stats_slices = {
+            pub_scholar_ids[start]: (start, end) for start, end in zip(starts, ends)
+        }
+
+        logging.info(
+            f"Computed local statistics for {len(self._author_stats)} authors "
+            f"and {len(self._pub_stats)} publications."
+        )
+
+    @staticmethod
+    def _interpolate_num_papers_percentile(stats, years, ranks):
+        """
+        Maps publication ranks to the productivity percentile of the author's
+        cohort, interpolating between the two closest peers as in the SQL view.
+        """
+        cohorts = (
+            stats.loc[
+                stats["year_of_first_pub"].notna(),
+                [
+                    "year_of_first_pub",
+                    "total_publications_with_citations",
+                    "total_publications_with_citations_percentile",
+                ],
+            ]
+            .drop_duplicates()
+            .sort_values(["year_of_first_pub", "total_publications_with_citations"])
+        )
+        scale = 10_000_000  # larger than any publication count or rank
+        cohort_years = cohorts["year_of_first_pub"].to_numpy(dtype=np.int64)
+        cohort_counts = cohorts["total_publications_with_citations"].to_numpy(dtype=np.int64)
+        cohort_percentiles = cohorts[
+            "total_publications_with_citations_percentile"
+        ].to_numpy(dtype=float)
+        cohort_keys = cohort_years * scale + cohort_counts
+
+        years = np.asarray(years, dtype=np.int64)
+        ranks = np.asarray(ranks, dtype=np.int64)
+        idx = np.searchsorted(cohort_keys, years * scale + ranks, side="right")
+
+        # "positive": the largest peer count <= rank; "negative": the smallest > rank.
+        below = np.clip(idx - 1, 0, max(len(cohort_keys) - 1, 0))
+        above = np.clip(idx, 0, max(len(cohort_keys) - 1, 0))
+        has_positive = (idx > 0) & (cohort_years[below] == years)
+        has_negative = (idx < len(cohort_keys)) & (cohort_years[above] == years)
+
+        positive_distance = ranks - cohort_counts[below]
+        negative_distance = cohort_counts[above] - ranks
+        interpolated = (
+            cohort_percentiles[above] * positive_distance
+            + cohort_percentiles[below] * negative_distance
+        ) / np.maximum(positive_distance + negative_distance, 1)
+
+        return np.where(
+            ~has_positive, 0.0, np.where(~has_negative, 1.0, interpolated)
+        )
+
+    def get_author_pub_stats(self, author_id):
+        start, end = self._pub_stats_slices.get(author_id, (0, 0))
+        return _to_records(self._pub_stats.iloc[start:end])
+
+    def get_author_stats(self, author_id):
+        if author_id not in self._author_stats.index:
+            logging.warning(f"No author stats found for author_id: {author_id}.")
+            return None
+        return _to_records(self._author_stats.loc[[author_id]])[0]
+
+    def get_authors_stats(self, author_ids):
+        present = [a for a in dict.fromkeys(author_ids) if a in self._author_stats.index]
+        records = _to_records(self._author_stats.loc[present]) if present else []
+        return {record["scholar_id"]: record for record in records}
+
+    def get_all_authors_stats(self):
+        return self._author_stats.reset_index(drop=True)
@@ -0,0 +1,94 @@
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-namespace TTLs.
+
+    Values are stored pickled: the pickle length is the size accounted
+    against ``max_bytes``, and every ``get`` returns a fresh copy, so callers
+    may mutate what they receive without corrupting the cache.
+    """
+
+    def __init__(self, max_bytes, ttls=None, default_ttl=60):
+        self.max_bytes = max_bytes
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # (namespace, key) -> (expires_at, blob)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl(self, namespace):
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def get(self, namespace, key):
+        """Returns the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, blob = entry
+            if expires_at <= time.monotonic():
+                self._remove((namespace, key))
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+        return pickle.loads(blob)
+
+    def set(self, namespace, key, value):
+        ttl = self.ttl(namespace)
+        if ttl <= 0:
+            return
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logging.warning(f"Value for '{key}' in {namespace} is not cacheable: {e}")
+            return
+        if len(blob) > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (time.monotonic() + ttl, blob)
+            self._size += len(blob)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, namespace, key):
+        with self._lock:
+            self._remove((namespace, key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
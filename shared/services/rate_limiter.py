@@ -0,0 +1,86 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second are added, up to
+    ``capacity``, and every call consumes one, waiting for it if needed.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available right now."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Takes a token, waiting as long as needed for one."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to the backend (AIMD): every success adds
+    ``increase / rate`` (so about ``increase`` per second of successes), and
+    a throttling error multiplies the rate by ``decrease``, at most once per
+    ``cooldown`` seconds so that one burst of errors counts once.
+    """
+
+    def __init__(self, rate, min_rate, max_rate, increase=1.0, decrease=0.5, cooldown=1.0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.bucket = TokenBucket(rate)
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def acquire(self):
+        self.bucket.acquire()
+
+    def _set_rate(self, rate):
+        with self.bucket._lock:
+            self.bucket._refill()
+            self.bucket.rate = rate
+            self.bucket.capacity = max(1.0, rate)
+            self.bucket._tokens = min(self.bucket._tokens, self.bucket.capacity)
+
+    def on_success(self):
+        with self._lock:
+            self._set_rate(min(self.max_rate, self.rate + self.increase / self.rate))
+
+    def on_throttle(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._set_rate(max(self.min_rate, self.rate * self.decrease))
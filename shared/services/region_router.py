@@ -0,0 +1,176 @@
+"""
+Spreads Cloud Tasks over the regions the functions are deployed in.
+
+Each region's fetches leave from its own egress pool, so each region has its
+own CrawlController (scoped by region) and its own health record in
+``region_health/{region}``: exponentially weighted averages of the fetch
+success rate and latency, written by the function instances running there.
+New tasks go to a region chosen at random, weighted by success rate over
+latency. A region whose success rate falls under REGION_MIN_SUCCESS is
+cooled down for REGION_COOLDOWN_SECONDS, and a region whose crawling is
+paused gets no tasks until the pause ends. When every region is unavailable,
+tasks go to the one available first, scheduled for then.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..config import Config
+from .crawl_controller import BLOCKED, NOT_FOUND, OK, CrawlController
+
+
+class RegionRouter:
+    def __init__(self, firestore_service, regions=None):
+        self.firestore_service = firestore_service
+        self.regions = list(regions or Config.FUNCTION_REGIONS)
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        self._controllers = {}
+        self._pending = {}  # region -> outcomes not yet written
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def crawl_controller(self, region=None):
+        """The crawl controller of a region (FUNCTION_LOCATION by default)."""
+        region = region or Config.FUNCTION_LOCATION
+        with self._lock:
+            controller = self._controllers.get(region)
+            if controller is None:
+                controller = self._controllers[region] = CrawlController(
+                    self.firestore_service,
+                    scope=region,
+                    on_outcome=lambda outcome, seconds: self.record(
+                        region, outcome, seconds
+                    ),
+                )
+            return controller
+
+    def health(self):
+        """
+        ``{region: {"success", "latency", "available_at"}}``, re-read at most
+        every REGION_SNAPSHOT_TTL seconds. ``available_at`` is the end of the
+        region's cooldown or crawl pause, or None.
+        """
+        with self._lock:
+            if (
+                self._snapshot is not None
+                and time.monotonic() - self._snapshot_at < Config.REGION_SNAPSHOT_TTL
+            ):
+                return self._snapshot
+        records = self.firestore_service.get_many_firestore_cache(
+            Config.FIRESTORE_COLLECTION_REGION_HEALTH, self.regions
+        )
+        controls = self.firestore_service.get_many_firestore_cache(
+            Config.FIRESTORE_COLLECTION_CRAWL_CONTROL, self.regions
+        )
+        now = datetime.now(timezone.utc)
+        snapshot = {}
+        for region in self.regions:
+            record = records.get(region, ({}, None))[0]
+            control = controls.get(region, ({}, None))[0]
+            ends = [
+                end
+                for end in (record.get("cooldown_until"), control.get("paused_until"))
+                if end and end > now
+            ]
+            snapshot[region] = {
+                "success": record.get("success", 1.0),
+                "latency": record.get("latency", Config.REGION_DEFAULT_LATENCY),
+                "available_at": max(ends) if ends else None,
+            }
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_at = time.monotonic()
+        return snapshot
+
+    def choose(self):
+        """
+        Picks the region for a new task; returns ``(region, not_before)``,
+        where ``not_before`` is None unless every region is unavailable.
+        """
+        health = self.health()
+        available = [r for r in self.regions if health[r]["available_at"] is None]
+        if not available:
+            region = min(self.regions, key=lambda r: health[r]["available_at"])
+            return region, health[region]["available_at"]
+        weights = [
+            max(health[r]["success"], 0.01) / max(health[r]["latency"], 0.5)
+            for r in available
+        ]
+        return random.choices(available, weights)[0], None
+
+    def record(self, region, outcome, seconds=None):
+        """
+        Accumulates a fetch outcome of the region, written to its health
+        record every REGION_HEALTH_FLUSH seconds, or at once if blocked.
+        """
+        with self._lock:
+            pending = self._pending.setdefault(
+                region, {"samples": 0, "successes": 0, "latencies": []}
+            )
+            pending["samples"] += 1
+            if outcome in (OK, NOT_FOUND):
+                pending["successes"] += 1
+                if seconds is not None:
+                    pending["latencies"].append(seconds)
+            due = time.monotonic() - self._last_flush >= Config.REGION_HEALTH_FLUSH
+        if due or outcome in BLOCKED:
+            self.flush()
+
+    def flush(self):
+        """
+        Folds the accumulated outcomes into the regions' health records, each
+        in a transaction, since every instance of the region writes them.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        for region, counts in pending.items():
+            cooled_down = []
+
+            def merge(record, timestamp):
+                record = record or {}
+                now = datetime.now(timezone.utc)
+                # Same as applying the EWMA once per sample
+                weight = 1 - (1 - Config.REGION_EWMA_ALPHA) ** counts["samples"]
+                success = (1 - weight) * record.get("success", 1.0) + weight * (
+                    counts["successes"] / counts["samples"]
+                )
+                latency = record.get("latency", Config.REGION_DEFAULT_LATENCY)
+                if counts["latencies"]:
+                    latency_weight = 1 - (1 - Config.REGION_EWMA_ALPHA) ** len(
+                        counts["latencies"]
+                    )
+                    latency = (1 - latency_weight) * latency + latency_weight * (
+                        sum(counts["latencies"]) / len(counts["latencies"])
+                    )
+                cooldown_until = record.get("cooldown_until")
+                cooling = bool(cooldown_until and cooldown_until > now)
+                cooled_down.clear()
+                if success < Config.REGION_MIN_SUCCESS and not cooling:
+                    cooldown_until = now + timedelta(seconds=Config.REGION_COOLDOWN_SECONDS)
+                    cooling = True
+                    cooled_down.append((cooldown_until, success))
+                if cooling:
+                    # After the cooldown, one failure cools the region down
+                    # again and one success makes it available
+                    success = max(success, Config.REGION_MIN_SUCCESS)
+                return {
+                    "region": region,
+                    "success": success,
+                    "latency": latency,
+                    "samples": record.get("samples", 0) + counts["samples"],
+                    "cooldown_until": cooldown_until,
+                }, None
+
+            _, timestamp = self.firestore_service.update_firestore_cache(
+                Config.FIRESTORE_COLLECTION_REGION_HEALTH, region, merge
+            )
+            if timestamp is not None and cooled_down:
+                cooldown_until, success = cooled_down[0]
+                logging.warning(
+                    f"Cooling down region {region} until {cooldown_until} "
+                    f"(success rate {success:.2f})."
+                )
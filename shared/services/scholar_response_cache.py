@@ -0,0 +1,207 @@
+"""
+Cache of the Google Scholar pages fetched by scholarly.
+
+``install`` wraps ``Navigator._get_page``, the single method through which
+scholarly downloads pages, so that author and publication fills within the
+TTL are answered without any outbound request. Entries are keyed by the
+normalized URL, stored zlib-compressed on local disk or in GCS, and served
+past their TTL when a fresh fetch fails.
+
+With ``offline`` set, misses raise instead of fetching and entries never
+expire: a directory filled by an online run then serves as recorded fixtures.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from ..config import Config
+from .crawl_controller import page_download_failed, page_download_starting, set_lazy_pacing
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode for a page that is not in the cache."""
+
+
+def normalize_url(url):
+    """Lowercases scheme and host, sorts the query and drops the fragment."""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, "")
+    )
+
+
+class DiskResponseStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, data):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # readers never see a partial file
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+
+class GCSResponseStore:
+    def __init__(self, storage_service, prefix="scholar_pages/"):
+        self.storage_service = storage_service
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.storage_service.download_bytes(self.prefix + key)
+
+    def put(self, key, data):
+        self.storage_service.upload_bytes(
+            self.prefix + key, data, "application/octet-stream"
+        )
+
+    def delete(self, key):
+        self.storage_service.delete_blob(self.prefix + key)
+
+
+class ScholarResponseCache:
+    def __init__(self, store, ttl, offline=False):
+        self.store = store
+        self.ttl = ttl
+        self.offline = offline
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._original_get_page = None
+
+    @classmethod
+    def from_config(cls):
+        """The cache configured by SCHOLAR_CACHE_*, or None when disabled."""
+        backend = Config.SCHOLAR_CACHE_BACKEND
+        if not backend:
+            return None
+        if backend == "disk":
+            store = DiskResponseStore(Config.SCHOLAR_CACHE_DIR)
+        elif backend == "gcs":
+            from .storage_service import StorageService
+
+            store = GCSResponseStore(StorageService())
+        else:
+            raise ValueError(f"Unknown scholar cache backend: {backend}")
+        return cls(store, Config.SCHOLAR_CACHE_TTL, offline=Config.SCHOLAR_CACHE_OFFLINE)
+
+    @staticmethod
+    def key(url):
+        digest = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return f"{digest[:2]}/{digest}.z"
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def get(self, url):
+        """Returns ``(text, fetched_at)`` of the cached page, or (None, None)."""
+        try:
+            data = self.store.get(self.key(url))
+        except Exception as e:
+            logging.error(f"Error reading cached page {url}: {e}")
+            self._count("errors")
+            return None, None
+        if data is None:
+            return None, None
+        try:
+            entry = json.loads(zlib.decompress(data))
+            return entry["text"], entry["fetched_at"]
+        except (zlib.error, ValueError, KeyError, TypeError) as e:
+            logging.error(f"Dropping corrupt cached page {url}: {e}")
+            self._count("errors")
+            try:
+                self.store.delete(self.key(url))
+            except Exception as e:
+                logging.error(f"Error deleting cached page {url}: {e}")
+            return None, None
+
+    def put(self, url, text):
+        entry = {"url": normalize_url(url), "fetched_at": time.time(), "text": text}
+        try:
+            self.store.put(self.key(url), zlib.compress(json.dumps(entry).encode("utf-8")))
+        except Exception as e:
+            logging.error(f"Error caching page {url}: {e}")
+            self._count("errors")
+
+    def fetch(self, url, get_page):
+        """The page from the cache if fresh, otherwise from ``get_page(url)``."""
+        text, fetched_at = self.get(url)
+        if text is not None and (self.offline or time.time() - fetched_at < self.ttl):
+            self._count("hits")
+            return text
+        self._count("misses")
+        if self.offline:
+            raise OfflineCacheMiss(url)
+        try:
+            fresh = get_page(url)
+        except Exception as e:
+            if text is None:
+                raise
+            logging.warning(f"Fetching {url} failed ({e}), serving the cached copy.")
+            page_download_failed(e)
+            self._count("stale_hits")
+            return text
+        self.put(url, fresh)
+        return fresh
+
+    def install(self):
+        """Routes scholarly's page downloads through the cache."""
+        from scholarly._navigator import Navigator
+
+        if self._original_get_page is not None:
+            return
+        original = self._original_get_page = Navigator._get_page
+        cache = self
+
+        def _get_page(navigator, pagerequest, premium=False):
+            def download(url):
+                # Only downloads are paced by the crawl controller
+                page_download_starting()
+                return original(navigator, url, premium)
+
+            return cache.fetch(pagerequest, download)
+
+        Navigator._get_page = _get_page
+        set_lazy_pacing(True)
+
+    def uninstall(self):
+        from scholarly._navigator import Navigator
+
+        if self._original_get_page is not None:
+            Navigator._get_page = self._original_get_page
+            self._original_get_page = None
+            set_lazy_pacing(False)
@@ -1,7 +1,13 @@
+import logging
+import socket
+import uuid
+
 from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed
 from datetime import datetime, timedelta, timezone
 
 from ..config import Config
+from .memory_cache import MemoryCache
 
 
 class StorageService:
@@ -9,6 +15,13 @@ class StorageService:
         self.storage_client = storage.Client(project=Config.PROJECT_ID)
         self.bucket_name = Config.BUCKET_NAME
         self.bucket = self.storage_client.bucket(self.bucket_name)
+        # Blob metadata, memoized briefly so that hot freshness checks do not
+        # each cost a round-trip
+        self.metadata_cache = MemoryCache(
+            max_bytes=1024 * 1024,
+            ttls={"blob_metadata": Config.STORAGE_METADATA_TTL},
+        )
+        self.lease_holder = f"{socket.gethostname()}/{uuid.uuid4().hex[:8]}"
 
     def upload_csv_to_gcs(self, df, destination_blob_name):
         """Uploads the CSV content to Google Cloud Storage."""
@@ -18,6 +31,28 @@ class StorageService:
         csv_string = df.to_csv(index=False)
         blob.upload_from_string(csv_string, content_type="text/csv")
 
+    def upload_bytes(self, destination_blob_name, data, content_type):
+        """Uploads raw bytes to Google Cloud Storage."""
+
+        blob = self.bucket.blob(destination_blob_name)
+        blob.upload_from_string(data, content_type=content_type)
+
+    def download_bytes(self, blob_name):
+        """Returns the content of the blob, or None if it does not exist."""
+
+        try:
+            return self.bucket.blob(blob_name).download_as_bytes()
+        except NotFound:
+            return None
+
+    def delete_blob(self, blob_name):
+        """Deletes the blob if it exists."""
+
+        try:
+            self.bucket.blob(blob_name).delete()
+        except NotFound:
+            pass
+
     def generate_signed_url(self, blob_name):
         """Generates a signed URL for the blob."""
 
@@ -30,13 +65,77 @@ class StorageService:
         )
         return url
 
-    def file_updated_within_24_hours(self, file_name):
-        blob = self.bucket.blob(file_name)
+    def get_blob_metadata(self, blob_name):
+        """
+        Returns ``{"generation", "updated"}`` of the blob, or None if it does
+        not exist, with a single metadata request memoized for a few seconds.
+        """
+        cached = self.metadata_cache.get("blob_metadata", blob_name)
+        if cached is not None:
+            return cached["metadata"]
+
+        blob = self.bucket.get_blob(blob_name)
+        metadata = None
+        if blob is not None:
+            metadata = {"generation": blob.generation, "updated": blob.updated}
+        self.metadata_cache.set("blob_metadata", blob_name, {"metadata": metadata})
+        return metadata
+
+    def forget_blob_metadata(self, blob_name):
+        self.metadata_cache.invalidate("blob_metadata", blob_name)
 
-        if not blob.exists():
+    def file_updated_within(self, file_name, max_age):
+        metadata = self.get_blob_metadata(file_name)
+        if metadata is None:
             return False
+        return (datetime.now(timezone.utc) - metadata["updated"]) < max_age
+
+    def file_updated_within_24_hours(self, file_name):
+        return self.file_updated_within(file_name, timedelta(hours=24))
+
+    def acquire_lease(self, name, ttl):
+        """
+        Tries to take the lease ``name`` for ``ttl`` seconds, across all
+        instances. Returns a token for release_lease, or None if another
+        holder has an unexpired lease.
+
+        The lease is a GCS object created with a generation precondition, so
+        only one writer can create it; an expired lease is taken over with a
+        precondition on its current generation, so only one writer wins that
+        race too.
+        """
+        blob_name = f"{Config.STORAGE_LEASE_PREFIX}{name}"
+        expires = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        blob = self.bucket.blob(blob_name)
+        blob.metadata = {"holder": self.lease_holder, "expires": expires.isoformat()}
+
+        try:
+            blob.upload_from_string(b"", if_generation_match=0)
+            return blob.generation
+        except PreconditionFailed:
+            pass
 
-        blob.reload()  # Reload the blob's metadata
-        last_modified = blob.updated  # 'updated' is a datetime object in UTC
+        current = self.bucket.get_blob(blob_name)
+        if current is not None:
+            current_expires = (current.metadata or {}).get("expires")
+            if current_expires and datetime.fromisoformat(current_expires) > datetime.now(
+                timezone.utc
+            ):
+                return None
+        try:
+            blob.upload_from_string(
+                b"", if_generation_match=current.generation if current else 0
+            )
+        except PreconditionFailed:
+            return None
+        logging.info(f"Took over expired lease '{name}'")
+        return blob.generation
 
-        return (datetime.now(timezone.utc) - last_modified) < timedelta(hours=24)
+    def release_lease(self, name, token):
+        """Releases a lease, unless it has since been taken over."""
+        try:
+            self.bucket.blob(f"{Config.STORAGE_LEASE_PREFIX}{name}").delete(
+                if_generation_match=token
+            )
+        except (NotFound, PreconditionFailed):
+            pass
@@ -1,83 +1,295 @@
 # shared/services/task_queue_service.py
 
+import hashlib
 import json
 import logging
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import tasks_v2
+from google.protobuf import timestamp_pb2
 # Import the exception for handling existing tasks
-from google.api_core.exceptions import AlreadyExists 
+from google.api_core.exceptions import AlreadyExists, ResourceExhausted, TooManyRequests
 from ..config import Config
+from ..repositories.ingestion_status_repository import PENDING_STATES
+from .rate_limiter import AdaptiveRateLimiter
 
 
-class TaskQueueService:
+# Outcomes of a create_task call
+CREATED = "created"
+ALREADY_EXISTS = "already_exists"
+FAILED = "failed"
+# Rejected by the Cloud Tasks quota; enqueue_many retries these
+THROTTLED = "throttled"
+# Task name repeated within an enqueue_many call
+DUPLICATE = "duplicate"
+
+# Priority lanes (see Config.QUEUE_LANES)
+INTERACTIVE = "interactive"
+REFRESH = "refresh"
+BACKFILL = "backfill"
+
+
+class LaneMetrics:
+    """Outcomes of the create_task calls of the process, per lane."""
+
     def __init__(self):
+        self.outcomes = {}
+        self.last_created = {}
+        self._lock = threading.Lock()
+
+    def record(self, lane, outcome):
+        with self._lock:
+            counts = self.outcomes.setdefault(lane, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            if outcome == CREATED:
+                self.last_created[lane] = datetime.now(timezone.utc)
+
+    def stats(self):
+        with self._lock:
+            return {
+                lane: {
+                    "outcomes": dict(self.outcomes.get(lane, {})),
+                    "last_created": self.last_created.get(lane),
+                }
+                for lane in Config.QUEUE_LANES
+            }
+
+
+# Shared by every TaskQueueService in the process
+lane_metrics = LaneMetrics()
+
+
+class TaskQueueService:
+    def __init__(self, ingestion_status_repository=None, region_router=None):
         self.tasks_client = tasks_v2.CloudTasksClient()
+        # Optional ledger of the authors' ingestion state
+        self.ingestion_status = ingestion_status_repository
+        # Optional region routing: without it every task goes to
+        # FUNCTION_LOCATION, regardless of its health or crawl pause
+        self.region_router = region_router
         self.project_id = Config.PROJECT_ID
         self.queue_location = Config.QUEUE_LOCATION
-        self.authors_queue_name = Config.QUEUE_NAME_AUTHORS
-        self.pubs_queue_name = Config.QUEUE_NAME_PUBS
-        # Construct full queue paths
-        self.authors_queue = self.tasks_client.queue_path(
-            self.project_id, self.queue_location, self.authors_queue_name
-        )
-        self.pubs_queue = self.tasks_client.queue_path(
-            self.project_id, self.queue_location, self.pubs_queue_name
-        )
+        # Full queue paths of each lane, and the lane of each queue path
+        self.lane_queues = {
+            lane: tuple(
+                self.tasks_client.queue_path(self.project_id, self.queue_location, name)
+                for name in names
+            )
+            for lane, names in Config.QUEUE_LANES.items()
+        }
+        self.queue_lanes = {
+            queue: lane for lane, queues in self.lane_queues.items() for queue in queues
+        }
+
+    def _lane(self, lane):
+        if lane not in Config.QUEUE_LANES:
+            raise ValueError(f"Unknown queue lane: {lane}")
+        authors_queue_name, pubs_queue_name = Config.QUEUE_LANES[lane]
+        authors_queue, pubs_queue = self.lane_queues[lane]
+        return authors_queue_name, pubs_queue_name, authors_queue, pubs_queue
 
-    def enqueue_author_task(self, author_id):
-        """Enqueues a task to process an author, handling duplicates."""
+    def enqueue_author_task(self, author_id, lane=REFRESH, unique=False):
+        """
+        Enqueues a task to process an author in a lane, handling duplicates.
+        ``unique`` gives the task a name of its own, for callers that already
+        deduplicate: Cloud Tasks keeps the names of finished tasks for a
+        while, so re-requesting an author under its plain name would only
+        get ALREADY_EXISTS.
+        """
+        authors_queue_name, _, authors_queue, _ = self._lane(lane)
+        task_id_part = author_id
+        if unique:
+            task_id_part += f"-{uuid.uuid4().hex[:12]}"
         # Construct the full task name for idempotency
         task_name = self.tasks_client.task_path(
-            self.project_id, self.queue_location, self.authors_queue_name, author_id
+            self.project_id, self.queue_location, authors_queue_name, task_id_part
         )
-        url = Config.API_SEARCH_AUTHOR_ID
-        payload = json.dumps({"scholar_id": author_id})
-
-        task = self._create_http_task(task_name, url, payload)
-        return self._enqueue_task(task, self.authors_queue, f"author {author_id}")
+        task = self._create_function_task(
+            task_name, "search_author_id", {"scholar_id": author_id, "lane": lane}
+        )
+        outcome, response = self._create_task(
+            task, authors_queue, f"author {author_id}"
+        )
+        # The ledger only records tasks actually created, so that the next
+        # request retries when none was
+        if self.ingestion_status is not None and outcome == CREATED:
+            self.ingestion_status.mark_queued(author_id, lane=lane)
+        return response
 
-    def enqueue_publication_task(self, pub_entry):
+    def enqueue_publication_task(self, pub_entry, lane=REFRESH):
         """Enqueues a task to process a publication, handling duplicates."""
+        task = self._publication_task(pub_entry, lane=lane)
+        return self._enqueue_task(
+            task, self._lane(lane)[3], f"publication {pub_entry['author_pub_id']}"
+        )
+
+    def enqueue_publication_tasks(self, pub_entries, batch_size=1, retry=False, lane=REFRESH):
+        """
+        Enqueues the publications with enqueue_many, ``batch_size`` per
+        fill_publication task; returns the outcome for each task name.
+        ``retry`` gives single-publication tasks a name of their own, so that
+        a publication can be requeued however many times its fills failed,
+        while earlier tasks for it are still known to Cloud Tasks: ``True``
+        for a name unique to this call, or a string naming the attempt (e.g.
+        after the batch task being retried), so that requeueing it again
+        gives ALREADY_EXISTS instead of a second task.
+        """
+        if batch_size > 1:
+            tasks = [
+                self._publication_batch_task(
+                    pub_entries[start : start + batch_size], lane
+                )
+                for start in range(0, len(pub_entries), batch_size)
+            ]
+        else:
+            retry_id = uuid.uuid4().hex[:12] if retry is True else retry or None
+            tasks = [
+                self._publication_task(pub_entry, retry_id, lane)
+                for pub_entry in pub_entries
+            ]
+        return self.enqueue_many(tasks, self._lane(lane)[3])
+
+    def lane_stats(self):
+        """Queues of each lane and the outcomes of this process's enqueues."""
+        stats = lane_metrics.stats()
+        for lane, (authors_queue_name, pubs_queue_name) in Config.QUEUE_LANES.items():
+            stats[lane]["queues"] = [authors_queue_name, pubs_queue_name]
+        return stats
+
+    def enqueue_many(self, tasks, queue):
+        """
+        Creates many tasks concurrently (at most Config.ENQUEUE_CONCURRENCY
+        calls in flight) under an adaptive rate limit, which halves when
+        Cloud Tasks answers with a quota error and grows back as tasks are
+        created. Throttled tasks are retried, up to
+        Config.ENQUEUE_MAX_ATTEMPTS times.
+
+        Tasks sharing a name are only sent once (repeats are logged as
+        DUPLICATE). Returns a dict mapping each task name to its outcome:
+        CREATED, ALREADY_EXISTS, FAILED or THROTTLED (attempts exhausted).
+        """
+        outcomes = {}
+        unique = {}
+        duplicates = 0
+        for task in tasks:
+            if task["name"] in unique:
+                duplicates += 1
+            else:
+                unique[task["name"]] = task
+        if not unique:
+            return outcomes
+
+        limiter = AdaptiveRateLimiter(
+            Config.ENQUEUE_INITIAL_RATE,
+            Config.ENQUEUE_MIN_RATE,
+            Config.ENQUEUE_MAX_RATE,
+            increase=Config.ENQUEUE_RATE_INCREASE,
+        )
+
+        def create(task):
+            for _ in range(Config.ENQUEUE_MAX_ATTEMPTS):
+                limiter.acquire()
+                outcome, _ = self._create_task(task, queue, task["name"].rsplit("/", 1)[-1])
+                if outcome != THROTTLED:
+                    limiter.on_success()
+                    return outcome
+                limiter.on_throttle()
+            return THROTTLED
+
+        workers = min(Config.ENQUEUE_CONCURRENCY, len(unique))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes.update(zip(unique, executor.map(create, unique.values())))
+
+        counts = {}
+        for outcome in outcomes.values():
+            counts[outcome] = counts.get(outcome, 0) + 1
+        if duplicates:
+            counts[DUPLICATE] = duplicates
+        logging.info(
+            f"Enqueued {len(unique)} tasks to {queue}: {counts} "
+            f"(final rate {limiter.rate:.1f}/s)"
+        )
+        return outcomes
+
+    @staticmethod
+    def publication_task_id(pub_entry, retry_id=None):
+        """Last component of the name of a single-publication task."""
         # Sanitize pub_id for use as task ID component
-        task_id_part = pub_entry["author_pub_id"].replace(":", "__").replace("/", "___") 
+        task_id_part = pub_entry["author_pub_id"].replace(":", "__").replace("/", "___")
+        if retry_id:
+            task_id_part += f"-retry-{retry_id}"
+        return task_id_part
+
+    def _publication_task(self, pub_entry, retry_id=None, lane=REFRESH):
+        task_id_part = self.publication_task_id(pub_entry, retry_id)
         # Construct the full task name for idempotency
         task_name = self.tasks_client.task_path(
-            self.project_id, self.queue_location, self.pubs_queue_name, task_id_part
+            self.project_id, self.queue_location, self._lane(lane)[1], task_id_part
+        )
+        return self._create_function_task(
+            task_name, "fill_publication", {"pub": pub_entry, "lane": lane}
         )
-        url = Config.API_FILL_PUBLICATION
-        payload = json.dumps({"pub": pub_entry})
 
-        task = self._create_http_task(task_name, url, payload)
-        return self._enqueue_task(task, self.pubs_queue, f"publication {task_id_part}")
+    def _publication_batch_task(self, pub_entries, lane=REFRESH):
+        # Named after its content, so the same batch is only enqueued once
+        pub_ids = "\n".join(sorted(pub["author_pub_id"] for pub in pub_entries))
+        task_id_part = "batch-" + hashlib.sha1(pub_ids.encode()).hexdigest()
+        task_name = self.tasks_client.task_path(
+            self.project_id, self.queue_location, self._lane(lane)[1], task_id_part
+        )
+        return self._create_function_task(
+            task_name, "fill_publication", {"pubs": pub_entries, "lane": lane}
+        )
 
     def check_pending_tasks(self, author_id):
         """
-        Checks if processing might be pending for an author.
-
-        Note: This method no longer checks the Cloud Tasks queue directly due to
-        inefficiency. It relies on the application logic (e.g., checking data
-        presence/status in Firestore) to determine if processing is needed.
-        Returns False as a placeholder, assuming the primary check occurs elsewhere.
-        Consider implementing a status field in Firestore for a more robust check.
+        Whether the author is queued or being fetched, according to the
+        ingestion ledger (False without one).
         """
-        logging.warning(f"check_pending_tasks for {author_id} no longer queries the task queue directly. Check application state instead.")
-        # Placeholder: In the current app design, main.py checks data availability.
-        # If data is missing, it assumes processing is needed/pending.
-        return False
+        if self.ingestion_status is None:
+            return False
+        status = self.ingestion_status.get_status(author_id)
+        return bool(status) and status["state"] in PENDING_STATES
 
     def get_number_of_tasks_in_queue(self):
         """
-        Returns the number of tasks currently in the queues.
-
-        Note: Cloud Tasks API does not provide an efficient way to get the queue size.
-        This method returns None to indicate the count is unavailable.
-        The frontend should be updated to handle this (e.g., show a generic message).
+        Returns the number of authors queued or being fetched, counted in the
+        ingestion ledger, since Cloud Tasks does not expose queue sizes.
+        Returns None when the count is unavailable.
         """
-        logging.warning("get_number_of_tasks_in_queue cannot provide an accurate count efficiently. Returning None.")
-        # Cannot be efficiently determined via API.
-        return None
+        if self.ingestion_status is None:
+            return None
+        return self.ingestion_status.pending_count()
 
     # Removed _check_duplicate_task method
 
+    def _create_function_task(self, task_name, function, payload):
+        """
+        Task calling a Cloud Function in the region picked by the router,
+        which is also passed in the payload. When no region is available
+        the task is scheduled for when one will be, spread out over
+        CRAWL_RESUME_SPREAD seconds.
+        """
+        region, not_before = Config.FUNCTION_LOCATION, None
+        if self.region_router is not None:
+            region, not_before = self.region_router.choose()
+        task = self._create_http_task(
+            task_name,
+            Config.function_url(region, function),
+            json.dumps(dict(payload, region=region)),
+        )
+        if not_before is not None:
+            schedule_time = timestamp_pb2.Timestamp()
+            schedule_time.FromDatetime(
+                not_before
+                + timedelta(seconds=random.uniform(0, Config.CRAWL_RESUME_SPREAD))
+            )
+            task["schedule_time"] = schedule_time
+        return task
+
     def _create_http_task(self, task_name, url, payload):
         """Creates the task configuration dictionary."""
         return {
@@ -96,17 +308,29 @@ class TaskQueueService:
 
     def _enqueue_task(self, task, queue, task_description):
         """Attempts to enqueue a task, handling AlreadyExists exceptions."""
+        return self._create_task(task, queue, task_description)[1]
+
+    def _create_task(self, task, queue, task_description):
+        """Creates a task; returns (outcome, response or None)."""
+        outcome, response = self._send_task(task, queue, task_description)
+        lane_metrics.record(self.queue_lanes.get(queue, queue), outcome)
+        return outcome, response
+
+    def _send_task(self, task, queue, task_description):
         try:
             response = self.tasks_client.create_task(
                 request={"parent": queue, "task": task}
             )
             logging.info(f"Task enqueued for {task_description}: {response.name}")
-            return response
+            return CREATED, response
         except AlreadyExists:
             logging.info(f"Task for {task_description} already exists: {task.get('name')}")
             # Task already exists, treat as success (or neutral) in terms of queueing
-            return None 
+            return ALREADY_EXISTS, None
+        except (ResourceExhausted, TooManyRequests) as e:
+            logging.warning(f"Quota exceeded enqueuing task for {task_description}: {e}")
+            return THROTTLED, None
         except Exception as e:
             logging.error(f"Error enqueuing task for {task_description} ({task.get('name')}): {e}")
             # Failed to enqueue for other reasons
-            return None
\ No newline at end of file
+            return FAILED, None
@@ -0,0 +1,141 @@
+"""
+ExportService must never finalize a partial or empty export: a blob writer
+that is closed, even by the garbage collector, finalizes its object.
+"""
+import gc
+import io
+
+import pyarrow as pa
+import pytest
+
+from shared.services.export_service import ExportService
+
+
+class FakeBlobWriter(io.BufferedIOBase):
+    """Like storage's BlobWriter: closing finalizes, terminate cancels."""
+
+    def __init__(self, name, events, fail_close=False):
+        self.name = name
+        self.events = events
+        self.fail_close = fail_close
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.data += data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self.fail_close:
+                raise RuntimeError("upload failed")
+            self.events.append(("finalize", self.name))
+        super().close()
+
+    def terminate(self):
+        self.events.append(("terminate", self.name))
+        super().close()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def open(self, mode, **kwargs):
+        return FakeBlobWriter(
+            self.name, self.bucket.events, self.name in self.bucket.fail_close
+        )
+
+
+class FakeBucket:
+    def __init__(self, fail_close=()):
+        self.events = []
+        self.fail_close = set(fail_close)
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class FakeStorageService:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.uploads = {}
+
+    def upload_bytes(self, name, data, content_type):
+        self.uploads[name] = data
+
+    def forget_blob_metadata(self, name):
+        pass
+
+
+class FakeBigQueryService:
+    def __init__(self, batches, error=None):
+        self.batches = batches
+        self.error = error
+
+    def iter_all_authors_stats(self):
+        yield from self.batches
+        if self.error is not None:
+            raise self.error
+
+
+FORMATS = ["csv", "csv.gz", "parquet"]
+BATCH = pa.RecordBatch.from_pydict({"scholar_id": ["A", "B"], "hindex": [3, 5]})
+
+
+def export(batches, error=None, fail_close=()):
+    storage = FakeStorageService(FakeBucket(fail_close))
+    service = ExportService(FakeBigQueryService(batches, error), storage)
+    try:
+        return service.export_all_authors_stats(FORMATS, "stats"), storage
+    finally:
+        gc.collect()
+
+
+def finalized(storage):
+    return [name for event, name in storage.bucket.events if event == "finalize"]
+
+
+def test_export_finalizes_every_file_then_the_manifest():
+    manifest, storage = export([BATCH])
+    assert manifest["rows"] == 2
+    assert finalized(storage) == ["stats.csv", "stats.csv.gz", "stats.parquet"]
+    assert list(storage.uploads) == ["stats.manifest.json"]
+
+
+def test_failed_export_finalizes_nothing():
+    storage = FakeStorageService(FakeBucket())
+    service = ExportService(
+        FakeBigQueryService([BATCH], RuntimeError("query failed")), storage
+    )
+    with pytest.raises(RuntimeError, match="query failed"):
+        service.export_all_authors_stats(FORMATS, "stats")
+    del service
+    gc.collect()
+    assert finalized(storage) == []
+    assert [e for e, _ in storage.bucket.events] == ["terminate"] * 3
+    assert storage.uploads == {}
+
+
+def test_empty_export_finalizes_nothing():
+    manifest, storage = export([BATCH.slice(0, 0)])
+    assert manifest is None
+    assert finalized(storage) == []
+    assert storage.uploads == {}
+
+
+def test_failed_close_cancels_the_remaining_files():
+    storage = FakeStorageService(FakeBucket(fail_close=["stats.csv.gz"]))
+    service = ExportService(FakeBigQueryService([BATCH]), storage)
+    with pytest.raises(RuntimeError, match="upload failed"):
+        service.export_all_authors_stats(FORMATS, "stats")
+    del service
+    gc.collect()
+    assert finalized(storage) == ["stats.csv"]
+    assert ("terminate", "stats.parquet") in storage.bucket.events
+    assert storage.uploads == {}
@@ -0,0 +1,143 @@
+"""
+Parity of LocalStatsService with the BigQuery views in bigquery/statistics.
+
+The expected values were worked out by hand from the SQL of
+stats_publication_current, stats_author_current,
+stats_author_publication_pip_inputs_current and
+stats_author_pip_scores_current for the small fixture below.
+"""
+import pandas as pd
+import pytest
+
+from shared.services.local_stats_service import LocalStatsService
+
+CURRENT_YEAR = 2024
+TIMESTAMP = pd.Timestamp("2024-01-01", tz="UTC")
+
+
+def _author(scholar_id, hindex, citedby):
+    return {
+        "scholar_id": scholar_id,
+        "name": f"Author {scholar_id}",
+        "affiliation": "University",
+        "email_domain": "@example.edu",
+        "hindex": hindex,
+        "hindex5y": 1,
+        "citedby": citedby,
+        "citedby5y": 1,
+        "i10index": 1,
+        "i10index5y": 1,
+        "timestamp": TIMESTAMP,
+    }
+
+
+def _publication(author_pub_id, pub_year, num_citations):
+    return {
+        "author_pub_id": author_pub_id,
+        "title": f"Title {author_pub_id}",
+        "citation": "Journal",
+        "pub_year": pub_year,
+        "num_citations": num_citations,
+        "timestamp": TIMESTAMP,
+    }
+
+
+# (author_pub_id, pub_year, num_citations); A:4 is too old and A:5 in the
+# future for the views, B:3 and C:1 have no citations.
+PUBLICATIONS = [
+    ("A:1", 2000, 50),
+    ("A:2", 2000, 10),
+    ("A:3", 2010, 5),
+    ("A:4", 1940, 100),
+    ("A:5", 2030, 1),
+    ("B:1", 2000, 20),
+    ("B:3", 2010, 0),
+    ("B:4", 1940, 3),
+    ("C:1", 2000, 0),
+    ("E:1", 2000, 5),
+    ("E:2", 2010, 30),
+]
+
+
+@pytest.fixture(scope="module")
+def service():
+    authors = pd.DataFrame(
+        [
+            _author("A", 10, 100),
+            _author("B", 5, 30),
+            _author("C", None, 0),  # no cited publication
+            _author("D", 2, 7),  # no publication at all
+            _author("E", 5, 60),
+        ]
+    )
+    authors["hindex"] = authors["hindex"].astype("Int64")
+    author_publications = pd.DataFrame(
+        [
+            {"scholar_id": pub_id.split(":")[0], "author_pub_id": pub_id, "pub_year": year}
+            for pub_id, year, _ in PUBLICATIONS
+        ]
+    )
+    publications = pd.DataFrame([_publication(*pub) for pub in PUBLICATIONS])
+    return LocalStatsService(
+        authors, author_publications, publications, current_year=CURRENT_YEAR
+    )
+
+
+def test_publication_percentiles_and_pip_inputs(service):
+    stats = service.get_author_pub_stats("A")
+    assert [s["author_pub_id"] for s in stats] == ["A:1", "A:2", "A:3"]
+    assert [s["publication_rank"] for s in stats] == [1, 2, 3]
+    # 2000: 5 (E:1), 10 (A:2), 20 (B:1), 50 (A:1); 2010: 5 (A:3), 30 (E:2)
+    assert [s["num_citations_percentile"] for s in stats] == pytest.approx([1, 1 / 3, 0])
+    # Cohort 2000 counts 1 (B, 0.0), 2 (E, 0.5) and 3 (A, 1.0) cited papers
+    assert [s["num_papers_percentile"] for s in stats] == pytest.approx([0, 0.5, 1])
+
+
+def test_zero_citation_publications_are_excluded(service):
+    assert [s["author_pub_id"] for s in service.get_author_pub_stats("B")] == ["B:1"]
+    assert service.get_author_pub_stats("C") == []
+    assert service.get_author_pub_stats("D") == []
+
+    b = service.get_author_stats("B")
+    assert b["total_publications"] == 2  # B:1 and B:3
+    assert b["total_publications_with_citations"] == 1
+    assert b["year_of_first_pub"] == 2000
+
+
+def test_author_percentiles(service):
+    a, b, e = (service.get_author_stats(author_id) for author_id in "ABE")
+    assert a["total_publications"] == 3  # without A:4 and A:5
+    assert (a["hindex_percentile"], b["hindex_percentile"], e["hindex_percentile"]) == (1, 0, 0)
+    assert (a["citedby_percentile"], b["citedby_percentile"], e["citedby_percentile"]) == (
+        1,
+        0,
+        0.5,
+    )
+    assert (
+        a["total_publications_with_citations_percentile"],
+        b["total_publications_with_citations_percentile"],
+        e["total_publications_with_citations_percentile"],
+    ) == (1, 0, 0.5)
+
+
+def test_authors_without_cited_publications_form_their_own_cohort(service):
+    c, d = service.get_author_stats("C"), service.get_author_stats("D")
+    assert c["year_of_first_pub"] is None and d["year_of_first_pub"] is None
+    assert (c["total_publications"], d["total_publications"]) == (1, 0)
+    # NULL h-index sorts first
+    assert c["hindex"] is None
+    assert (c["hindex_percentile"], d["hindex_percentile"]) == (0, 1)
+    assert (c["total_publications_percentile"], d["total_publications_percentile"]) == (1, 0)
+    assert c["pip_auc_score"] is None and d["pip_auc_score"] is None
+
+
+def test_pip_auc(service):
+    a, b, e = (service.get_author_stats(author_id) for author_id in "ABE")
+    # A: (0, 1), (0.5, 1/3), (1, 0) -> 1/3 + 1/12 = 0.41666...
+    assert a["pip_auc_score"] == 0.4167
+    # E: (0, 1), (0.5, 0) -> 0.25
+    assert e["pip_auc_score"] == 0.25
+    # A single point has no area
+    assert b["pip_auc_score"] is None
+    assert (a["pip_auc_score_percentile"], e["pip_auc_score_percentile"]) == (1, 0)
+    assert b["pip_auc_score_percentile"] is None